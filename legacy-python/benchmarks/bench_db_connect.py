@@ -0,0 +1,95 @@
+"""
+Connection-open overhead: a fresh sqlite3 connection per call (the old db.connect)
+vs. the pooled ConnectionManager, on a database with many entries.
+
+    python benchmarks/bench_db_connect.py [--entries 100000] [--iterations 5000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from rss_watcher import db  # noqa: E402
+
+
+@contextmanager
+def legacy_connect(path: str):
+    db.ensure_parent_dir(path)
+    con = sqlite3.connect(path, timeout=30, isolation_level=None)
+    try:
+        con.row_factory = sqlite3.Row
+        con.execute("PRAGMA journal_mode=WAL;")
+        con.execute("PRAGMA foreign_keys=ON;")
+        yield con
+    finally:
+        con.close()
+
+
+def seed(n_entries: int) -> None:
+    db.migrate()
+    with db.connect() as con:
+        con.execute("BEGIN")
+        con.execute("INSERT INTO feeds(name, url) VALUES('bench', 'https://bench.test/rss')")
+        con.executemany(
+            "INSERT INTO entries(feed_id, entry_key, link, title, summary) VALUES(1, ?, ?, ?, ?)",
+            (
+                (f"key-{i}", f"https://bench.test/{i}", f"Entry {i}", "lorem ipsum " * 20)
+                for i in range(n_entries)
+            ),
+        )
+        con.execute("COMMIT")
+
+
+def lookup(con: sqlite3.Connection, i: int) -> None:
+    con.execute("SELECT id FROM entries WHERE feed_id = 1 AND entry_key = ?", (f"key-{i}",)).fetchone()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--entries", type=int, default=100_000)
+    ap.add_argument("--iterations", type=int, default=5_000)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        os.environ["RSSWATCHER_DB_PATH"] = path
+        seed(args.entries)
+
+        t0 = time.perf_counter()
+        for i in range(args.iterations):
+            with legacy_connect(path) as con:
+                lookup(con, i)
+        t_old = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        for i in range(args.iterations):
+            with db.connect() as con:
+                lookup(con, i)
+        t_pool = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        for i in range(args.iterations):
+            with db.writer() as con:
+                lookup(con, i)
+        t_writer = time.perf_counter() - t0
+        db.close_all()
+
+    n = args.iterations
+    print(f"entries={args.entries} iterations={n}")
+    print(f"  fresh connection per call: {t_old * 1e6 / n:8.1f} us/call")
+    print(f"  pooled connect():          {t_pool * 1e6 / n:8.1f} us/call")
+    print(f"  writer():                  {t_writer * 1e6 / n:8.1f} us/call")
+    print(f"  speedup (pooled vs fresh): {t_old / t_pool:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
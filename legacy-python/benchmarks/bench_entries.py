@@ -0,0 +1,125 @@
+"""
+Memory and allocations for a batch of parsed entries going through dedupe and matching:
+the old dict-backed record with eagerly joined text vs. the slotted ingest.EntryRow with
+lazily built match fields.
+
+    python benchmarks/bench_entries.py [--entries 10000] [--new 0.1] [--covered 0.5]
+
+Entries start as feedparser dicts; `--new` is the fraction not already seen, `--covered`
+the fraction of feeds that have any rule at all.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import feedparser  # noqa: E402
+
+from rss_watcher import parse  # noqa: E402
+from rss_watcher.matcher import RuleMatcher  # noqa: E402
+
+
+@dataclass(frozen=True)
+class LegacyRow:
+    key: str
+    link: str
+    title: str
+    published: str | None
+    summary: str | None
+    text: str
+
+
+def legacy_text(entry: dict) -> str:
+    parts: list[str] = []
+    for k in ("title", "summary", "description"):
+        v = entry.get(k)
+        if isinstance(v, str) and v.strip():
+            parts.append(v)
+    for c in entry.get("content") or []:
+        v = (c or {}).get("value")
+        if isinstance(v, str) and v.strip():
+            parts.append(v)
+    return "\n".join(parts)
+
+
+def legacy_row(entry: dict, feed_url: str) -> LegacyRow:
+    return LegacyRow(
+        key=parse._entry_key(entry),
+        link=(entry.get("link") or "").strip() or feed_url,
+        title=(entry.get("title") or "").strip() or "(untitled)",
+        published=(entry.get("published") or entry.get("updated") or "").strip() or None,
+        summary=(entry.get("summary") or entry.get("description") or "").strip() or None,
+        text=legacy_text(entry),
+    )
+
+
+def make_entries(n: int) -> list[dict]:
+    items = "".join(
+        f"<item><title>Item {i}</title><link>https://bench.test/{i}</link><guid>g-{i}</guid>"
+        f"<pubDate>Mon, 01 Jan 2024 00:00:00 GMT</pubDate>"
+        f"<description>{'summary words ' * 30}{i}</description>"
+        f"<content:encoded><![CDATA[<p>{'full article body text ' * 80}</p>]]></content:encoded></item>"
+        for i in range(n)
+    )
+    doc = (
+        '<rss version="2.0" xmlns:content="http://purl.org/rss/1.0/modules/content/"><channel>'
+        f"<title>b</title>{items}</channel></rss>"
+    )
+    return feedparser.parse(doc.encode()).entries
+
+
+def run(label: str, build, match, entries, feed_ids, seen, matcher) -> None:
+    tracemalloc.start()
+    base_blocks = len(tracemalloc.take_snapshot().traces)
+    t0 = time.perf_counter()
+    rows = [build(e, "https://bench.test/") for e in entries]
+    fresh = [(fid, r) for fid, r in zip(feed_ids, rows) if r.key not in seen]
+    hits = sum(len(match(fid, r)) for fid, r in fresh if matcher.covers(fid))
+    elapsed = time.perf_counter() - t0
+    current, peak = tracemalloc.get_traced_memory()
+    blocks = len(tracemalloc.take_snapshot().traces) - base_blocks
+    tracemalloc.stop()
+    print(
+        f"  {label:<8} {elapsed * 1000:8.1f} ms   retained {current / 1048576:6.2f} MiB   "
+        f"peak {peak / 1048576:6.2f} MiB   live blocks {blocks:7d}   matches {hits}"
+    )
+    del rows, fresh
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--entries", type=int, default=10_000)
+    ap.add_argument("--new", type=float, default=0.1)
+    ap.add_argument("--covered", type=float, default=0.5)
+    ap.add_argument("--feeds", type=int, default=100)
+    args = ap.parse_args()
+
+    entries = make_entries(args.entries)
+    feed_ids = [1 + i % args.feeds for i in range(args.entries)]
+    step = max(1, round(1 / args.new)) if args.new else args.entries + 1
+    seen = {f"g-{i}" for i in range(args.entries) if i % step}
+    covered = max(1, int(args.feeds * args.covered))
+    rules = [
+        {"id": fid * 10 + j, "keyword": kw, "feed_id": fid, "created_at": "2000-01-01 00:00:00"}
+        for fid in range(1, covered + 1)
+        for j, kw in enumerate(("ransomware", "zero-day", "item 9"))
+    ]
+    matcher = RuleMatcher(rules)
+    print(
+        f"entries={args.entries} new={args.new:.0%} feeds={args.feeds} covered={covered} "
+        f"rules={len(rules)} avg entry text={sum(len(legacy_text(e)) for e in entries) // len(entries)} chars"
+    )
+
+    run("legacy", legacy_row, lambda fid, r: matcher.find(fid, r.text), entries, feed_ids, seen, matcher)
+    run("slotted", parse._entry_row, lambda fid, r: matcher.find_fields(fid, *r.match_fields()), entries, feed_ids, seen, matcher)
+
+
+if __name__ == "__main__":
+    main()
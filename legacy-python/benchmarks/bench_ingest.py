@@ -0,0 +1,123 @@
+"""
+Entry ingestion throughput: the old per-entry autocommit path vs. ingest.ingest,
+on a synthetic workload of armed feeds with a mix of known and new items.
+
+    python benchmarks/bench_ingest.py [--feeds 500] [--items 40] [--new 0.2]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from rss_watcher import db, ingest  # noqa: E402
+from rss_watcher.matcher import RuleMatcher  # noqa: E402
+
+
+def legacy_ingest(feed_id: int, rows: list[ingest.EntryRow], matcher: RuleMatcher) -> int:
+    # The per-entry loop poll_once used before batching: own connection checkout, SELECT,
+    # INSERT and SELECT per entry, each statement autocommitted.
+    created = 0
+    for r in rows:
+        with db.connect() as con:
+            if con.execute(
+                "SELECT id, seen_at FROM entries WHERE feed_id = ? AND entry_key = ?", (feed_id, r.key)
+            ).fetchone():
+                continue
+            con.execute(
+                "INSERT OR IGNORE INTO entries(feed_id, entry_key, link, title, published, summary) VALUES(?, ?, ?, ?, ?, ?)",
+                (feed_id, r.key, r.link, r.title, r.published, r.summary),
+            )
+            row = con.execute(
+                "SELECT id, seen_at FROM entries WHERE feed_id = ? AND entry_key = ?", (feed_id, r.key)
+            ).fetchone()
+            for m in matcher.find(feed_id, r.text):
+                if str(row["seen_at"]) < m.created_at:
+                    continue
+                try:
+                    con.execute(
+                        "INSERT INTO alerts(entry_id, rule_id, keyword) VALUES(?, ?, ?)",
+                        (int(row["id"]), m.rule_id, m.keyword),
+                    )
+                except sqlite3.IntegrityError:
+                    continue
+                created += 1
+                db.log_write(con, level="info", area="match", message=f"keyword match: {m.keyword}", feed_id=feed_id)
+    return created
+
+
+def workload(feeds: int, items: int, new_frac: float, generation: int, rnd: random.Random):
+    out = []
+    for fid in range(1, feeds + 1):
+        rows = []
+        for i in range(items):
+            # Stable keys are "known" after the first generation; a fraction rotate every time.
+            fresh = rnd.random() < new_frac
+            key = f"f{fid}-g{generation}-{i}" if fresh else f"f{fid}-{i}"
+            text = "quarterly update " * 10 + ("ransomware " if rnd.random() < 0.05 else "")
+            rows.append(
+                ingest.EntryRow(
+                    key=key, link=f"https://bench.test/{key}", title=key, published=None, summary=text
+                )
+            )
+        out.append((fid, rows))
+    return out
+
+
+def run(label: str, fn, args) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["RSSWATCHER_DB_PATH"] = os.path.join(tmp, "bench.db")
+        db.migrate()
+        with db.connect() as con:
+            con.execute("BEGIN")
+            con.executemany(
+                "INSERT INTO feeds(id, name, url) VALUES(?, ?, ?)",
+                ((i, f"F{i}", f"https://bench.test/{i}.xml") for i in range(1, args.feeds + 1)),
+            )
+            con.execute("INSERT INTO rules(keyword, created_at) VALUES('ransomware', '2000-01-01 00:00:00')")
+            rules = con.execute("SELECT id, keyword, feed_id, created_at FROM rules").fetchall()
+            con.execute("COMMIT")
+        matcher = RuleMatcher(rules)
+
+        rnd = random.Random(1)
+        total = 0
+        elapsed = 0.0
+        for gen in range(args.polls):
+            batch = workload(args.feeds, args.items, args.new, gen, rnd)
+            t0 = time.perf_counter()
+            for fid, rows in batch:
+                fn(fid, rows, matcher)
+            elapsed += time.perf_counter() - t0
+            total += sum(len(rows) for _, rows in batch)
+        db.close_all()
+    print(f"  {label:<10} {total / elapsed:12,.0f} entries/sec  ({total} entries in {elapsed:.2f}s)")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--feeds", type=int, default=500)
+    ap.add_argument("--items", type=int, default=40)
+    ap.add_argument("--new", type=float, default=0.2, help="fraction of items that are new each poll")
+    ap.add_argument("--polls", type=int, default=3)
+    args = ap.parse_args()
+
+    print(f"feeds={args.feeds} items/feed={args.items} new={args.new:.0%} polls={args.polls}")
+    run("legacy", legacy_ingest, args)
+
+    def batched(fid, rows, matcher):
+        with db.writer() as con:
+            ingest.ingest(con, fid, rows, matcher)
+
+    run("batched", batched, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Compare the compiled rule matcher against the old per-rule substring scan.
+
+    python benchmarks/bench_matcher.py [--entries 200]
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import string
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from rss_watcher.matcher import Match, RuleMatcher, normalize_keyword  # noqa: E402
+
+
+def legacy_find_matches(feed_id, text, rules):
+    # The implementation poll_once used before RuleMatcher.
+    hay = text.lower()
+    out = []
+    for r in rules:
+        kw = normalize_keyword(r["keyword"])
+        if not kw:
+            continue
+        if r["feed_id"] is not None and int(r["feed_id"]) != int(feed_id):
+            continue
+        if kw.lower() in hay:
+            out.append(Match(rule_id=int(r["id"]), keyword=kw, created_at=str(r["created_at"])))
+    return out
+
+
+def _word(rnd: random.Random) -> str:
+    return "".join(rnd.choice(string.ascii_lowercase) for _ in range(rnd.randint(4, 10)))
+
+
+def make_rules(n: int, rnd: random.Random) -> list[dict]:
+    return [
+        {
+            "id": i + 1,
+            "keyword": " ".join(_word(rnd) for _ in range(rnd.randint(1, 2))),
+            "feed_id": rnd.choice([None, None, None, rnd.randint(1, 50)]),
+            "created_at": "2024-01-01 00:00:00",
+        }
+        for i in range(n)
+    ]
+
+
+def make_texts(n: int, rules: list[dict], rnd: random.Random) -> list[str]:
+    texts = []
+    for _ in range(n):
+        words = [_word(rnd) for _ in range(rnd.randint(80, 300))]
+        # Plant a couple of real keywords so both paths do some matching work.
+        for r in rnd.sample(rules, k=min(2, len(rules))):
+            words.insert(rnd.randrange(len(words)), r["keyword"].upper())
+        texts.append(" ".join(words))
+    return texts
+
+
+def bench(n_rules: int, n_entries: int) -> None:
+    rnd = random.Random(n_rules)
+    rules = make_rules(n_rules, rnd)
+    texts = make_texts(n_entries, rules, rnd)
+    feed_ids = [rnd.randint(1, 50) for _ in texts]
+
+    t0 = time.perf_counter()
+    matcher = RuleMatcher(rules)
+    build = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    new = [matcher.find(fid, t) for fid, t in zip(feed_ids, texts)]
+    t_new = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    old = [legacy_find_matches(fid, t, rules) for fid, t in zip(feed_ids, texts)]
+    t_old = time.perf_counter() - t0
+
+    assert new == old, "matcher disagrees with legacy scan"
+    print(
+        f"rules={n_rules:>6}  entries={n_entries}  "
+        f"legacy={t_old * 1000 / n_entries:8.3f} ms/entry  "
+        f"automaton={t_new * 1000 / n_entries:8.3f} ms/entry  "
+        f"build={build * 1000:8.1f} ms  speedup={t_old / t_new:6.1f}x"
+    )
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--entries", type=int, default=200)
+    ap.add_argument("--rules", type=int, nargs="*", default=[10, 1_000, 50_000])
+    args = ap.parse_args()
+    for n in args.rules:
+        bench(n, args.entries)
+
+
+if __name__ == "__main__":
+    main()
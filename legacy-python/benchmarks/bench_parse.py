@@ -0,0 +1,86 @@
+"""
+Feed parsing throughput with parse.ParsePool at different worker counts, plus how long the
+event loop was blocked (worst gap between 10ms ticks) while parsing.
+
+    python benchmarks/bench_parse.py [--feeds 200] [--items 50] [--workers 0,1,2,4,8]
+
+workers=0 is the old behaviour: feedparser runs inline on the event loop.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from rss_watcher.parse import ParsePool  # noqa: E402
+
+
+def make_feed(n: int, items: int, body_words: int) -> bytes:
+    parts = [
+        '<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel>',
+        f"<title>Bench {n}</title><link>https://bench.test/{n}</link><description>d</description>",
+    ]
+    for i in range(items):
+        body = " ".join(f"word{(i * 7 + w) % 997}" for w in range(body_words))
+        parts.append(
+            f"<item><title>Item {n}-{i}</title><link>https://bench.test/{n}/{i}</link>"
+            f"<guid>bench-{n}-{i}</guid><pubDate>Mon, 01 Jan 2024 00:00:00 GMT</pubDate>"
+            f"<description><![CDATA[<p>{body}</p>]]></description></item>"
+        )
+    parts.append("</channel></rss>")
+    return "".join(parts).encode()
+
+
+async def run(workers: int, feeds: list[bytes]) -> tuple[float, float]:
+    pool = ParsePool(workers=workers)
+    if workers:
+        # Start the worker processes outside the timed region.
+        await asyncio.gather(*(pool.parse(feeds[0], "https://bench.test/") for _ in range(workers)))
+
+    worst_gap = 0.0
+    done = asyncio.Event()
+
+    async def ticker() -> None:
+        nonlocal worst_gap
+        last = time.perf_counter()
+        while not done.is_set():
+            await asyncio.sleep(0.01)
+            now = time.perf_counter()
+            worst_gap = max(worst_gap, now - last - 0.01)
+            last = now
+
+    tick = asyncio.create_task(ticker())
+    t0 = time.perf_counter()
+    await asyncio.gather(*(pool.parse(body, f"https://bench.test/{i}") for i, body in enumerate(feeds)))
+    elapsed = time.perf_counter() - t0
+    done.set()
+    await tick
+    pool.close()
+    return len(feeds) / elapsed, worst_gap
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--feeds", type=int, default=200)
+    ap.add_argument("--items", type=int, default=50)
+    ap.add_argument("--words", type=int, default=80, help="words per item description")
+    ap.add_argument("--workers", default="0,1,2,4,8")
+    args = ap.parse_args()
+
+    feeds = [make_feed(n, args.items, args.words) for n in range(args.feeds)]
+    size = sum(len(f) for f in feeds) / len(feeds)
+    print(f"feeds={args.feeds} items/feed={args.items} avg size={size / 1024:.0f} KiB cpus={os.cpu_count()}")
+    for w in (int(x) for x in args.workers.split(",")):
+        rate, gap = asyncio.run(run(w, feeds))
+        label = "inline" if w == 0 else f"{w} workers"
+        print(f"  {label:<10} {rate:8.1f} feeds/sec   worst loop stall {gap * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""
+End-to-end poll throughput against a local feed farm: a separate process serving
+thousands of synthetic feeds over HTTP, polled by the real poll_once (or run_loop) with
+rules seeded in a scratch database.
+
+    python benchmarks/bench_poll.py [--feeds 1000] [--items 50] [--size 800] [--churn 0.1]
+                                    [--latency 20] [--errors 0.01] [--rules 200] [--polls 3]
+                                    [--loop SECONDS] [--save] [--check]
+
+Farm feeds are deterministic: each fetch of a feed moves it `--churn` of `--items` newer,
+answers If-None-Match with 304 when nothing changed, takes `--latency` ms (+/- 50%) and
+fails with a 500 at `--errors`. The first poll baselines every feed and isn't measured.
+
+Reports polls/sec, entries/sec, p50/p99 time to handle one feed, peak RSS and SQLite
+writes, and compares them with the baseline stored for the same workload in
+benchmarks/baselines/poll.json (`--save` records one, `--check` exits 1 on a regression).
+Baselines are only comparable on the machine that recorded them.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import functools
+import hashlib
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import socket
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from rss_watcher import db, metrics, scheduler, seen, watcher  # noqa: E402
+from rss_watcher.httppool import HttpPool  # noqa: E402
+from rss_watcher.parse import ParsePool  # noqa: E402
+
+BASELINES = Path(__file__).resolve().parent / "baselines" / "poll.json"
+# Arguments that define the workload; the rest (output, tolerance) don't change the numbers.
+WORKLOAD = ("feeds", "items", "size", "churn", "latency", "errors", "rules", "polls", "loop", "concurrency", "parse_workers")
+# metric -> True when higher is better
+METRICS = {
+    "polls_per_sec": True,
+    "entries_per_sec": True,
+    "feed_p50_ms": False,
+    "feed_p99_ms": False,
+    "peak_rss_mib": False,
+    "sqlite_rows_written": False,
+    "sqlite_bytes_written": False,
+}
+# Titles draw on VOCAB, which rules are picked from; descriptions only on FILLER, so the
+# alert rate stays near rules * 6 / len(VOCAB) per new entry whatever --size is.
+VOCAB = [f"w{i:04d}" for i in range(5000)]
+FILLER = [f"lorem{i}" for i in range(500)]
+
+
+# ---- feed farm (runs in its own process) ----
+
+
+@functools.lru_cache(maxsize=500_000)
+def _item(feed: int, n: int, size: int) -> str:
+    rnd = random.Random(feed * 1_000_003 + n)
+    title = " ".join(rnd.choice(VOCAB) for _ in range(6))
+    body = (" ".join(rnd.choice(FILLER) for _ in range(size // 7 + 1)))[:size]
+    return (
+        f"<item><title>{title}</title><link>http://farm.test/{feed}/{n}</link><guid>f{feed}-{n}</guid>"
+        f"<pubDate>Mon, 01 Jan 2024 00:00:00 GMT</pubDate><description>{body}</description></item>"
+    )
+
+
+def _farm(port: int, items: int, size: int, churn: float, latency: float, errors: float) -> None:
+    import uvicorn
+    from starlette.applications import Starlette
+    from starlette.requests import Request
+    from starlette.responses import Response
+    from starlette.routing import Route
+
+    fetches: dict[int, int] = {}
+    rnd = random.Random(42)
+    per_fetch = items * churn
+
+    async def feed(request: Request) -> Response:
+        fid = int(request.path_params["fid"])
+        if latency:
+            await asyncio.sleep(latency / 1000 * rnd.uniform(0.5, 1.5))
+        if rnd.random() < errors:
+            return Response("boom", status_code=500)
+        g = fetches[fid] = fetches.get(fid, -1) + 1
+        newest = items + int(g * per_fetch)
+        etag = f'"{newest}"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        body = "".join(_item(fid, n, size) for n in range(newest, newest - items, -1))
+        doc = f'<?xml version="1.0"?><rss version="2.0"><channel><title>Feed {fid}</title>{body}</channel></rss>'
+        return Response(doc, media_type="application/rss+xml", headers={"ETag": etag})
+
+    app = Starlette(routes=[Route("/feed/{fid:int}.xml", feed)])
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for(port: int, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as s:
+            if s.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.05)
+    raise SystemExit("feed farm did not start")
+
+
+# ---- harness ----
+
+
+class Recording(metrics.Registry):
+    """Keeps every feed's exact time too; the registry's histograms only have bucket bounds."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.feed_seconds: list[float] = []
+
+    def record_feed(self, feed_id, name, sw, **kw) -> None:
+        self.feed_seconds.append(sw.total())
+        super().record_feed(feed_id, name, sw, **kw)
+
+
+def _bytes_written() -> int | None:
+    try:
+        for line in Path("/proc/self/io").read_text().splitlines():
+            if line.startswith("write_bytes:"):
+                return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _pct(xs: list[float], q: float) -> float:
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(q * len(xs)))] if xs else 0.0
+
+
+def _seed(port: int, args: argparse.Namespace) -> None:
+    rnd = random.Random(7)
+    with db.connect() as con:
+        con.executemany(
+            "INSERT INTO feeds(name, url, enabled, armed) VALUES(?, ?, 1, 0)",
+            [(f"Feed {i}", f"http://127.0.0.1:{port}/feed/{i}.xml") for i in range(1, args.feeds + 1)],
+        )
+        con.executemany(
+            "INSERT INTO rules(keyword, feed_id, enabled, created_at) VALUES(?, NULL, 1, '2000-01-01 00:00:00')",
+            [(w,) for w in rnd.sample(VOCAB, args.rules)],
+        )
+        for k, v in (
+            ("fetch_concurrency", args.concurrency),
+            # Every farm feed is on 127.0.0.1; don't let the per-host cap stand in for the farm.
+            ("fetch_per_host", args.concurrency),
+            ("parse_workers", args.parse_workers),
+            ("poll_interval_seconds", 60),
+            ("poll_min_interval_seconds", 60),
+        ):
+            db.kv_set(con, k, str(v))
+
+
+async def _measure(args: argparse.Namespace) -> dict[str, float]:
+    http = HttpPool(max_connections=args.concurrency, max_keepalive=args.concurrency)
+    parser = ParsePool(workers=args.parse_workers)
+    try:
+        await watcher.poll_once(http, None, parser)  # baseline pass
+        reg = metrics._registry = Recording()
+        with db.writer() as con:
+            rows0 = con.total_changes
+        bytes0 = _bytes_written()
+        t0 = time.perf_counter()
+        if args.loop:
+            # Everything due now; after that the scheduler paces feeds (60 s minimum interval).
+            with db.writer() as con:
+                scheduler.defer(con, [r[0] for r in con.execute("SELECT id FROM feeds")], 0)
+            stop = asyncio.Event()
+            task = asyncio.create_task(watcher.run_loop(stop, http, parser))
+            await asyncio.sleep(args.loop)
+            stop.set()
+            await task
+        else:
+            for _ in range(args.polls):
+                await watcher.poll_once(http, None, parser)
+        wall = time.perf_counter() - t0
+        with db.writer() as con:
+            rows = con.total_changes - rows0
+        bytes1 = _bytes_written()
+    finally:
+        await http.aclose()
+        parser.close()
+
+    snap = reg.snapshot()
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    rss_children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return {
+        "polls": snap["polls"],
+        "wall_seconds": round(wall, 3),
+        "polls_per_sec": round(snap["polls"] / wall, 4),
+        "entries_per_sec": round(snap["entries_seen"] / wall, 1),
+        "new_entries_per_sec": round(snap["entries_new"] / wall, 1),
+        "alerts": snap["alerts"],
+        "feed_errors": snap["feed_errors"],
+        "mib_downloaded": round(snap["bytes_downloaded"] / 1048576, 2),
+        "feed_p50_ms": round(_pct(reg.feed_seconds, 0.50) * 1000, 2),
+        "feed_p99_ms": round(_pct(reg.feed_seconds, 0.99) * 1000, 2),
+        "peak_rss_mib": round(rss, 1),
+        # Largest single child; the farm process is one of them.
+        "peak_child_rss_mib": round(rss_children, 1),
+        "sqlite_rows_written": rows,
+        "sqlite_bytes_written": (bytes1 - bytes0) if bytes0 is not None and bytes1 is not None else None,
+        "stage_seconds": snap["stage_seconds"],
+    }
+
+
+def _compare(result: dict, baseline: dict | None, tolerance: float) -> list[str]:
+    regressions = []
+    print(f"{'metric':<22}{'now':>14}{'baseline':>14}{'change':>10}")
+    for name, higher_better in METRICS.items():
+        now = result.get(name)
+        base = (baseline or {}).get(name)
+        if now is None:
+            continue
+        line = f"{name:<22}{now:>14,}"
+        if base:
+            change = (now - base) / base
+            worse = -change if higher_better else change
+            flag = "  REGRESSION" if worse > tolerance else ""
+            if flag:
+                regressions.append(name)
+            line += f"{base:>14,}{change:>+10.1%}{flag}"
+        print(line)
+    return regressions
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--feeds", type=int, default=1000)
+    ap.add_argument("--items", type=int, default=50, help="items per feed document")
+    ap.add_argument("--size", type=int, default=800, help="bytes of description per item")
+    ap.add_argument("--churn", type=float, default=0.1, help="fraction of items that are new on each fetch")
+    ap.add_argument("--latency", type=float, default=20.0, help="mean response delay, ms")
+    ap.add_argument("--errors", type=float, default=0.01, help="fraction of fetches answered with a 500")
+    ap.add_argument("--rules", type=int, default=200)
+    ap.add_argument("--polls", type=int, default=3, help="measured polls after the baseline pass")
+    ap.add_argument(
+        "--loop", type=float, default=0.0, help="run run_loop for this many seconds instead of --polls polls"
+    )
+    ap.add_argument("--concurrency", type=int, default=64)
+    ap.add_argument("--parse-workers", type=int, default=min(2, os.cpu_count() or 1))
+    ap.add_argument("--tolerance", type=float, default=0.10, help="allowed change before flagging a regression")
+    ap.add_argument("--save", action="store_true", help="store this run as the baseline for its workload")
+    ap.add_argument("--check", action="store_true", help="exit 1 if any metric regressed past --tolerance")
+    args = ap.parse_args()
+
+    workload = {k: getattr(args, k) for k in WORKLOAD}
+    key = hashlib.blake2b(json.dumps(workload, sort_keys=True).encode(), digest_size=6).hexdigest()
+    port = _free_port()
+    farm = multiprocessing.get_context("spawn").Process(
+        target=_farm, args=(port, args.items, args.size, args.churn, args.latency, args.errors), daemon=True
+    )
+    farm.start()
+    try:
+        _wait_for(port)
+        with tempfile.TemporaryDirectory() as tmp:
+            os.environ["RSSWATCHER_DB_PATH"] = str(Path(tmp) / "bench.db")
+            db.migrate()
+            _seed(port, args)
+            result = asyncio.run(_measure(args))
+            db.close_all()
+            seen.reset()
+    finally:
+        farm.terminate()
+        farm.join()
+
+    print(" ".join(f"{k}={v}" for k, v in workload.items()))
+    print(
+        f"{result['polls']} polls in {result['wall_seconds']}s, {result['alerts']} alerts, "
+        f"{result['feed_errors']} feed errors, {result['mib_downloaded']} MiB downloaded"
+    )
+    print("stage seconds: " + ", ".join(f"{s} {v}" for s, v in result["stage_seconds"].items()))
+
+    stored = json.loads(BASELINES.read_text()) if BASELINES.exists() else {}
+    baseline = stored.get(key)
+    if baseline and baseline.get("machine") != platform.node():
+        print(f"note: baseline recorded on {baseline.get('machine')}, not this machine")
+    regressions = _compare(result, baseline, args.tolerance)
+
+    if args.save:
+        stored[key] = {
+            "workload": workload,
+            "machine": platform.node(),
+            "python": platform.python_version(),
+            "recorded_at": time.strftime("%Y-%m-%d"),
+            **{k: result[k] for k in METRICS if result.get(k) is not None},
+        }
+        BASELINES.parent.mkdir(exist_ok=True)
+        BASELINES.write_text(json.dumps(stored, indent=2, sort_keys=True) + "\n")
+        print(f"baseline {key} saved to {BASELINES.relative_to(Path.cwd()) if BASELINES.is_relative_to(Path.cwd()) else BASELINES}")
+    if args.check and regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
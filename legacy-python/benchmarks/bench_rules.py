@@ -0,0 +1,150 @@
+"""
+Mixed rule kinds (substring, whole word, regex, all-of / none-of, title-only) through the
+compiled RuleMatcher vs. evaluating every rule on its own, per entry.
+
+    python benchmarks/bench_rules.py [--rules 5000] [--entries 500] [--regex 0.1] [--unanchored 0.1]
+
+`--regex` is the fraction of regex rules; `--unanchored` the fraction of those with no
+required literal, which the compiled matcher has to run on every entry.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import re
+import string
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from rss_watcher.matcher import RuleMatcher, compile_regex, normalize_keyword, split_terms  # noqa: E402
+
+
+def _word(rnd: random.Random) -> str:
+    return "".join(rnd.choice(string.ascii_lowercase) for _ in range(rnd.randint(4, 10)))
+
+
+def make_rules(n: int, regex_share: float, unanchored: float, rnd: random.Random) -> list[dict]:
+    rules = []
+    for i in range(n):
+        roll = rnd.random()
+        rule = {
+            "id": i + 1,
+            "keyword": _word(rnd),
+            "feed_id": rnd.choice([None, None, None, rnd.randint(1, 50)]),
+            "created_at": "2024-01-01 00:00:00",
+            "kind": "keyword",
+            "field": "any",
+            "all_of": None,
+            "none_of": None,
+        }
+        if roll < regex_share:
+            rule["kind"] = "regex"
+            if rnd.random() < unanchored:
+                rule["keyword"] = rf"[a-z]{{{rnd.randint(12, 16)}}}\d"
+            else:
+                rule["keyword"] = rf"\b{_word(rnd)}[- ]?\d{{2,4}}\b"
+        elif roll < regex_share + 0.15:
+            rule["kind"] = "word"
+        elif roll < regex_share + 0.30:
+            rule["all_of"] = _word(rnd)
+            rule["none_of"] = _word(rnd)
+        elif roll < regex_share + 0.40:
+            rule["field"] = "title"
+        rules.append(rule)
+    return rules
+
+
+def make_entries(n: int, rules: list[dict], rnd: random.Random) -> list[tuple[str, str]]:
+    plain = [r for r in rules if r["kind"] != "regex"]
+    out = []
+    for _ in range(n):
+        words = [_word(rnd) for _ in range(rnd.randint(80, 300))]
+        for r in rnd.sample(plain, k=min(3, len(plain))):
+            words.insert(rnd.randrange(len(words)), r["keyword"].upper())
+            for t in split_terms(r["all_of"]):
+                words.insert(rnd.randrange(len(words)), t)
+        title = " ".join(_word(rnd) for _ in range(8))
+        out.append((title, " ".join(words)))
+    return out
+
+
+class PerRule:
+    """Every rule compiled on its own and checked against every entry."""
+
+    def __init__(self, rules: list[dict]) -> None:
+        self.rules = []
+        for r in rules:
+            word = r["kind"] == "word"
+
+            def term(t: str, word: bool = word) -> re.Pattern:
+                t = re.escape(normalize_keyword(t).lower())
+                return re.compile(rf"(?<!\w){t}(?!\w)" if word else t)
+
+            main = compile_regex(r["keyword"]) if r["kind"] == "regex" else term(r["keyword"])
+            self.rules.append(
+                (
+                    r,
+                    main,
+                    [term(t) for t in split_terms(r["all_of"])],
+                    [term(t) for t in split_terms(r["none_of"])],
+                )
+            )
+
+    def find(self, feed_id: int, title: str, body: str) -> list[int]:
+        texts = {"title": title, "body": body, "any": f"{title}\n{body}"}
+        out = []
+        for r, main, all_of, none_of in self.rules:
+            if r["feed_id"] is not None and r["feed_id"] != feed_id:
+                continue
+            text = texts[r["field"]]
+            if not main.search(text):
+                continue
+            if all(p.search(text) for p in all_of) and not any(p.search(text) for p in none_of):
+                out.append(r["id"])
+        return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rules", type=int, default=5000)
+    ap.add_argument("--entries", type=int, default=500)
+    ap.add_argument("--regex", type=float, default=0.1)
+    ap.add_argument("--unanchored", type=float, default=0.1)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    rnd = random.Random(args.seed)
+    rules = make_rules(args.rules, args.regex, args.unanchored, rnd)
+    entries = [(t.lower(), b.lower()) for t, b in make_entries(args.entries, rules, rnd)]
+    feed_ids = [rnd.randint(1, 50) for _ in entries]
+
+    t0 = time.perf_counter()
+    naive = PerRule(rules)
+    naive_build = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    matcher = RuleMatcher(rules)
+    build = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    old = [naive.find(fid, t, b) for fid, (t, b) in zip(feed_ids, entries)]
+    naive_elapsed = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    new = [[m.rule_id for m in matcher.find_fields(fid, t, b)] for fid, (t, b) in zip(feed_ids, entries)]
+    elapsed = time.perf_counter() - t0
+
+    kinds = {k: sum(r["kind"] == k for r in rules) for k in ("keyword", "word", "regex")}
+    print(
+        f"rules={len(rules)} ({kinds}) entries={len(entries)} "
+        f"avg body={sum(len(b) for _, b in entries) // len(entries)} chars"
+    )
+    print(f"  per-rule  build {naive_build * 1000:7.1f} ms   {len(entries) / naive_elapsed:9.1f} entries/sec")
+    print(f"  compiled  build {build * 1000:7.1f} ms   {len(entries) / elapsed:9.1f} entries/sec")
+    print(f"  speedup {naive_elapsed / elapsed:.1f}x   results identical: {old == new}")
+
+
+if __name__ == "__main__":
+    main()
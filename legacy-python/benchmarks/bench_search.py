@@ -0,0 +1,130 @@
+"""
+Search and rule dry-run latency over the entries FTS index, against the LIKE scan it
+replaces, on a generated database.
+
+    python benchmarks/bench_search.py [--entries 1000000] [--runs 20] [--db /tmp/bench-search.db]
+
+Entries get a Zipf-ish vocabulary, so queries range from rare to very common terms. The
+database is reused when it already has enough entries; delete it to rebuild.
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from rss_watcher import db, search  # noqa: E402
+
+
+def vocabulary(n: int, rnd: random.Random) -> list[str]:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rnd.choice(letters) for _ in range(rnd.randint(4, 10))) for _ in range(n)]
+
+
+def populate(con, entries: int, vocab: list[str], rnd: random.Random, batch: int = 10_000) -> float:
+    cum = list(itertools.accumulate(1 / (i + 1) for i in range(len(vocab))))
+    con.execute("INSERT OR IGNORE INTO feeds(id, name, url) VALUES(1, 'Bench', 'https://bench.test/rss')")
+    base = con.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+    # Only the inserts are timed, in poll-sized transactions.
+    elapsed = 0.0
+    for start in range(0, entries, batch):
+        rows = []
+        for i in range(base + start, base + min(entries, start + batch)):
+            words = rnd.choices(vocab, cum_weights=cum, k=48)
+            rows.append((1, f"k{i}", f"https://bench.test/{i}", " ".join(words[:8]).capitalize(), " ".join(words[8:])))
+        t0 = time.perf_counter()
+        for chunk in range(0, len(rows), 50):
+            with db.transaction(con):
+                con.executemany(
+                    "INSERT INTO entries(feed_id, entry_key, link, title, summary) VALUES(?, ?, ?, ?, ?)",
+                    rows[chunk : chunk + 50],
+                )
+        elapsed += time.perf_counter() - t0
+        print(f"\r  inserted {min(entries, start + batch):,}", end="", file=sys.stderr)
+    print(file=sys.stderr)
+    return elapsed
+
+
+def timed(fn, runs: int) -> tuple[float, float, int]:
+    samples = []
+    n = 0
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        n = fn()
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    p99 = samples[min(len(samples) - 1, round(len(samples) * 0.99))]
+    return statistics.median(samples) * 1000, p99 * 1000, n
+
+
+def like_scan(con, term: str) -> int:
+    # What search would cost without the index: newest 50 entries containing the term.
+    pattern = f"%{term}%"
+    return len(
+        con.execute(
+            "SELECT id FROM entries WHERE title LIKE ? OR summary LIKE ? ORDER BY id DESC LIMIT 50",
+            (pattern, pattern),
+        ).fetchall()
+    )
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--entries", type=int, default=1_000_000)
+    ap.add_argument("--runs", type=int, default=20)
+    ap.add_argument("--db", default="/tmp/bench-search.db")
+    ap.add_argument("--rebuild", action="store_true", help="also time a full index rebuild (the migration backfill)")
+    args = ap.parse_args()
+
+    os.environ["RSSWATCHER_DB_PATH"] = args.db
+    rnd = random.Random(1)
+    vocab = vocabulary(20_000, rnd)
+    db.migrate()
+    with db.connect() as con:
+        have = con.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        if have < args.entries:
+            elapsed = populate(con, args.entries - have, vocab, rnd)
+            print(f"insert with index maintenance: {(args.entries - have) / elapsed:,.0f} entries/sec")
+        if args.rebuild:
+            t0 = time.perf_counter()
+            con.execute("INSERT INTO entries_fts(entries_fts) VALUES ('rebuild')")
+            print(f"index rebuild: {time.perf_counter() - t0:.1f} s")
+        total = con.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        print(f"entries={total:,} db size={os.path.getsize(args.db) / 1048576:,.0f} MiB")
+
+        cases = {
+            "common term": vocab[0],
+            "mid term": vocab[500],
+            "rare term": vocab[15_000],
+            "two terms": f"{vocab[3]} {vocab[40]}",
+            "substring": vocab[200][1:-1],
+            "no match": "zzzzqqqq",
+        }
+        print(f"\n{'query':<14}{'search p50':>12}{'p99':>10}{'hits':>6}   {'LIKE scan p50':>14}")
+        for label, q in cases.items():
+            p50, p99, hits = timed(lambda: len(search.search(con, q)), args.runs)
+            like = timed(lambda: like_scan(con, search.terms(q)[0]), max(1, args.runs // 10))[0]
+            print(f"{label:<14}{p50:>10.1f}ms{p99:>8.1f}ms{hits:>6}   {like:>12.1f}ms")
+
+        rules = {
+            "keyword": {"keyword": vocab[700]},
+            "word + all_of": {"keyword": vocab[20], "kind": "word", "all_of": vocab[300]},
+            "title regex": {"keyword": rf"{vocab[90]}\s+\w+", "kind": "regex", "field": "title"},
+            "unindexed": {"keyword": r"\d+", "kind": "regex"},
+        }
+        print(f"\n{'dry run':<14}{'p50':>12}{'p99':>10}{'hits':>6}")
+        for label, rule in rules.items():
+            p50, p99, hits = timed(lambda: len(search.dry_run(con, {"feed_id": None, **rule}).hits), args.runs)
+            print(f"{label:<14}{p50:>10.1f}ms{p99:>8.1f}ms{hits:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+How poll capacity scales with sharded workers: starts 1, 2, ... `python -m rss_watcher.worker
+--sharded` equivalents (as processes on this machine) against the bench_poll feed farm and
+times how long they take together to poll every feed once.
+
+    python benchmarks/bench_shards.py [--workers 1,2,4] [--feeds 2000] [--latency 20]
+                                      [--concurrency 64] [--parse-workers 1]
+
+Each run gets a fresh database, seeded and baselined as in bench_poll. The workers are
+left to join and even out their shares before the feeds come due, so the timing is of
+steady-state sharded polling, not of the first worker grabbing everything at startup.
+Reports the drain time, feeds/sec and the speedup over the first --workers value, plus
+each shard's share and busy throughput as /stats shows it.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import bench_poll  # noqa: E402
+from rss_watcher import db, scheduler, seen, shards, watcher, worker  # noqa: E402
+from rss_watcher.httppool import HttpPool  # noqa: E402
+from rss_watcher.parse import ParsePool  # noqa: E402
+
+# Short leases so joins settle in about a second; production uses --lease-seconds 30.
+TTL = 3.0
+SETTLE = 15.0
+
+
+def _worker(db_path: str, concurrency: int, parse_workers: int, done) -> None:
+    os.environ["RSSWATCHER_DB_PATH"] = db_path
+
+    async def run() -> None:
+        stop = asyncio.Event()
+        http = HttpPool(max_connections=concurrency, max_keepalive=concurrency)
+        parser = ParsePool(workers=parse_workers)
+        task = asyncio.create_task(worker.run_shard(stop, http, parser, shards.Shard(ttl=TTL)))
+        try:
+            while not done.is_set():
+                await asyncio.sleep(0.1)
+        finally:
+            stop.set()
+            await task
+            await http.aclose()
+            parser.close()
+
+    asyncio.run(run())
+
+
+def _wait(check, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if check():
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def _run(n: int, port: int, args: argparse.Namespace) -> dict:
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "bench.db")
+        os.environ["RSSWATCHER_DB_PATH"] = path
+        db.migrate()
+        bench_poll._seed(port, args)
+
+        async def baseline() -> None:
+            http = HttpPool(max_connections=args.concurrency, max_keepalive=args.concurrency)
+            try:
+                await watcher.poll_once(http, None, ParsePool(workers=0))
+            finally:
+                await http.aclose()
+
+        asyncio.run(baseline())
+
+        # Everything comes due at once, a little later: time for the workers to start and
+        # settle, and their poll loops sleep until then rather than until the next re-sync.
+        t0 = time.time() + SETTLE
+        with db.connect() as con:
+            scheduler.defer(con, [r[0] for r in con.execute("SELECT id FROM feeds")], 0)
+            con.execute("UPDATE feed_schedule SET next_due_at = ?", (t0,))
+
+        done = ctx.Event()
+        procs = [ctx.Process(target=_worker, args=(path, args.concurrency, args.parse_workers, done)) for _ in range(n)]
+        for p in procs:
+            p.start()
+        try:
+
+            def report() -> list[dict]:
+                with db.connect() as con:
+                    return shards.report(con)
+
+            def balanced() -> bool:
+                owned = [s["feeds"] for s in report()]
+                return len(owned) == n and sum(owned) == args.feeds and max(owned) - min(owned) <= 1
+
+            if not _wait(balanced, t0 - time.time()):
+                raise SystemExit(f"{n} workers did not settle on even shares within {SETTLE}s")
+
+            def drained() -> bool:
+                with db.connect() as con:
+                    polled = con.execute("SELECT COUNT(*) FROM feed_schedule WHERE last_polled_at >= ?", (t0,)).fetchone()[0]
+                return polled >= args.feeds
+
+            if not _wait(drained, 600):
+                raise SystemExit(f"{n} workers did not poll every feed within 10 minutes")
+            wall = time.time() - t0
+            # Until each shard's next heartbeat has published its finished poll.
+            _wait(lambda: sum(s["feeds_polled"] for s in report()) >= args.feeds and all(s["polls"] for s in report()), 30)
+            rows = report()
+        finally:
+            done.set()
+            for p in procs:
+                p.join(30)
+            db.close_all()
+            seen.reset()
+    return {"workers": n, "wall": wall, "feeds_per_sec": args.feeds / wall, "shards": rows}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--workers", default="1,2,4", help="comma-separated worker counts to compare")
+    ap.add_argument("--feeds", type=int, default=2000)
+    ap.add_argument("--items", type=int, default=50)
+    ap.add_argument("--size", type=int, default=800)
+    ap.add_argument("--churn", type=float, default=0.1)
+    ap.add_argument("--latency", type=float, default=20.0)
+    ap.add_argument("--errors", type=float, default=0.01)
+    ap.add_argument("--rules", type=int, default=200)
+    ap.add_argument("--concurrency", type=int, default=64, help="fetch concurrency per worker")
+    ap.add_argument("--parse-workers", type=int, default=1, help="parse processes per worker")
+    args = ap.parse_args()
+
+    port = bench_poll._free_port()
+    farm = multiprocessing.get_context("spawn").Process(
+        target=bench_poll._farm,
+        args=(port, args.items, args.size, args.churn, args.latency, args.errors),
+        daemon=True,
+    )
+    farm.start()
+    try:
+        bench_poll._wait_for(port)
+        results = [_run(int(n), port, args) for n in args.workers.split(",")]
+    finally:
+        farm.terminate()
+        farm.join()
+
+    print(f"{args.feeds} feeds, {os.cpu_count()} CPUs")
+    print(f"{'workers':>8}{'seconds':>10}{'feeds/s':>10}{'speedup':>9}   shares (feeds, busy feeds/s)")
+    first = results[0]["feeds_per_sec"]
+    for r in results:
+        shares = ", ".join(f"{s['feeds']}@{s['busy_feeds_per_second']}" for s in r["shards"])
+        print(f"{r['workers']:>8}{r['wall']:>10.1f}{r['feeds_per_sec']:>10.1f}{r['feeds_per_sec'] / first:>8.2f}x   {shares}")
+
+
+if __name__ == "__main__":
+    main()
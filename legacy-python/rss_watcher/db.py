@@ -1,10 +1,13 @@
 from __future__ import annotations
 
+import asyncio
 import os
 import sqlite3
-from contextlib import contextmanager
+import threading
+import time
+from contextlib import contextmanager, nullcontext
 from pathlib import Path
-from typing import Iterator
+from typing import ContextManager, Iterator
 
 
 def db_path() -> str:
@@ -15,18 +18,229 @@ def ensure_parent_dir(path: str) -> None:
     Path(path).expanduser().resolve().parent.mkdir(parents=True, exist_ok=True)
 
 
-@contextmanager
-def connect() -> Iterator[sqlite3.Connection]:
+# Applied once per connection when it is opened, not on every checkout.
+# synchronous=NORMAL is durable across app crashes in WAL mode (a power loss may drop the
+# last commits); cache_size is in KiB when negative.
+_PRAGMAS = (
+    "PRAGMA foreign_keys=ON;",
+    "PRAGMA synchronous=NORMAL;",
+    "PRAGMA cache_size=-16384;",
+    "PRAGMA mmap_size=268435456;",
+    "PRAGMA temp_store=MEMORY;",
+)
+
+
+class LogBuffer:
+    """
+    app_log rows waiting to be written.
+
+    Rows are inserted in batches (when the buffer fills, on a timer, or before the logs are
+    read) and the table is trimmed to `log_max_rows` every so often instead of per insert.
+    """
+
+    def __init__(self, *, flush_rows: int = 200, max_rows_ttl: float = 60.0) -> None:
+        self.flush_rows = flush_rows
+        self.max_rows_ttl = max_rows_ttl
+        self._rows: list[tuple] = []
+        self._lock = threading.Lock()
+        self._max_rows: int | None = None
+        self._max_rows_at = 0.0
+        self._since_trim = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def append(self, row: tuple) -> int:
+        with self._lock:
+            self._rows.append(row)
+            return len(self._rows)
+
+    def invalidate(self) -> None:
+        self._max_rows = None
+
+    def max_rows(self, con: sqlite3.Connection) -> int:
+        now = time.monotonic()
+        if self._max_rows is None or now - self._max_rows_at > self.max_rows_ttl:
+            self._max_rows = kv_int(con, "log_max_rows", 2000, minimum=200)
+            self._max_rows_at = now
+        return self._max_rows
+
+    def flush(self, con: sqlite3.Connection) -> int:
+        with self._lock:
+            rows, self._rows = self._rows, []
+        if not rows:
+            return 0
+        try:
+            # Join the caller's transaction if there is one; otherwise batch in our own.
+            with nullcontext(con) if con.in_transaction else transaction(con):
+                # A feed or rule deleted since the row was queued becomes NULL, as ON DELETE
+                # SET NULL would have made it, instead of failing the batch on every flush.
+                con.executemany(
+                    """
+                    INSERT INTO app_log(ts, level, area, message, feed_id, rule_id, entry_link, error)
+                    VALUES(?, ?, ?, ?, (SELECT id FROM feeds WHERE id = ?), (SELECT id FROM rules WHERE id = ?), ?, ?)
+                    """,
+                    rows,
+                )
+                max_rows = self.max_rows(con)
+                self._since_trim += len(rows)
+                # Keep logs bounded (default 2000 rows, may overshoot by ~10% between trims).
+                if self._since_trim >= max(50, max_rows // 10):
+                    con.execute(
+                        "DELETE FROM app_log WHERE id < (SELECT COALESCE(MAX(id) - ?, 0) FROM app_log)",
+                        (max_rows,),
+                    )
+                    self._since_trim = 0
+        except BaseException:
+            with self._lock:
+                self._rows[:0] = rows
+            raise
+        return len(rows)
+
+
+class ConnectionManager:
+    """
+    Connections for one database file.
+
+    `connect()` hands out connections from a small pool (the web handlers); `writer()` is a
+    single long-lived connection reserved for the watcher. Connections run in autocommit
+    mode, so anything left in an open transaction is rolled back before reuse.
+    """
+
+    def __init__(self, path: str, *, pool_size: int = 4) -> None:
+        ensure_parent_dir(path)
+        self.path = path
+        self.pool_size = pool_size
+        self.opened = 0
+        self._idle: list[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._writer: sqlite3.Connection | None = None
+        self._writer_lock = threading.RLock()
+        self._closed = False
+        self.logs = LogBuffer()
+        with self.connect() as con:
+            # Both are properties of the database file, so they only need setting once.
+            # auto_vacuum only takes effect on a new file (before WAL writes the header);
+            # older files need a one-off `python -m rss_watcher.retention --vacuum`.
+            con.execute("PRAGMA auto_vacuum=INCREMENTAL;")
+            con.execute("PRAGMA journal_mode=WAL;")
+
+    def _open(self) -> sqlite3.Connection:
+        con = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        con.row_factory = sqlite3.Row
+        for pragma in _PRAGMAS:
+            con.execute(pragma)
+        self.opened += 1
+        return con
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            con = self._idle.pop() if self._idle else None
+        if con is None:
+            con = self._open()
+        try:
+            yield con
+        finally:
+            if con.in_transaction:
+                con.rollback()
+            with self._lock:
+                if not self._closed and len(self._idle) < self.pool_size:
+                    self._idle.append(con)
+                    con = None
+            if con is not None:
+                con.close()
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        # Re-entrant so nested helpers in the watcher can share the one connection.
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = self._open()
+            yield self._writer
+
+    def close(self) -> None:
+        if len(self.logs):
+            try:
+                with self.writer() as con:
+                    self.logs.flush(con)
+            except sqlite3.Error:
+                pass
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for con in idle:
+            con.close()
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+
+_managers: dict[str, ConnectionManager] = {}
+_managers_lock = threading.Lock()
+
+
+def manager() -> ConnectionManager:
+    # Keyed by the configured path string so the hot path is a dict lookup, not a realpath().
     path = db_path()
-    ensure_parent_dir(path)
-    con = sqlite3.connect(path, timeout=30, isolation_level=None)
+    mgr = _managers.get(path)
+    if mgr is None:
+        with _managers_lock:
+            mgr = _managers.get(path)
+            if mgr is None:
+                mgr = _managers[path] = ConnectionManager(path)
+    return mgr
+
+
+def connect() -> ContextManager[sqlite3.Connection]:
+    return manager().connect()
+
+
+def writer() -> ContextManager[sqlite3.Connection]:
+    return manager().writer()
+
+
+def flush_logs() -> int:
+    with connect() as con:
+        return manager().logs.flush(con)
+
+
+async def run_log_flusher(stop_event: asyncio.Event, *, every: float = 2.0) -> None:
+    while not stop_event.is_set():
+        try:
+            await asyncio.wait_for(stop_event.wait(), timeout=every)
+        except asyncio.TimeoutError:
+            pass
+        try:
+            flush_logs()
+        except Exception:
+            pass
+
+
+def close_all() -> None:
+    with _managers_lock:
+        mgrs = list(_managers.values())
+        _managers.clear()
+    for mgr in mgrs:
+        mgr.close()
+
+
+@contextmanager
+def transaction(con: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    """
+    Run a block in one write transaction (one fsync instead of one per statement).
+
+    BEGIN IMMEDIATE takes the write lock up front so we wait on busy_timeout here rather than
+    failing part-way through on a lock upgrade.
+    """
+    con.execute("BEGIN IMMEDIATE")
     try:
-        con.row_factory = sqlite3.Row
-        con.execute("PRAGMA journal_mode=WAL;")
-        con.execute("PRAGMA foreign_keys=ON;")
         yield con
-    finally:
-        con.close()
+    except BaseException:
+        con.rollback()
+        raise
+    con.execute("COMMIT")
 
 
 def _has_column(con: sqlite3.Connection, table: str, column: str) -> bool:
@@ -40,6 +254,60 @@ def _ensure_column(con: sqlite3.Connection, table: str, column: str, ddl: str) -
     con.execute(f"ALTER TABLE {table} ADD COLUMN {ddl}")
 
 
+def _ensure_entries_fts(con: sqlite3.Connection) -> None:
+    """
+    Trigram FTS5 index over entry titles and summaries, kept in step with `entries` by
+    triggers (so ingest, retention strips and deletes all maintain it).
+
+    External content, so the text isn't stored twice. Trigram tokens make MATCH a
+    case-insensitive substring search, the same thing keyword rules do. Existing rows are
+    indexed once, when the table is first created.
+    """
+    if con.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'entries_fts'").fetchone():
+        return
+    try:
+        with transaction(con):
+            con.execute(
+                """
+                CREATE VIRTUAL TABLE entries_fts USING fts5(
+                  title, summary, content='entries', content_rowid='id', tokenize='trigram'
+                )
+                """
+            )
+            con.execute(
+                """
+                CREATE TRIGGER entries_fts_ai AFTER INSERT ON entries BEGIN
+                  INSERT INTO entries_fts(rowid, title, summary) VALUES (new.id, new.title, new.summary);
+                END
+                """
+            )
+            con.execute(
+                """
+                CREATE TRIGGER entries_fts_ad AFTER DELETE ON entries BEGIN
+                  INSERT INTO entries_fts(entries_fts, rowid, title, summary)
+                  VALUES ('delete', old.id, old.title, old.summary);
+                END
+                """
+            )
+            con.execute(
+                """
+                CREATE TRIGGER entries_fts_au AFTER UPDATE OF title, summary ON entries BEGIN
+                  INSERT INTO entries_fts(entries_fts, rowid, title, summary)
+                  VALUES ('delete', old.id, old.title, old.summary);
+                  INSERT INTO entries_fts(rowid, title, summary) VALUES (new.id, new.title, new.summary);
+                END
+                """
+            )
+            con.execute("INSERT INTO entries_fts(entries_fts) VALUES ('rebuild')")
+    except sqlite3.OperationalError:
+        # SQLite without FTS5 or the trigram tokenizer (< 3.34): search is unavailable.
+        return
+
+
+def fts_available(con: sqlite3.Connection) -> bool:
+    return con.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'entries_fts'").fetchone() is not None
+
+
 def migrate() -> None:
     with connect() as con:
         con.executescript(
@@ -50,6 +318,9 @@ def migrate() -> None:
               url TEXT NOT NULL UNIQUE,
               enabled INTEGER NOT NULL DEFAULT 1,
               armed INTEGER NOT NULL DEFAULT 1,
+              retention_days INTEGER NULL,
+              retention_max_entries INTEGER NULL,
+              full_parse INTEGER NOT NULL DEFAULT 0,
               created_at TEXT NOT NULL DEFAULT (datetime('now'))
             );
 
@@ -58,6 +329,10 @@ def migrate() -> None:
               keyword TEXT NOT NULL,
               feed_id INTEGER NULL REFERENCES feeds(id) ON DELETE CASCADE,
               enabled INTEGER NOT NULL DEFAULT 1,
+              kind TEXT NOT NULL DEFAULT 'keyword',
+              field TEXT NOT NULL DEFAULT 'any',
+              all_of TEXT NULL,
+              none_of TEXT NULL,
               created_at TEXT NOT NULL DEFAULT (datetime('now'))
             );
 
@@ -79,6 +354,7 @@ def migrate() -> None:
               rule_id INTEGER NOT NULL REFERENCES rules(id) ON DELETE CASCADE,
               keyword TEXT NOT NULL,
               created_at TEXT NOT NULL DEFAULT (datetime('now')),
+              feed_id INTEGER NULL REFERENCES feeds(id) ON DELETE CASCADE,
               UNIQUE(entry_id, rule_id)
             );
 
@@ -98,12 +374,161 @@ def migrate() -> None:
               entry_link TEXT NULL,
               error TEXT NULL
             );
+
+            -- HTTP validators from the last successful fetch, used for conditional GETs.
+            CREATE TABLE IF NOT EXISTS feed_http_cache (
+              feed_id INTEGER PRIMARY KEY REFERENCES feeds(id) ON DELETE CASCADE,
+              url TEXT NOT NULL,
+              etag TEXT NULL,
+              last_modified TEXT NULL,
+              content_hash TEXT NULL,
+              last_status INTEGER NULL,
+              checked_at TEXT NOT NULL DEFAULT (datetime('now'))
+            );
+
+            -- Outbound notifications, written with their alert and drained by outbox.Dispatcher.
+            CREATE TABLE IF NOT EXISTS outbox (
+              id INTEGER PRIMARY KEY AUTOINCREMENT,
+              channel TEXT NOT NULL,
+              feed_id INTEGER NULL REFERENCES feeds(id) ON DELETE SET NULL,
+              rule_id INTEGER NULL REFERENCES rules(id) ON DELETE SET NULL,
+              subject TEXT NOT NULL,
+              title TEXT NOT NULL,
+              body TEXT NOT NULL,
+              link TEXT NOT NULL,
+              status TEXT NOT NULL DEFAULT 'pending',
+              attempts INTEGER NOT NULL DEFAULT 0,
+              next_attempt_at TEXT NOT NULL DEFAULT (datetime('now')),
+              created_at TEXT NOT NULL DEFAULT (datetime('now')),
+              sent_at TEXT NULL,
+              last_error TEXT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(status, channel, next_attempt_at);
+
+            -- Per-feed adaptive polling state (times are unix seconds).
+            CREATE TABLE IF NOT EXISTS feed_schedule (
+              feed_id INTEGER PRIMARY KEY REFERENCES feeds(id) ON DELETE CASCADE,
+              interval_seconds INTEGER NOT NULL,
+              next_due_at REAL NOT NULL DEFAULT 0,
+              last_polled_at REAL NULL,
+              last_new_at REAL NULL
+            );
+
+            -- Sampled profiles of single polls (see profiling.py); the newest few are kept.
+            CREATE TABLE IF NOT EXISTS profiles (
+              id INTEGER PRIMARY KEY AUTOINCREMENT,
+              created_at TEXT NOT NULL DEFAULT (datetime('now')),
+              label TEXT NOT NULL,
+              elapsed REAL NOT NULL,
+              interval REAL NOT NULL,
+              samples INTEGER NOT NULL,
+              top TEXT NOT NULL,
+              collapsed TEXT NOT NULL
+            );
+
+            -- Time-limited claims shared by processes on this database (see lease.py).
+            CREATE TABLE IF NOT EXISTS leases (
+              name TEXT PRIMARY KEY,
+              holder TEXT NOT NULL,
+              acquired_at REAL NOT NULL,
+              expires_at REAL NOT NULL
+            );
+
+            -- Which sharded worker polls which feed (see shards.py); expired rows are up for grabs.
+            CREATE TABLE IF NOT EXISTS feed_leases (
+              feed_id INTEGER PRIMARY KEY REFERENCES feeds(id) ON DELETE CASCADE,
+              holder TEXT NOT NULL,
+              expires_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_feed_leases_holder ON feed_leases(holder);
+
+            -- Per-worker poll counters, written on each shard heartbeat.
+            CREATE TABLE IF NOT EXISTS shard_stats (
+              holder TEXT PRIMARY KEY,
+              started_at REAL NOT NULL,
+              heartbeat_at REAL NOT NULL,
+              feeds_owned INTEGER NOT NULL DEFAULT 0,
+              polls INTEGER NOT NULL DEFAULT 0,
+              feeds_polled INTEGER NOT NULL DEFAULT 0,
+              entries_seen INTEGER NOT NULL DEFAULT 0,
+              entries_new INTEGER NOT NULL DEFAULT 0,
+              alerts INTEGER NOT NULL DEFAULT 0,
+              poll_seconds REAL NOT NULL DEFAULT 0
+            );
+
+            -- Dedupe keys (64-bit hashes, see ingest.key_hash) of entries retention deleted to
+            -- keep a feed under its row limit, so a feed still listing them doesn't bring them
+            -- back as new items.
+            CREATE TABLE IF NOT EXISTS entry_tombstones (
+              feed_id INTEGER NOT NULL REFERENCES feeds(id) ON DELETE CASCADE,
+              key_hash INTEGER NOT NULL,
+              PRIMARY KEY (feed_id, key_hash)
+            ) WITHOUT ROWID;
+
+            -- Metrics and pool stats of each process that polls (see worker.run_stats_publisher),
+            -- for /stats and /metrics in web processes that don't poll themselves.
+            CREATE TABLE IF NOT EXISTS process_stats (
+              holder TEXT PRIMARY KEY,
+              published_at REAL NOT NULL,
+              state TEXT NOT NULL
+            );
+
+            -- Poller events on their way to other processes' /events clients (see events.py).
+            CREATE TABLE IF NOT EXISTS poll_events (
+              id INTEGER PRIMARY KEY,
+              event_id INTEGER NOT NULL,
+              origin TEXT NOT NULL,
+              kind TEXT NOT NULL,
+              data TEXT NOT NULL
+            );
             """
         )
 
         # Online upgrades for existing DBs.
         # Existing feeds should default to armed=1 (to preserve current behavior).
         _ensure_column(con, "feeds", "armed", "armed INTEGER NOT NULL DEFAULT 1")
+        # Per-feed retention overrides; NULL means "use the global setting".
+        _ensure_column(con, "feeds", "retention_days", "retention_days INTEGER NULL")
+        _ensure_column(con, "feeds", "retention_max_entries", "retention_max_entries INTEGER NULL")
+        # 1 = always buffer and parse the whole document (feeds that aren't newest-first).
+        _ensure_column(con, "feeds", "full_parse", "full_parse INTEGER NOT NULL DEFAULT 0")
+        # Rule kinds (keyword / word / regex), the field they look at, and comma-separated
+        # terms that must all / must not also occur.
+        _ensure_column(con, "rules", "kind", "kind TEXT NOT NULL DEFAULT 'keyword'")
+        _ensure_column(con, "rules", "field", "field TEXT NOT NULL DEFAULT 'any'")
+        _ensure_column(con, "rules", "all_of", "all_of TEXT NULL")
+        _ensure_column(con, "rules", "none_of", "none_of TEXT NULL")
+        # The entry's feed, copied onto each alert so the alerts list can filter by feed off
+        # an index instead of through the entries join.
+        if not _has_column(con, "alerts", "feed_id"):
+            con.execute("ALTER TABLE alerts ADD COLUMN feed_id INTEGER NULL REFERENCES feeds(id) ON DELETE CASCADE")
+            con.execute("UPDATE alerts SET feed_id = (SELECT e.feed_id FROM entries e WHERE e.id = alerts.entry_id)")
+        con.executescript(
+            """
+            CREATE TRIGGER IF NOT EXISTS alerts_feed_ai AFTER INSERT ON alerts WHEN new.feed_id IS NULL BEGIN
+              UPDATE alerts SET feed_id = (SELECT e.feed_id FROM entries e WHERE e.id = new.entry_id)
+              WHERE id = new.id;
+            END;
+
+            -- Keyset paging and the feed / rule / level filters on /, /alerts and /logs. Each
+            -- index ends in the rowid, so "filter = ? AND id < ? ORDER BY id DESC" is one range
+            -- walk. They also back the ON DELETE actions from feeds and rules.
+            -- alerts.entry_id is already the leading column of UNIQUE(entry_id, rule_id).
+            CREATE INDEX IF NOT EXISTS idx_alerts_feed ON alerts(feed_id);
+            CREATE INDEX IF NOT EXISTS idx_alerts_rule ON alerts(rule_id);
+            CREATE INDEX IF NOT EXISTS idx_app_log_feed ON app_log(feed_id);
+            CREATE INDEX IF NOT EXISTS idx_app_log_rule ON app_log(rule_id);
+            CREATE INDEX IF NOT EXISTS idx_app_log_level ON app_log(level);
+            -- A feed's newest entries (seen-index warm-up, retention trimming) without sorting
+            -- all of them.
+            CREATE INDEX IF NOT EXISTS idx_entries_feed_seen ON entries(feed_id, seen_at);
+            -- Entries that still have text: retention's strip pass walks this by id, so the
+            -- stubs it has already made drop out of it and are never scanned again.
+            CREATE INDEX IF NOT EXISTS idx_entries_unstripped ON entries(id)
+              WHERE summary IS NOT NULL OR title != '' OR link != '';
+            """
+        )
+        _ensure_entries_fts(con)
 
 
 def kv_get(con: sqlite3.Connection, k: str, default: str | None = None) -> str | None:
@@ -111,11 +536,21 @@ def kv_get(con: sqlite3.Connection, k: str, default: str | None = None) -> str |
     return row["v"] if row else default
 
 
+def kv_int(con: sqlite3.Connection, k: str, default: int, *, minimum: int = 1) -> int:
+    s = (kv_get(con, k, str(default)) or str(default)).strip()
+    try:
+        return max(minimum, int(s))
+    except ValueError:
+        return default
+
+
 def kv_set(con: sqlite3.Connection, k: str, v: str) -> None:
     con.execute(
         "INSERT INTO kv(k, v) VALUES(?, ?) ON CONFLICT(k) DO UPDATE SET v = excluded.v",
         (k, v),
     )
+    if k == "log_max_rows":
+        manager().logs.invalidate()
 
 
 def log_write(
@@ -129,27 +564,14 @@ def log_write(
     entry_link: str | None = None,
     error: str | None = None,
 ) -> None:
-    con.execute(
-        """
-        INSERT INTO app_log(level, area, message, feed_id, rule_id, entry_link, error)
-        VALUES(?, ?, ?, ?, ?, ?, ?)
-        """,
-        (level, area, message, feed_id, rule_id, entry_link, error),
-    )
+    """
+    Queue one app_log row; it is written with the next batch (see LogBuffer).
 
-    # Keep logs bounded (default 2000 rows) to avoid unbounded DB growth.
-    max_rows_s = (kv_get(con, "log_max_rows", "2000") or "2000").strip()
-    try:
-        max_rows = max(200, int(max_rows_s))
-    except ValueError:
-        max_rows = 2000
-
-    con.execute(
-        """
-        DELETE FROM app_log
-        WHERE id < (
-          SELECT COALESCE(MAX(id) - ?, 0) FROM app_log
-        )
-        """,
-        (max_rows,),
-    )
+    The timestamp is taken now, so batching does not shift it.
+    """
+    ts = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+    logs = manager().logs
+    if logs.append((ts, level, area, message, feed_id, rule_id, entry_link, error)) >= logs.flush_rows:
+        # Not inside someone else's transaction: a rollback there would take our rows with it.
+        if not con.in_transaction:
+            logs.flush(con)
@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+import sqlite3
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator
+
+from . import db, lease
+
+
+# Pub/sub from the poller to /events (Server-Sent Events) clients. Within one process
+# events go straight to subscribers. A poller in another process (the worker, a shard, or
+# whichever uvicorn worker holds the poller lease) also relays them through the
+# poll_events table, which every web process tails and hands on to its own clients.
+
+ALERT = "alert"
+PROGRESS = "progress"
+POLL = "poll"
+# Sent instead of the events a slow client missed; it should reload the page.
+RESYNC = "resync"
+
+# Per-client buffer, and how many recent events a reconnecting client can replay.
+_BUFFER = 100
+# Relayed events kept in the table; a web process only ever reads the newest.
+_KEEP = 1000
+
+
+@dataclass(frozen=True)
+class Event:
+    id: int
+    kind: str
+    data: dict[str, Any]
+
+    def sse(self) -> str:
+        return f"id: {self.id}\nevent: {self.kind}\ndata: {json.dumps(self.data, separators=(',', ':'))}\n\n"
+
+
+class Subscription:
+    """
+    One client's queue of events, owned by the event loop it was created on.
+
+    Bounded: when the client falls behind, the oldest events are dropped and counted, so a
+    stalled connection costs at most `maxlen` events of memory. Progress events coalesce,
+    so a poll over many feeds doesn't crowd alerts out of the buffer.
+    """
+
+    def __init__(self, maxlen: int = _BUFFER) -> None:
+        self.dropped = 0
+        self._buf: deque[Event] = deque(maxlen=maxlen)
+        self._ready = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+
+    def deliver(self, ev: Event) -> None:
+        try:
+            same_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            same_loop = False
+        if same_loop:
+            self._push(ev)
+        else:
+            self._loop.call_soon_threadsafe(self._push, ev)
+
+    def _push(self, ev: Event) -> None:
+        if ev.kind == PROGRESS and self._buf and self._buf[-1].kind == PROGRESS:
+            self._buf[-1] = ev
+        else:
+            if len(self._buf) == self._buf.maxlen:
+                self.dropped += 1
+            self._buf.append(ev)
+        self._ready.set()
+
+    async def next(self, timeout: float) -> list[Event]:
+        """Everything buffered, waiting up to `timeout` for something to arrive."""
+        if not self._buf:
+            self._ready.clear()
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._ready.wait(), timeout)
+        out = list(self._buf)
+        self._buf.clear()
+        return out
+
+    def take_dropped(self) -> int:
+        n, self.dropped = self.dropped, 0
+        return n
+
+
+_subscribers: set[Subscription] = set()
+_recent: deque[Event] = deque(maxlen=_BUFFER)
+_last_id = 0
+_lock = threading.Lock()
+# Events waiting for run_relay; None while no relay runs in this process.
+_outbound: deque[Event] | None = None
+
+
+def _next_id() -> int:
+    # Milliseconds, bumped to stay unique: ids from different processes interleave in
+    # time order, so a Last-Event-ID still means something to another web process.
+    global _last_id
+    _last_id = max(_last_id + 1, int(time.time() * 1000))
+    return _last_id
+
+
+def _deliver(ev: Event) -> None:
+    with _lock:
+        _recent.append(ev)
+        subs = list(_subscribers)
+    for s in subs:
+        s.deliver(ev)
+
+
+def publish(kind: str, **data: Any) -> None:
+    """Hand an event to every connected client; cheap and non-blocking when nobody listens."""
+    with _lock:
+        ev = Event(id=_next_id(), kind=kind, data=data)
+        if _outbound is not None:
+            if kind == PROGRESS and _outbound and _outbound[-1].kind == PROGRESS:
+                _outbound[-1] = ev
+            else:
+                _outbound.append(ev)
+    _deliver(ev)
+
+
+@contextlib.contextmanager
+def subscribe(after: int | None = None, maxlen: int = _BUFFER) -> Iterator[Subscription]:
+    """
+    Listen for events until the block exits. `after` is a Last-Event-ID: recent events
+    newer than it are replayed first, so a reconnecting client misses nothing.
+    """
+    sub = Subscription(maxlen)
+    with _lock:
+        if after is not None:
+            for ev in _recent:
+                if ev.id > after:
+                    sub._push(ev)
+        _subscribers.add(sub)
+    try:
+        yield sub
+    finally:
+        with _lock:
+            _subscribers.discard(sub)
+
+
+def subscribers() -> int:
+    return len(_subscribers)
+
+
+async def sse(
+    sub: Subscription, *, keepalive: float, disconnected: Callable[[], Awaitable[bool]]
+) -> AsyncIterator[str]:
+    # Reconnect quickly after a restart; comments keep proxies from timing the stream out.
+    yield "retry: 3000\n\n"
+    while not await disconnected():
+        batch = await sub.next(keepalive)
+        dropped = sub.take_dropped()
+        if dropped:
+            # No id: the client's Last-Event-ID stays on the last event it actually got.
+            yield f"event: {RESYNC}\ndata: {json.dumps({'dropped': dropped})}\n\n"
+        if not batch:
+            yield ": keepalive\n\n"
+        for ev in batch:
+            yield ev.sse()
+
+
+def relay(con: sqlite3.Connection) -> int:
+    """Write the events published here since the last call to poll_events; returns how many."""
+    with _lock:
+        if not _outbound:
+            return 0
+        batch = list(_outbound)
+    origin = lease.process_id()
+    with db.transaction(con):
+        con.executemany(
+            "INSERT INTO poll_events(event_id, origin, kind, data) VALUES(?, ?, ?, ?)",
+            [(ev.id, origin, ev.kind, json.dumps(ev.data, separators=(",", ":"))) for ev in batch],
+        )
+        con.execute("DELETE FROM poll_events WHERE id <= (SELECT MAX(id) FROM poll_events) - ?", (_KEEP,))
+    # Only now that they're committed; on failure they stay queued for the next attempt.
+    # publish() may have since coalesced a new progress event into the last one copied, or
+    # the bounded deque dropped some of the oldest: drop what is still ours from the front.
+    with _lock:
+        if _outbound is not None:
+            written = {id(ev) for ev in batch}
+            while _outbound and id(_outbound[0]) in written:
+                _outbound.popleft()
+    return len(batch)
+
+
+def tail(con: sqlite3.Connection, after: int) -> int:
+    """Deliver events other processes relayed since row `after`; returns the new cursor."""
+    rows = con.execute(
+        "SELECT id, event_id, origin, kind, data FROM poll_events WHERE id > ? ORDER BY id LIMIT ?",
+        (after, _KEEP),
+    ).fetchall()
+    origin = lease.process_id()
+    for r in rows:
+        if r["origin"] != origin:
+            _deliver(Event(id=int(r["event_id"]), kind=r["kind"], data=json.loads(r["data"])))
+    return int(rows[-1]["id"]) if rows else after
+
+
+async def run_relay(stop_event: asyncio.Event, *, every: float = 0.25) -> None:
+    """In a process that polls: pass its events on to the other processes until `stop_event`."""
+    global _outbound
+    with _lock:
+        _outbound = deque(maxlen=_KEEP)
+    try:
+        while not stop_event.is_set():
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(stop_event.wait(), timeout=every)
+            with contextlib.suppress(sqlite3.Error), db.connect() as con:
+                relay(con)
+    finally:
+        with _lock:
+            _outbound = None
+
+
+async def run_tail(stop_event: asyncio.Event, *, every: float = 0.5) -> None:
+    """In a web process: hand other processes' events to this one's clients until `stop_event`."""
+    with db.connect() as con:
+        # Only what is published from now on; older events are replayed from `_recent`.
+        cursor = int(con.execute("SELECT COALESCE(MAX(id), 0) FROM poll_events").fetchone()[0])
+    while not stop_event.is_set():
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(stop_event.wait(), timeout=every)
+        with contextlib.suppress(sqlite3.Error), db.connect() as con:
+            cursor = tail(con, cursor)
+
+
+def reset() -> None:
+    global _outbound
+    with _lock:
+        _subscribers.clear()
+        _recent.clear()
+        _outbound = None
@@ -0,0 +1,253 @@
+from __future__ import annotations
+
+import asyncio
+import ipaddress
+import socket
+import sqlite3
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from importlib.util import find_spec
+from typing import Any, AsyncIterable, AsyncIterator, Iterable, Iterator
+
+import httpcore
+import httpx
+
+from . import db
+
+
+USER_AGENT = "rss-watcher/1.0"
+
+# HTTP/2 needs the optional `h2` package (pip install httpx[http2]); fall back to HTTP/1.1 without it.
+HTTP2_AVAILABLE = find_spec("h2") is not None
+
+
+@dataclass
+class PoolStats:
+    requests: int = 0
+    connections_opened: int = 0
+    dns_lookups: int = 0
+    dns_cache_hits: int = 0
+
+    @property
+    def connections_reused(self) -> int:
+        # Every request that didn't need a fresh TCP connection rode on a pooled one.
+        return max(0, self.requests - self.connections_opened)
+
+
+@dataclass
+class _DnsEntry:
+    address: str
+    expires_at: float
+
+
+@dataclass
+class _CachingBackend(httpcore.AsyncNetworkBackend):
+    """
+    Network backend that counts new TCP connections and caches DNS answers.
+
+    TLS still verifies against the original hostname: httpcore passes the origin host as
+    `server_hostname` when it upgrades the stream, independent of the address we dial.
+    """
+
+    stats: PoolStats
+    dns_ttl: float
+    inner: httpcore.AsyncNetworkBackend = field(default_factory=httpcore.AnyIOBackend)
+    _dns: dict[tuple[str, int], _DnsEntry] = field(default_factory=dict)
+
+    async def _resolve(self, host: str, port: int) -> str:
+        try:
+            ipaddress.ip_address(host)
+            return host
+        except ValueError:
+            pass
+
+        now = time.monotonic()
+        hit = self._dns.get((host, port))
+        if hit and hit.expires_at > now:
+            self.stats.dns_cache_hits += 1
+            return hit.address
+
+        self.stats.dns_lookups += 1
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except OSError:
+            # Let the real connect attempt produce the error the caller expects.
+            return host
+        if not infos:
+            return host
+        address = str(infos[0][4][0])
+        self._dns[(host, port)] = _DnsEntry(address=address, expires_at=now + self.dns_ttl)
+        return address
+
+    async def connect_tcp(
+        self,
+        host: str,
+        port: int,
+        timeout: float | None = None,
+        local_address: str | None = None,
+        socket_options: Iterable[Any] | None = None,
+    ) -> httpcore.AsyncNetworkStream:
+        self.stats.connections_opened += 1
+        address = await self._resolve(host, port)
+        try:
+            return await self.inner.connect_tcp(
+                address, port, timeout=timeout, local_address=local_address, socket_options=socket_options
+            )
+        except httpcore.ConnectError:
+            if address == host:
+                raise
+            # The cached address may be stale or unreachable (e.g. IPv6 first); retry by name.
+            self._dns.pop((host, port), None)
+            return await self.inner.connect_tcp(
+                host, port, timeout=timeout, local_address=local_address, socket_options=socket_options
+            )
+
+    async def connect_unix_socket(
+        self, path: str, timeout: float | None = None, socket_options: Iterable[Any] | None = None
+    ) -> httpcore.AsyncNetworkStream:
+        return await self.inner.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+
+    async def sleep(self, seconds: float) -> None:
+        await self.inner.sleep(seconds)
+
+
+@contextmanager
+def _httpx_errors(request: httpx.Request) -> Iterator[None]:
+    # httpcore's exceptions share their names with httpx's, so callers only ever see httpx.HTTPError.
+    try:
+        yield
+    except Exception as exc:
+        for cls in type(exc).__mro__:
+            mapped = getattr(httpx, cls.__name__, None) if cls.__module__ == "httpcore" else None
+            if isinstance(mapped, type) and issubclass(mapped, httpx.TransportError):
+                raise mapped(str(exc), request=request) from exc
+        raise
+
+
+class _ResponseStream(httpx.AsyncByteStream):
+    def __init__(self, stream: AsyncIterable[bytes], request: httpx.Request) -> None:
+        self.stream = stream
+        self.request = request
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        with _httpx_errors(self.request):
+            async for chunk in self.stream:
+                yield chunk
+
+    async def aclose(self) -> None:
+        close = getattr(self.stream, "aclose", None)
+        if close is not None:
+            with _httpx_errors(self.request):
+                await close()
+
+
+class _Transport(httpx.AsyncBaseTransport):
+    """
+    httpx transport over an httpcore pool built here, with `network_backend` passed in.
+
+    httpx.AsyncHTTPTransport has no way to set the backend short of patching its private
+    pool; this does the same request/response translation it does, through public APIs.
+    """
+
+    def __init__(self, limits: httpx.Limits, *, http2: bool, backend: httpcore.AsyncNetworkBackend) -> None:
+        self.pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(),
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+            http1=True,
+            http2=http2,
+            network_backend=backend,
+        )
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        req = httpcore.Request(
+            method=request.method,
+            url=httpcore.URL(
+                scheme=request.url.raw_scheme,
+                host=request.url.raw_host,
+                port=request.url.port,
+                target=request.url.raw_path,
+            ),
+            headers=request.headers.raw,
+            content=request.stream,
+            extensions=request.extensions,
+        )
+        with _httpx_errors(request):
+            resp = await self.pool.handle_async_request(req)
+        return httpx.Response(
+            status_code=resp.status,
+            headers=resp.headers,
+            stream=_ResponseStream(resp.stream, request),
+            extensions=resp.extensions,
+        )
+
+    async def aclose(self) -> None:
+        await self.pool.aclose()
+
+
+class HttpPool:
+    """
+    Long-lived HTTP client shared by feed fetches and notifications.
+
+    Keeps connections alive between polls (and negotiates HTTP/2 when `h2` is installed),
+    so repeat requests to the same host skip the TCP + TLS handshake.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_connections: int = 100,
+        max_keepalive: int = 20,
+        keepalive_expiry: float = 60.0,
+        dns_ttl: float = 300.0,
+    ) -> None:
+        self.stats = PoolStats()
+        self.http2 = HTTP2_AVAILABLE
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        transport = _Transport(
+            self.limits, http2=self.http2, backend=_CachingBackend(stats=self.stats, dns_ttl=dns_ttl)
+        )
+        self.client = httpx.AsyncClient(
+            transport=transport,
+            timeout=20,
+            headers={"User-Agent": USER_AGENT},
+            event_hooks={"request": [self._count_request]},
+        )
+
+    @classmethod
+    def from_settings(cls, con: sqlite3.Connection | None = None) -> "HttpPool":
+        if con is None:
+            with db.connect() as con:
+                return cls.from_settings(con)
+
+        return cls(
+            max_connections=db.kv_int(con, "http_max_connections", 100),
+            max_keepalive=db.kv_int(con, "http_max_keepalive", 20),
+            keepalive_expiry=float(db.kv_int(con, "http_keepalive_seconds", 60)),
+            dns_ttl=float(db.kv_int(con, "http_dns_ttl_seconds", 300)),
+        )
+
+    async def _count_request(self, request: httpx.Request) -> None:
+        self.stats.requests += 1
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "http2": self.http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "keepalive_expiry": self.limits.keepalive_expiry,
+            "requests": self.stats.requests,
+            "connections_opened": self.stats.connections_opened,
+            "connections_reused": self.stats.connections_reused,
+            "dns_lookups": self.stats.dns_lookups,
+            "dns_cache_hits": self.stats.dns_cache_hits,
+        }
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, Sequence
+
+from . import db, outbox
+from .matcher import RuleMatcher
+from .metrics import Stopwatch
+from .seen import SeenIndex
+
+
+# Rows per multi-row INSERT / IN (...) query; keeps us well under SQLite's bound-parameter limit.
+_CHUNK = 100
+
+
+@dataclass(frozen=True, slots=True)
+class EntryRow:
+    """
+    One feed item, normalized once at parse time and reused for dedupe, matching, storage
+    and notifications.
+
+    The lowercased title and body that rules match against are only built on first use,
+    so entries dropped as already seen (most of them) or from feeds no rule covers never
+    pay for them.
+    """
+
+    key: str
+    link: str
+    title: str
+    published: str | None
+    summary: str | None
+    content: str | None = None
+    _folded: tuple[str, str] | None = field(default=None, init=False, repr=False, compare=False)
+
+    @property
+    def text(self) -> str:
+        return "\n".join(p for p in (self.title, self.summary, self.content) if p)
+
+    @property
+    def body(self) -> str:
+        return "\n".join(p for p in (self.summary, self.content) if p)
+
+    def match_fields(self) -> tuple[str, str]:
+        """(title, body), lowercased."""
+        if self._folded is None:
+            object.__setattr__(self, "_folded", (self.title.lower(), self.body.lower()))
+        return self._folded
+
+
+@dataclass(frozen=True)
+class NewAlert:
+    rule_id: int
+    keyword: str
+    title: str
+    link: str
+
+
+@dataclass(frozen=True)
+class IngestResult:
+    alerts: list[NewAlert]
+    new_entries: int = 0
+
+
+def _chunks(seq: Sequence, n: int = _CHUNK) -> Iterator[Sequence]:
+    for i in range(0, len(seq), n):
+        yield seq[i : i + n]
+
+
+def _unique(rows: Iterable[EntryRow]) -> list[EntryRow]:
+    # Feeds occasionally repeat an item; the first occurrence wins, as it did row-by-row.
+    seen: set[str] = set()
+    out: list[EntryRow] = []
+    for r in rows:
+        if r.key not in seen:
+            seen.add(r.key)
+            out.append(r)
+    return out
+
+
+def key_hash(key: str) -> int:
+    """Signed 64-bit hash of an entry key, as stored in entry_tombstones."""
+    digest = hashlib.blake2b(key.encode("utf-8", errors="ignore"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def existing_keys(con: sqlite3.Connection, feed_id: int, keys: Sequence[str]) -> set[str]:
+    """Keys already stored for the feed, or stored once and since trimmed by retention."""
+    found: set[str] = set()
+    for chunk in _chunks(keys):
+        marks = ",".join("?" * len(chunk))
+        found.update(
+            r[0]
+            for r in con.execute(
+                f"SELECT entry_key FROM entries WHERE feed_id = ? AND entry_key IN ({marks})",
+                (feed_id, *chunk),
+            )
+        )
+    by_hash = {key_hash(k): k for k in keys if k not in found}
+    for chunk in _chunks(list(by_hash)):
+        marks = ",".join("?" * len(chunk))
+        found.update(
+            by_hash[int(r[0])]
+            for r in con.execute(
+                f"SELECT key_hash FROM entry_tombstones WHERE feed_id = ? AND key_hash IN ({marks})",
+                (feed_id, *chunk),
+            )
+        )
+    return found
+
+
+def insert_entries(con: sqlite3.Connection, feed_id: int, rows: Sequence[EntryRow]) -> dict[str, tuple[int, str]]:
+    """Insert rows, returning {entry_key: (entry_id, seen_at)} for the ones actually inserted."""
+    inserted: dict[str, tuple[int, str]] = {}
+    for chunk in _chunks(rows):
+        values = ",".join(["(?, ?, ?, ?, ?, ?)"] * len(chunk))
+        params: list = []
+        for r in chunk:
+            params.extend((feed_id, r.key, r.link, r.title, r.published, r.summary))
+        cur = con.execute(
+            f"""
+            INSERT OR IGNORE INTO entries(feed_id, entry_key, link, title, published, summary)
+            VALUES {values}
+            RETURNING entry_key, id, seen_at
+            """,
+            params,
+        )
+        for key, entry_id, seen_at in cur.fetchall():
+            inserted[str(key)] = (int(entry_id), str(seen_at))
+    return inserted
+
+
+def baseline(
+    con: sqlite3.Connection, feed_id: int, rows: Iterable[EntryRow], seen: SeenIndex | None = None
+) -> None:
+    """Record the feed's current items as seen, without matching, and arm the feed."""
+    rows = _unique(rows)
+    with db.transaction(con):
+        insert_entries(con, feed_id, rows)
+        con.execute("UPDATE feeds SET armed = 1 WHERE id = ?", (feed_id,))
+    if seen is not None:
+        seen.add(feed_id, [r.key for r in rows])
+
+
+def ingest(
+    con: sqlite3.Connection,
+    feed_id: int,
+    rows: Iterable[EntryRow],
+    matcher: RuleMatcher,
+    seen: SeenIndex | None = None,
+    *,
+    feed_name: str = "",
+    channels: Sequence[str] = (),
+    timer: Stopwatch | None = None,
+) -> IngestResult:
+    """
+    Store newly-discovered entries for one feed and create their alerts, in one transaction.
+
+    Entries already present are skipped entirely: only newly-discovered items alert, and an
+    alert is only raised for rules that existed when the entry was first seen. With a `seen`
+    index, keys it already knows are dropped before any query is made. Notifications for
+    each alert are queued on `channels` in the same transaction. `timer` is charged for
+    the dedupe, match, persist and notify stages.
+    """
+    sw = timer if timer is not None else Stopwatch()
+    rows = _unique(rows)
+    if seen is not None and rows:
+        maybe_new = set(seen.filter_new(con, feed_id, [r.key for r in rows]))
+        rows = [r for r in rows if r.key in maybe_new]
+    if not rows:
+        sw.lap("dedupe")
+        return IngestResult(alerts=[])
+
+    alerts: list[NewAlert] = []
+    with db.transaction(con):
+        known = existing_keys(con, feed_id, [r.key for r in rows])
+        fresh = [r for r in rows if r.key not in known]
+        sw.lap("dedupe")
+        inserted = insert_entries(con, feed_id, fresh) if fresh else {}
+        sw.lap("persist")
+        # Feeds no rule covers skip matching, so their match text is never built.
+        candidates = fresh if matcher.covers(feed_id) else []
+
+        for r in candidates:
+            hit = inserted.get(r.key)
+            if hit is None:
+                continue
+            entry_id, seen_at = hit
+            matches = matcher.find_fields(feed_id, *r.match_fields())
+            sw.lap("match")
+            for m in matches:
+                # Apply rules going forward: if this entry was first seen before the rule existed,
+                # skip alerting (prevents "backfilling" when you add a new rule).
+                if seen_at < m.created_at:
+                    continue
+                cur = con.execute(
+                    "INSERT OR IGNORE INTO alerts(entry_id, rule_id, keyword) VALUES(?, ?, ?)",
+                    (entry_id, m.rule_id, m.keyword),
+                )
+                sw.lap("persist")
+                if not cur.rowcount:
+                    continue
+                alerts.append(NewAlert(rule_id=m.rule_id, keyword=m.keyword, title=r.title, link=r.link))
+                for channel in channels:
+                    outbox.enqueue(
+                        con,
+                        channel=channel,
+                        feed_id=feed_id,
+                        rule_id=m.rule_id,
+                        subject=f"RSS Watcher: '{m.keyword}' in {feed_name}",
+                        title=r.title,
+                        body=f"{r.title}\n\nFeed: {feed_name}\nKeyword: {m.keyword}\nLink: {r.link}\n",
+                        link=r.link,
+                    )
+                sw.lap("notify")
+                db.log_write(
+                    con,
+                    level="info",
+                    area="match",
+                    message=f"keyword match: {m.keyword}",
+                    feed_id=feed_id,
+                    rule_id=m.rule_id,
+                    entry_link=r.link,
+                )
+                sw.lap("persist")
+
+    sw.lap("persist")
+    # Only after the commit, so a rolled-back batch is retried rather than forgotten.
+    if seen is not None:
+        seen.add(feed_id, known, known=True)
+        seen.add(feed_id, [r.key for r in fresh])
+    sw.lap("dedupe")
+    return IngestResult(alerts=alerts, new_entries=len(inserted))
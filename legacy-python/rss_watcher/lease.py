@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any
+
+
+# Time-limited ownership claims stored in the database, so processes sharing one database
+# can agree on who does what without talking to each other. A holder keeps a lease by
+# renewing it well inside `ttl`; one that stops renewing (crashed, hung, partitioned off)
+# loses it once it expires, and anyone may take it over.
+
+
+def holder_id() -> str:
+    """Identifies this process: readable in the leases table, unique across restarts."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+_process: tuple[int, str] | None = None
+
+
+def process_id() -> str:
+    """One holder_id() for the life of this process (a forked child gets its own)."""
+    global _process
+    if _process is None or _process[0] != os.getpid():
+        _process = (os.getpid(), holder_id())
+    return _process[1]
+
+
+@dataclass(frozen=True)
+class Lease:
+    name: str
+    holder: str
+    ttl: float = 30.0
+
+    def acquire(self, con: sqlite3.Connection) -> bool:
+        """Take the lease if it is free or expired, or extend it if already ours."""
+        now = time.time()
+        row = con.execute(
+            """
+            INSERT INTO leases(name, holder, acquired_at, expires_at) VALUES(?, ?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET
+              acquired_at = CASE WHEN leases.holder = excluded.holder THEN leases.acquired_at
+                                 ELSE excluded.acquired_at END,
+              holder = excluded.holder,
+              expires_at = excluded.expires_at
+            WHERE leases.holder = excluded.holder OR leases.expires_at < ?
+            RETURNING holder
+            """,
+            (self.name, self.holder, now, now + self.ttl, now),
+        ).fetchone()
+        return row is not None
+
+    # Same statement: renewing only succeeds while the lease is still ours or lapsed unclaimed.
+    renew = acquire
+
+    def release(self, con: sqlite3.Connection) -> None:
+        con.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (self.name, self.holder))
+
+
+def holders(con: sqlite3.Connection, prefix: str = "") -> list[dict[str, Any]]:
+    now = time.time()
+    return [
+        {**dict(r), "expires_in": round(float(r["expires_at"]) - now, 1)}
+        for r in con.execute(
+            "SELECT name, holder, acquired_at, expires_at FROM leases WHERE name LIKE ? || '%' ORDER BY name",
+            (prefix,),
+        )
+    ]
@@ -3,18 +3,23 @@ from __future__ import annotations
 import asyncio
 import contextlib
 import os
+import re
 from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Optional
+from typing import Any, Callable, Optional
+from urllib.parse import urlencode
 
 from fastapi import FastAPI, Form, Request
+from fastapi.encoders import jsonable_encoder
 from fastapi.responses import PlainTextResponse
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
-from . import db
-from .watcher import run_loop
+from . import db, events, lease, matcher, metrics, outbox, profiling, queries, readcache, retention, ruleindex
+from . import scheduler, search, seen, shards, worker
+from .httppool import HttpPool
+from .parse import ParsePool
 
 
 APP_DIR = Path(__file__).resolve().parent
@@ -24,24 +29,75 @@ templates = Jinja2Templates(directory=str(APP_DIR / "templates"))
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     db.migrate()
+    with db.connect() as con:
+        in_web = worker.poll_in_web(con)
     stop = asyncio.Event()
-    task = asyncio.create_task(run_loop(stop))
+    # Events from a poller in another process (or another uvicorn worker) reach this
+    # process's /events clients through the database.
+    tasks = [asyncio.create_task(db.run_log_flusher(stop)), asyncio.create_task(events.run_tail(stop))]
+    http = parser = None
+    if in_web:
+        # Behind the poller lease, so extra uvicorn workers (or a separate worker process)
+        # stand by instead of polling twice.
+        http = HttpPool.from_settings()
+        parser = ParsePool.from_settings()
+        tasks.append(asyncio.create_task(worker.run_as_leader(stop, worker.background_jobs(http, parser))))
+        tasks += worker.publishing(stop, http, parser)
+    app.state.http = http
+    app.state.parser = parser
     try:
         yield
     finally:
         stop.set()
-        task.cancel()
-        with contextlib.suppress(Exception):
-            await task
+        for task in tasks:
+            # The leader task gets to stop its jobs and hand the lease back.
+            with contextlib.suppress(Exception, asyncio.CancelledError):
+                await asyncio.wait_for(task, timeout=10)
+        if http is not None:
+            await http.aclose()
+        if parser is not None:
+            parser.close()
+        db.close_all()
 
 
 app = FastAPI(title="RSS Watcher", lifespan=lifespan)
 app.mount("/static", StaticFiles(directory=str(APP_DIR / "static")), name="static")
 
 
+def _settings() -> readcache.Cached:
+    return readcache.get("settings", (readcache.SETTINGS, readcache.POLL), queries.settings)
+
+
 def _kv(k: str, default: str = "") -> str:
-    with db.connect() as con:
-        return (db.kv_get(con, k, default) or default).strip()
+    return (_settings().value.get(k, default) or default).strip()
+
+
+def _feed_names() -> readcache.Cached:
+    return readcache.get("feed_names", (readcache.FEEDS,), queries.feed_names)
+
+
+def _rule_names() -> readcache.Cached:
+    return readcache.get("rule_names", (readcache.RULES,), queries.rule_names)
+
+
+def _etag(*parts: object) -> str:
+    return f'W/"{readcache.fingerprint(parts)}"'
+
+
+def _conditional(request: Request, etag: str, render: Callable[[], Response]) -> Response:
+    """304 if the client already holds this version of the page; otherwise render and tag it."""
+    # no-cache: browsers may keep the page but must revalidate, which is what makes 304s happen.
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in (t.strip() for t in request.headers.get("if-none-match", "").split(",")):
+        return Response(status_code=304, headers=headers)
+    response = render()
+    response.headers.update(headers)
+    return response
+
+
+def _json(request: Request, body: Any) -> Response:
+    body = jsonable_encoder(body)
+    return _conditional(request, _etag(body), lambda: JSONResponse(body))
 
 
 @app.get("/health")
@@ -49,43 +105,169 @@ def health():
     return {"ok": True}
 
 
-@app.get("/", response_class=HTMLResponse)
-def home(request: Request):
+def _stats(request: Request) -> dict:
+    http: HttpPool | None = getattr(request.app.state, "http", None)
+    parser: ParsePool | None = getattr(request.app.state, "parser", None)
     with db.connect() as con:
-        feeds = con.execute("SELECT id, name, url, enabled FROM feeds ORDER BY id DESC").fetchall()
-        rules = con.execute("SELECT id, keyword, feed_id, enabled FROM rules ORDER BY id DESC").fetchall()
-        alerts = con.execute(
-            """
-            SELECT a.id, a.keyword, a.created_at, e.title, e.link, f.name AS feed_name
-            FROM alerts a
-            JOIN entries e ON e.id = a.entry_id
-            JOIN feeds f ON f.id = e.feed_id
-            ORDER BY a.id DESC
-            LIMIT 25
-            """
-        ).fetchall()
-        last_poll_at = db.kv_get(con, "last_poll_at", "") or ""
-        last_alert_at = db.kv_get(con, "last_alert_at", "") or ""
-        poll_interval_seconds = db.kv_get(con, "poll_interval_seconds", "300") or "300"
-    return templates.TemplateResponse(
+        registry, published = metrics.collected(con)
+        queue = outbox.metrics(con)
+        schedule = scheduler.summary(con)
+        storage = {
+            "file_bytes": retention.file_bytes(con),
+            "free_bytes": retention.free_bytes(con),
+            "incremental": retention.incremental(con),
+            "entries": con.execute("SELECT COUNT(*) FROM entries").fetchone()[0],
+            "last_retention": retention.last_report(con),
+        }
+        leases = lease.holders(con, worker.LEASE_NAME)
+        shard_report = shards.report(con)
+    poller = leases[0] if leases else None
+    # Pool stats are the lease holder's, as it last published them if it runs elsewhere.
+    local = poller is None or poller["holder"] == lease.process_id()
+    if local:
+        pools = {
+            "http": http.snapshot() if http else None,
+            "parse": parser.snapshot() if parser else None,
+            "seen": seen.index().snapshot(),
+        }
+    else:
+        pools = published.get(poller["holder"], {})
+    return {
+        "stages": metrics.STAGES,
+        "http": pools.get("http"),
+        "parse": pools.get("parse"),
+        "seen": pools.get("seen"),
+        "poller_local": local and poller is not None,
+        "outbox": queue,
+        "schedule": schedule,
+        "storage": storage,
+        "web_cache": readcache.cache().snapshot(),
+        "event_subscribers": events.subscribers(),
+        "poller": poller,
+        "shards": shard_report,
+        "pipeline": registry.snapshot(),
+        "slowest_feeds": registry.slowest(),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_page():
+    # Summed over every process that polls, so any web worker serves the same totals.
+    with db.connect() as con:
+        registry, _ = metrics.collected(con)
+    return PlainTextResponse(registry.exposition(), media_type="text/plain; version=0.0.4")
+
+
+# Comment line interval on an idle /events stream, under common proxy read timeouts.
+_SSE_KEEPALIVE = 15.0
+
+
+@app.get("/events")
+async def events_stream(request: Request):
+    """New alerts and poll progress as Server-Sent Events, pushed from the poller wherever it runs."""
+    after = _optional_int(request.headers.get("last-event-id", ""))
+
+    async def stream():
+        with events.subscribe(after=after) as sub:
+            async for chunk in events.sse(sub, keepalive=_SSE_KEEPALIVE, disconnected=request.is_disconnected):
+                yield chunk
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        # X-Accel-Buffering: nginx would otherwise hold events back until its buffer fills.
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/stats", response_class=HTMLResponse)
+def stats_page(request: Request):
+    ctx = _stats(request)
+    return _conditional(
+        request, _etag("stats", jsonable_encoder(ctx)), lambda: templates.TemplateResponse(request, "stats.html", ctx)
+    )
+
+
+@app.get("/stats.json")
+def stats_json(request: Request):
+    return _json(request, _stats(request))
+
+
+@app.get("/", response_class=HTMLResponse)
+def home(request: Request, before: str = ""):
+    before_id = _optional_int(before)
+    feeds = readcache.get("feeds", (readcache.FEEDS,), queries.feeds)
+    rules = readcache.get("rules", (readcache.RULES, readcache.FEEDS), queries.rules)
+    alerts = readcache.get(
+        ("alerts", before_id, None, None, 25),
+        (readcache.ALERTS, readcache.FEEDS, readcache.RULES),
+        lambda con: queries.alerts(con, before=before_id, limit=25),
+    )
+    settings = _settings()
+    page = alerts.value
+    return _conditional(
         request,
-        "index.html",
-        {
-            "feeds": feeds,
-            "rules": rules,
-            "alerts": alerts,
-            "last_poll_at": last_poll_at,
-            "last_alert_at": last_alert_at,
-            "poll_interval_seconds": poll_interval_seconds,
-        },
+        _etag("home", before_id, feeds.etag, rules.etag, alerts.etag, settings.etag),
+        lambda: templates.TemplateResponse(
+            request,
+            "index.html",
+            {
+                "feeds": feeds.value,
+                "rules": rules.value,
+                "alerts": page.rows,
+                "older_url": _page_url("/", before=page.next_before),
+                "last_poll_at": _kv("last_poll_at"),
+                "last_alert_at": _kv("last_alert_at"),
+                "poll_interval_seconds": _kv("poll_interval_seconds", "300"),
+            },
+        ),
+    )
+
+
+def _page_url(path: str, **params) -> str | None:
+    """Link to the next page, keeping the current filters; None when there is no next page."""
+    if params.get("before") is None:
+        return None
+    return f"{path}?{urlencode({k: v for k, v in params.items() if v not in (None, '')})}"
+
+
+@app.get("/alerts", response_class=HTMLResponse)
+def alerts_page(request: Request, before: str = "", feed_id: str = "", rule_id: str = ""):
+    before_id, fid, rid = _optional_int(before), _optional_int(feed_id), _optional_int(rule_id)
+    alerts = readcache.get(
+        ("alerts", before_id, fid, rid, 50),
+        (readcache.ALERTS, readcache.FEEDS, readcache.RULES),
+        lambda con: queries.alerts(con, before=before_id, feed_id=fid, rule_id=rid, limit=50),
+    )
+    feeds, rules = _feed_names(), _rule_names()
+    page = alerts.value
+    return _conditional(
+        request,
+        _etag("alerts", before_id, fid, rid, alerts.etag, feeds.etag, rules.etag),
+        lambda: templates.TemplateResponse(
+            request,
+            "alerts.html",
+            {
+                "alerts": page.rows,
+                "feeds": feeds.value,
+                "rules": rules.value,
+                "feed_id": fid,
+                "rule_id": rid,
+                "older_url": _page_url("/alerts", before=page.next_before, feed_id=fid, rule_id=rid),
+            },
+        ),
     )
 
 
 @app.get("/feeds", response_class=HTMLResponse)
 def feeds_page(request: Request):
-    with db.connect() as con:
-        feeds = con.execute("SELECT id, name, url, enabled FROM feeds ORDER BY id DESC").fetchall()
-    return templates.TemplateResponse(request, "feeds.html", {"feeds": feeds})
+    feeds = readcache.get("feeds", (readcache.FEEDS,), queries.feeds)
+    defaults = readcache.get("retention_defaults", (readcache.SETTINGS,), retention.defaults)
+    return _conditional(
+        request,
+        _etag("feeds", feeds.etag, defaults.etag),
+        lambda: templates.TemplateResponse(request, "feeds.html", {"feeds": feeds.value, "retention": defaults.value}),
+    )
 
 
 @app.post("/feeds/add")
@@ -100,6 +282,7 @@ def feeds_add(name: str = Form(...), url: str = Form(...)):
             "INSERT OR IGNORE INTO feeds(name, url, enabled, armed) VALUES(?, ?, 1, 0)",
             (name, url),
         )
+    readcache.invalidate(readcache.FEEDS)
     return RedirectResponse("/feeds", status_code=303)
 
 
@@ -110,6 +293,33 @@ def feeds_toggle(feed_id: int = Form(...)):
         if row:
             enabled = 0 if int(row["enabled"]) else 1
             con.execute("UPDATE feeds SET enabled = ? WHERE id = ?", (enabled, feed_id))
+    readcache.invalidate(readcache.FEEDS)
+    return RedirectResponse("/feeds", status_code=303)
+
+
+@app.post("/feeds/parse_mode")
+def feeds_parse_mode(feed_id: int = Form(...)):
+    with db.connect() as con:
+        con.execute("UPDATE feeds SET full_parse = 1 - full_parse WHERE id = ?", (feed_id,))
+    readcache.invalidate(readcache.FEEDS)
+    return RedirectResponse("/feeds", status_code=303)
+
+
+def _optional_int(s: str) -> int | None:
+    s = s.strip()
+    return max(0, int(s)) if s.isdigit() else None
+
+
+@app.post("/feeds/retention")
+def feeds_retention(
+    feed_id: int = Form(...), retention_days: str = Form(""), retention_max_entries: str = Form("")
+):
+    with db.connect() as con:
+        con.execute(
+            "UPDATE feeds SET retention_days = ?, retention_max_entries = ? WHERE id = ?",
+            (_optional_int(retention_days), _optional_int(retention_max_entries), feed_id),
+        )
+    readcache.invalidate(readcache.FEEDS)
     return RedirectResponse("/feeds", status_code=303)
 
 
@@ -117,29 +327,70 @@ def feeds_toggle(feed_id: int = Form(...)):
 def feeds_delete(feed_id: int = Form(...)):
     with db.connect() as con:
         con.execute("DELETE FROM feeds WHERE id = ?", (feed_id,))
+        # Feed-scoped rules go with it (ON DELETE CASCADE).
+        ruleindex.bump(con)
+    seen.index().forget(feed_id)
+    metrics.registry().forget_feed(feed_id)
+    readcache.invalidate(readcache.FEEDS, readcache.RULES, readcache.ALERTS)
     return RedirectResponse("/feeds", status_code=303)
 
 
+def _rules_page(request: Request, **extra):
+    rules = readcache.get("rules", (readcache.RULES, readcache.FEEDS), queries.rules)
+    feeds = _feed_names()
+    ctx = {"rules": rules.value, "feeds": feeds.value, "draft": {}, **extra}
+    if extra:
+        return templates.TemplateResponse(request, "rules.html", ctx)
+    return _conditional(
+        request, _etag("rules", rules.etag, feeds.etag), lambda: templates.TemplateResponse(request, "rules.html", ctx)
+    )
+
+
 @app.get("/rules", response_class=HTMLResponse)
 def rules_page(request: Request):
-    with db.connect() as con:
-        rules = con.execute(
-            """
-            SELECT r.id, r.keyword, r.feed_id, r.enabled, f.name AS feed_name
-            FROM rules r
-            LEFT JOIN feeds f ON f.id = r.feed_id
-            ORDER BY r.id DESC
-            """
-        ).fetchall()
-        feeds = con.execute("SELECT id, name FROM feeds ORDER BY name ASC").fetchall()
-    return templates.TemplateResponse(request, "rules.html", {"rules": rules, "feeds": feeds})
+    return _rules_page(request)
+
+
+@app.get("/rules/dry_run", response_class=HTMLResponse)
+def rules_dry_run(
+    request: Request,
+    keyword: str = "",
+    feed_id: str = "",
+    kind: str = "keyword",
+    field: str = "any",
+    all_of: str = "",
+    none_of: str = "",
+):
+    """Preview which stored entries a rule would have matched, without saving it."""
+    draft = {
+        "keyword": keyword.strip(),
+        "feed_id": _optional_int(feed_id),
+        "kind": kind if kind in matcher.KINDS else "keyword",
+        "field": field if field in matcher.FIELDS else "any",
+        "all_of": all_of,
+        "none_of": none_of,
+    }
+    result = None
+    if draft["keyword"]:
+        with db.connect() as con:
+            result = search.dry_run(con, draft)
+    return _rules_page(request, draft=draft, dry_run=result)
 
 
 @app.post("/rules/add")
-def rules_add(keyword: str = Form(...), feed_id: Optional[str] = Form(None)):
+def rules_add(
+    keyword: str = Form(...),
+    feed_id: Optional[str] = Form(None),
+    kind: str = Form("keyword"),
+    field: str = Form("any"),
+    all_of: str = Form(""),
+    none_of: str = Form(""),
+):
     keyword = keyword.strip()
     if not keyword:
         return RedirectResponse("/rules", status_code=303)
+    kind = kind if kind in matcher.KINDS else "keyword"
+    field = field if field in matcher.FIELDS else "any"
     fid = None
     if feed_id and feed_id.strip():
         try:
@@ -147,7 +398,25 @@ def rules_add(keyword: str = Form(...), feed_id: Optional[str] = Form(None)):
         except ValueError:
             fid = None
     with db.connect() as con:
-        con.execute("INSERT INTO rules(keyword, feed_id, enabled) VALUES(?, ?, 1)", (keyword, fid))
+        if kind == "regex":
+            try:
+                matcher.compile_regex(keyword)
+            except re.error as e:
+                db.log_write(con, level="error", area="ui", message=f"rule not added, invalid regex {keyword!r}: {e}")
+                return RedirectResponse("/rules", status_code=303)
+        con.execute(
+            "INSERT INTO rules(keyword, feed_id, enabled, kind, field, all_of, none_of) VALUES(?, ?, 1, ?, ?, ?, ?)",
+            (
+                keyword,
+                fid,
+                kind,
+                field,
+                ", ".join(matcher.split_terms(all_of)) or None,
+                ", ".join(matcher.split_terms(none_of)) or None,
+            ),
+        )
+        ruleindex.bump(con)
+    readcache.invalidate(readcache.RULES)
     return RedirectResponse("/rules", status_code=303)
 
 
@@ -158,6 +427,8 @@ def rules_toggle(rule_id: int = Form(...)):
         if row:
             enabled = 0 if int(row["enabled"]) else 1
             con.execute("UPDATE rules SET enabled = ? WHERE id = ?", (enabled, rule_id))
+            ruleindex.bump(con)
+    readcache.invalidate(readcache.RULES)
     return RedirectResponse("/rules", status_code=303)
 
 
@@ -165,13 +436,58 @@ def rules_toggle(rule_id: int = Form(...)):
 def rules_delete(rule_id: int = Form(...)):
     with db.connect() as con:
         con.execute("DELETE FROM rules WHERE id = ?", (rule_id,))
+        ruleindex.bump(con)
+    readcache.invalidate(readcache.RULES, readcache.ALERTS)
     return RedirectResponse("/rules", status_code=303)
 
 
+_SEARCH_PAGE = 50
+
+
+def _search(q: str, feed_id: str, before: str) -> dict:
+    fid, before_id = _optional_int(feed_id), _optional_int(before)
+    with db.connect() as con:
+        hits = search.search(con, q, feed_id=fid, before=before_id, limit=_SEARCH_PAGE) if q.strip() else []
+        available = db.fts_available(con)
+    return {
+        "q": q,
+        "feed_id": fid,
+        "hits": hits,
+        "feeds": _feed_names().value,
+        "available": available,
+        "min_term": search.MIN_TERM,
+        # A full page means there may be more; page on with rowid < the last id shown.
+        "next_before": hits[-1].id if len(hits) == _SEARCH_PAGE else None,
+    }
+
+
+@app.get("/search", response_class=HTMLResponse)
+def search_page(request: Request, q: str = "", feed_id: str = "", before: str = ""):
+    return templates.TemplateResponse(request, "search.html", _search(q, feed_id, before))
+
+
+@app.get("/search.json")
+def search_json(request: Request, q: str = "", feed_id: str = "", before: str = ""):
+    ctx = _search(q, feed_id, before)
+    return _json(request, {"q": q, "results": [h.as_dict() for h in ctx["hits"]], "next_before": ctx["next_before"]})
+
+
 @app.get("/settings", response_class=HTMLResponse)
 def settings_page(request: Request):
     keys = [
         "poll_interval_seconds",
+        "poll_max_interval_seconds",
+        "fetch_concurrency",
+        "fetch_per_host",
+        "parse_workers",
+        "poll_in_web",
+        "stream_min_kib",
+        "stream_max_kib",
+        "stream_stop_after_seen",
+        "notify_email_digest",
+        "notify_digest_max",
+        "entry_retention_days",
+        "entry_max_per_feed",
         "pushover_app_token",
         "pushover_user_key",
         "smtp_host",
@@ -181,14 +497,30 @@ def settings_page(request: Request):
         "smtp_from",
         "smtp_to",
     ]
-    with db.connect() as con:
-        vals = {k: (db.kv_get(con, k, "") or "") for k in keys}
-    return templates.TemplateResponse(request, "settings.html", {"vals": vals})
+    settings = _settings()
+    vals = {k: settings.value.get(k, "") for k in keys}
+    return _conditional(
+        request,
+        _etag("settings", vals),
+        lambda: templates.TemplateResponse(request, "settings.html", {"vals": vals}),
+    )
 
 
 @app.post("/settings/save")
 def settings_save(
     poll_interval_seconds: str = Form("300"),
+    poll_max_interval_seconds: str = Form(""),
+    fetch_concurrency: str = Form("16"),
+    fetch_per_host: str = Form("4"),
+    parse_workers: str = Form(""),
+    poll_in_web: str = Form("1"),
+    stream_min_kib: str = Form("256"),
+    stream_max_kib: str = Form("4096"),
+    stream_stop_after_seen: str = Form("10"),
+    notify_email_digest: str = Form("0"),
+    notify_digest_max: str = Form("20"),
+    entry_retention_days: str = Form("30"),
+    entry_max_per_feed: str = Form("2000"),
     pushover_app_token: str = Form(""),
     pushover_user_key: str = Form(""),
     smtp_host: str = Form(""),
@@ -200,6 +532,18 @@ def settings_save(
 ):
     with db.connect() as con:
         db.kv_set(con, "poll_interval_seconds", poll_interval_seconds.strip() or "300")
+        db.kv_set(con, "poll_max_interval_seconds", poll_max_interval_seconds.strip())
+        db.kv_set(con, "fetch_concurrency", fetch_concurrency.strip() or "16")
+        db.kv_set(con, "fetch_per_host", fetch_per_host.strip() or "4")
+        db.kv_set(con, "parse_workers", parse_workers.strip())
+        db.kv_set(con, "poll_in_web", "0" if poll_in_web.strip() == "0" else "1")
+        db.kv_set(con, "stream_min_kib", stream_min_kib.strip() or "256")
+        db.kv_set(con, "stream_max_kib", stream_max_kib.strip() or "4096")
+        db.kv_set(con, "stream_stop_after_seen", stream_stop_after_seen.strip() or "10")
+        db.kv_set(con, "notify_email_digest", "1" if notify_email_digest.strip() == "1" else "0")
+        db.kv_set(con, "notify_digest_max", notify_digest_max.strip() or "20")
+        db.kv_set(con, "entry_retention_days", entry_retention_days.strip() or "30")
+        db.kv_set(con, "entry_max_per_feed", entry_max_per_feed.strip() or "2000")
         db.kv_set(con, "pushover_app_token", pushover_app_token.strip())
         db.kv_set(con, "pushover_user_key", pushover_user_key.strip())
         db.kv_set(con, "smtp_host", smtp_host.strip())
@@ -208,34 +552,74 @@ def settings_save(
         db.kv_set(con, "smtp_pass", smtp_pass)  # allow spaces
         db.kv_set(con, "smtp_from", smtp_from.strip())
         db.kv_set(con, "smtp_to", smtp_to.strip())
+    readcache.invalidate(readcache.SETTINGS)
     return RedirectResponse("/settings", status_code=303)
 
 
+_LOG_LEVELS = ("info", "error")
+
+
 @app.get("/logs", response_class=HTMLResponse)
-def logs_page(request: Request):
+def logs_page(request: Request, before: str = "", feed_id: str = "", rule_id: str = "", level: str = ""):
+    db.flush_logs()
+    fid, rid = _optional_int(feed_id), _optional_int(rule_id)
+    level = level if level in _LOG_LEVELS else ""
     with db.connect() as con:
-        rows = con.execute(
-            """
-            SELECT l.id, l.ts, l.level, l.area, l.message, l.feed_id, l.rule_id, l.entry_link, l.error,
-                   f.name AS feed_name,
-                   r.keyword AS rule_keyword
-            FROM app_log l
-            LEFT JOIN feeds f ON f.id = l.feed_id
-            LEFT JOIN rules r ON r.id = l.rule_id
-            ORDER BY l.id DESC
-            LIMIT 250
-            """
-        ).fetchall()
-        max_rows = (db.kv_get(con, "log_max_rows", "2000") or "2000").strip()
+        page = queries.logs(con, before=_optional_int(before), feed_id=fid, rule_id=rid, level=level, limit=250)
+        max_rows = db.manager().logs.max_rows(con)
+        profiles = profiling.recent(con)
+        profile_pending = db.kv_get(con, profiling.REQUEST_KEY) == "1"
     return templates.TemplateResponse(
         request,
         "logs.html",
-        {"rows": rows, "max_rows": max_rows},
+        {
+            "rows": page.rows,
+            "max_rows": max_rows,
+            "profiles": profiles,
+            "profile_pending": profile_pending,
+            "feeds": _feed_names().value,
+            "rules": _rule_names().value,
+            "feed_id": fid,
+            "rule_id": rid,
+            "level": level,
+            "levels": _LOG_LEVELS,
+            "older_url": _page_url("/logs", before=page.next_before, feed_id=fid, rule_id=rid, level=level),
+        },
+    )
+
+
+@app.post("/logs/profile")
+def logs_profile():
+    with db.connect() as con:
+        profiling.request(con)
+    readcache.invalidate(readcache.SETTINGS)
+    return RedirectResponse("/logs", status_code=303)
+
+
+@app.get("/logs/profiles/{profile_id}", response_class=HTMLResponse)
+def profile_page(request: Request, profile_id: int):
+    with db.connect() as con:
+        profile = profiling.load(con, profile_id)
+    if profile is None:
+        return PlainTextResponse("not found", status_code=404)
+    return templates.TemplateResponse(request, "profile.html", {"profile": profile})
+
+
+@app.get("/logs/profiles/{profile_id}/collapsed.txt", response_class=PlainTextResponse)
+def profile_collapsed(profile_id: int):
+    with db.connect() as con:
+        profile = profiling.load(con, profile_id)
+    if profile is None:
+        return PlainTextResponse("not found", status_code=404)
+    return PlainTextResponse(
+        profile["collapsed"],
+        headers={"Content-Disposition": f'attachment; filename="poll-{profile_id}.collapsed.txt"'},
     )
 
 
 @app.post("/logs/clear")
 def logs_clear():
+    db.flush_logs()
     with db.connect() as con:
         con.execute("DELETE FROM app_log")
         db.log_write(con, level="info", area="ui", message="logs cleared")
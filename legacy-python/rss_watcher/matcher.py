@@ -0,0 +1,315 @@
+from __future__ import annotations
+
+import re
+from collections import deque
+from dataclasses import dataclass
+from typing import Iterable, Mapping
+
+try:
+    from re import _parser as _sre_parse  # 3.11+
+except ImportError:  # pragma: no cover
+    import sre_parse as _sre_parse  # type: ignore[no-redef]
+
+
+# Rule kinds: plain substring, whole-word substring, regular expression.
+KINDS = ("keyword", "word", "regex")
+# Which part of an entry a rule looks at; "body" is the summary plus full content.
+FIELDS = ("any", "title", "body")
+
+
+@dataclass(frozen=True)
+class Match:
+    rule_id: int
+    keyword: str
+    created_at: str
+
+
+def normalize_keyword(s: str) -> str:
+    return re.sub(r"\s+", " ", s.strip())
+
+
+def split_terms(s: str | None) -> list[str]:
+    """Comma-separated extra terms (all-of / none-of), normalized like keywords."""
+    return [t for t in (normalize_keyword(p) for p in (s or "").split(",")) if t]
+
+
+def compile_regex(pattern: str) -> re.Pattern:
+    # Rules match case-insensitively, against lowercased text like every other kind.
+    return re.compile(pattern, re.IGNORECASE)
+
+
+def required_literal(pattern: str) -> str:
+    """
+    The longest run of literal characters that every match of `pattern` must contain,
+    lowercased; '' when nothing is certain (alternations, optional groups, classes).
+    """
+    try:
+        parsed = _sre_parse.parse(pattern, re.IGNORECASE)
+    except re.error:
+        return ""
+    best = ""
+
+    def walk(items) -> None:
+        nonlocal best
+        run: list[str] = []
+        for op, av in items:
+            if op is _sre_parse.LITERAL:
+                run.append(chr(av))
+                continue
+            if op is _sre_parse.AT:
+                # Anchors and \b are zero-width; the literals around them stay adjacent.
+                continue
+            if len(run) > len(best):
+                best = "".join(run)
+            run = []
+            if op is _sre_parse.SUBPATTERN:
+                walk(av[-1])
+            elif op in (_sre_parse.MAX_REPEAT, _sre_parse.MIN_REPEAT) and av[0] >= 1:
+                walk(av[2])
+        if len(run) > len(best):
+            best = "".join(run)
+
+    walk(parsed)
+    return best.lower()
+
+
+class Automaton:
+    """
+    Aho-Corasick automaton over lowercase patterns.
+
+    `search` walks the text once and reports the index of every pattern that occurs
+    anywhere in it, regardless of how many patterns were added.
+    """
+
+    def __init__(self, patterns: Iterable[str]) -> None:
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[tuple[int, ...]] = [()]
+        self.patterns: list[str] = []
+
+        for p in patterns:
+            self._add(p)
+        self._build()
+
+    def _add(self, pattern: str) -> None:
+        idx = len(self.patterns)
+        self.patterns.append(pattern)
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            node = nxt
+        self._out[node] = self._out[node] + (idx,)
+
+    def _build(self) -> None:
+        queue: deque[int] = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                fc = self._goto[f].get(ch, 0)
+                self._fail[child] = fc if fc != child else 0
+                # Fold the fail state's outputs in so search never has to chase dictionary links.
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def search(self, text: str) -> set[int]:
+        goto, fail, out = self._goto, self._fail, self._out
+        found: set[int] = set()
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                found.update(out[node])
+        return found
+
+
+@dataclass(frozen=True)
+class _RuleRef:
+    rule_id: int
+    keyword: str
+    created_at: str
+
+
+def _word(term: str) -> re.Pattern:
+    return re.compile(r"(?<!\w)" + re.escape(term) + r"(?!\w)")
+
+
+@dataclass(frozen=True)
+class _Rule:
+    """A rule that needs more than "keyword occurs anywhere": checked only once triggered."""
+
+    ref: _RuleRef
+    feed_id: int | None
+    field: str
+    require: tuple[int, ...]  # automaton terms that must all occur in the field
+    exclude: tuple[tuple[int, re.Pattern | None], ...]  # terms that must not (optionally as a whole word)
+    words: tuple[re.Pattern, ...]  # whole-word checks for the required terms
+    regex: re.Pattern | None
+
+    def accepts(self, hits: set[int], text: str) -> bool:
+        for i in self.require:
+            if i not in hits:
+                return False
+        for i, word in self.exclude:
+            if i in hits and (word is None or word.search(text)):
+                return False
+        for word in self.words:
+            if not word.search(text):
+                return False
+        return self.regex is None or self.regex.search(text) is not None
+
+
+def _col(r: Mapping, name: str) -> object:
+    # Rule rows from older callers (and tests) may only carry id/keyword/feed_id/created_at.
+    try:
+        return r[name]
+    except (KeyError, IndexError):
+        return None
+
+
+# Below this many distinct terms, C-level `in` checks beat a Python-level automaton walk.
+_SCAN_THRESHOLD = 32
+
+
+class RuleMatcher:
+    """
+    All enabled rules compiled into one automaton.
+
+    Every literal term any rule uses (keywords, all-of / none-of terms, and the longest
+    literal each regex requires) is a single pattern, so an entry is scanned once however
+    many rules there are. Plain keyword rules sharing a term are bucketed by feed scope
+    (None = all feeds), so scoping is a dict lookup per hit. Richer rules hang off one
+    trigger term and are only checked, with their word-boundary, all-of / none-of, field
+    and regex conditions, when that term occurs; a regex with no required literal is
+    checked on every entry.
+    """
+
+    def __init__(self, rules: Iterable[Mapping]) -> None:
+        terms: dict[str, int] = {}
+        plain: dict[int, dict[int | None, list[_RuleRef]]] = {}
+        triggered: dict[int, list[_Rule]] = {}
+        self._always: list[_Rule] = []
+        self.invalid: list[int] = []
+        self._rule_count = 0
+
+        def term(t: str) -> int:
+            return terms.setdefault(t.lower(), len(terms))
+
+        feed_ids: set[int | None] = set()
+        for r in rules:
+            kind = str(_col(r, "kind") or "keyword")
+            field = str(_col(r, "field") or "any")
+            kw = str(r["keyword"]).strip() if kind == "regex" else normalize_keyword(r["keyword"])
+            if not kw or kind not in KINDS or field not in FIELDS:
+                continue
+            fid = int(r["feed_id"]) if r["feed_id"] is not None else None
+            ref = _RuleRef(rule_id=int(r["id"]), keyword=kw, created_at=str(r["created_at"]))
+            all_of = split_terms(_col(r, "all_of"))
+            none_of = split_terms(_col(r, "none_of"))
+
+            if kind == "keyword" and field == "any" and not all_of and not none_of:
+                plain.setdefault(term(kw), {}).setdefault(fid, []).append(ref)
+            else:
+                regex = None
+                if kind == "regex":
+                    try:
+                        regex = compile_regex(kw)
+                    except re.error:
+                        self.invalid.append(ref.rule_id)
+                        continue
+                    required = all_of
+                else:
+                    required = [kw, *all_of]
+                words = kind == "word"
+                rule = _Rule(
+                    ref=ref,
+                    feed_id=fid,
+                    field=field,
+                    require=tuple(term(t) for t in required),
+                    exclude=tuple((term(t), _word(t.lower()) if words else None) for t in none_of),
+                    words=tuple(_word(t.lower()) for t in required) if words else (),
+                    regex=regex,
+                )
+                # Trigger on the longest literal the rule can't match without.
+                candidates = list(required)
+                if regex is not None and (lit := required_literal(kw)):
+                    candidates.append(lit)
+                if candidates:
+                    triggered.setdefault(term(max(candidates, key=len)), []).append(rule)
+                else:
+                    self._always.append(rule)
+            feed_ids.add(fid)
+            self._rule_count += 1
+
+        self._automaton = Automaton(terms)
+        self._patterns = self._automaton.patterns
+        self._scopes = [plain.get(i, {}) for i in range(len(self._patterns))]
+        self._triggered = [tuple(triggered.get(i, ())) for i in range(len(self._patterns))]
+        self._has_rich = bool(triggered or self._always)
+        self._feed_ids = feed_ids
+
+    def __len__(self) -> int:
+        return self._rule_count
+
+    def covers(self, feed_id: int) -> bool:
+        """Whether any rule could match entries from this feed."""
+        return None in self._feed_ids or int(feed_id) in self._feed_ids
+
+    def _search(self, hay: str) -> set[int]:
+        if not hay:
+            return set()
+        if len(self._patterns) <= _SCAN_THRESHOLD:
+            return {i for i, p in enumerate(self._patterns) if p in hay}
+        return self._automaton.search(hay)
+
+    def find(self, feed_id: int, text: str, title: str = "") -> list[Match]:
+        """Rules matching an entry; `text` is its body (summary and content)."""
+        return self.find_fields(feed_id, title.lower(), text.lower())
+
+    def find_fields(self, feed_id: int, title: str, body: str) -> list[Match]:
+        """Like find(), for an already lowercased title and body."""
+        title_hits = self._search(title)
+        body_hits = self._search(body)
+        hits = title_hits | body_hits
+        if not hits and not self._always:
+            return []
+        fid = int(feed_id)
+        out: list[Match] = []
+        for idx in hits:
+            scopes = self._scopes[idx]
+            for ref in scopes.get(None, ()):
+                out.append(Match(rule_id=ref.rule_id, keyword=ref.keyword, created_at=ref.created_at))
+            for ref in scopes.get(fid, ()):
+                out.append(Match(rule_id=ref.rule_id, keyword=ref.keyword, created_at=ref.created_at))
+
+        if self._has_rich:
+            rich = [rule for idx in hits for rule in self._triggered[idx]]
+            rich.extend(self._always)
+            both: str | None = None
+            for rule in rich:
+                if rule.feed_id is not None and rule.feed_id != fid:
+                    continue
+                if rule.field == "title":
+                    ok = rule.accepts(title_hits, title)
+                elif rule.field == "body":
+                    ok = rule.accepts(body_hits, body)
+                else:
+                    if both is None:
+                        both = f"{title}\n{body}" if title and body else title or body
+                    ok = rule.accepts(hits, both)
+                if ok:
+                    ref = rule.ref
+                    out.append(Match(rule_id=ref.rule_id, keyword=ref.keyword, created_at=ref.created_at))
+        # Same order the per-rule scan produced (rules are loaded by id).
+        out.sort(key=lambda m: m.rule_id)
+        return out
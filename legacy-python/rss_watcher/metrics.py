@@ -0,0 +1,352 @@
+from __future__ import annotations
+
+import bisect
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Iterable
+
+from . import lease
+
+
+# Poll pipeline stages, in order. "fetch" is the download (including parsing, for bodies
+# parsed while they stream in); the rest are timed per feed, see Stopwatch.
+STAGES = ("fetch", "parse", "dedupe", "match", "persist", "notify")
+
+# Seconds; fine at the bottom for the per-feed database stages, coarse at the top for slow hosts.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Stopwatch:
+    """
+    Splits elapsed time between stages: each `lap` charges the time since the previous
+    one to the named stage. One clock read per lap, so it can sit in per-entry loops.
+    """
+
+    __slots__ = ("seconds", "_mark")
+
+    def __init__(self) -> None:
+        self.seconds: dict[str, float] = {}
+        self._mark = time.perf_counter()
+
+    def reset(self) -> None:
+        self._mark = time.perf_counter()
+
+    def lap(self, stage: str) -> None:
+        now = time.perf_counter()
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + (now - self._mark)
+        self._mark = now
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+    def total(self) -> float:
+        return sum(self.seconds.values())
+
+
+class Histogram:
+    """Prometheus-style histogram: per-bucket counts plus sum and count."""
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, v: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS, v)] += 1
+        self.sum += v
+        self.count += 1
+
+    def state(self) -> dict[str, Any]:
+        return {"counts": list(self.counts), "sum": self.sum, "count": self.count}
+
+    def merge(self, state: dict[str, Any]) -> None:
+        self.counts = [a + b for a, b in zip(self.counts, state["counts"])]
+        self.sum += state["sum"]
+        self.count += state["count"]
+
+    def quantile(self, q: float) -> float | None:
+        """Upper bound of the bucket holding the q-th observation (what Prometheus would estimate from)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+@dataclass
+class FeedTimings:
+    name: str
+    polls: int = 0
+    failures: int = 0
+    bytes: int = 0
+    last_seconds: float = 0.0
+    max_seconds: float = 0.0
+    total: Histogram = field(default_factory=Histogram)
+    stage_seconds: dict[str, float] = field(default_factory=dict)
+
+    @property
+    def mean_seconds(self) -> float:
+        return self.total.sum / self.total.count if self.total.count else 0.0
+
+    def state(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "polls": self.polls,
+            "failures": self.failures,
+            "bytes": self.bytes,
+            "last_seconds": self.last_seconds,
+            "max_seconds": self.max_seconds,
+            "total": self.total.state(),
+            "stage_seconds": dict(self.stage_seconds),
+        }
+
+    def merge(self, state: dict[str, Any]) -> None:
+        self.name = state["name"]
+        self.polls += state["polls"]
+        self.failures += state["failures"]
+        self.bytes += state["bytes"]
+        self.last_seconds = state["last_seconds"]
+        self.max_seconds = max(self.max_seconds, state["max_seconds"])
+        self.total.merge(state["total"])
+        for stage, seconds in state["stage_seconds"].items():
+            self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+
+
+_COUNTERS = {
+    "polls": "Completed polls.",
+    "feeds_polled": "Feed fetches handled, including failures and not-modified responses.",
+    "feed_errors": "Feeds whose fetch or parse failed.",
+    "bytes_downloaded": "Response body bytes read from feeds.",
+    "entries_seen": "Entries parsed from feed bodies.",
+    "entries_new": "Entries stored for the first time.",
+    "alerts": "Alerts created.",
+}
+
+
+class Registry:
+    """Counters and timing histograms for the poll pipeline, since the process started."""
+
+    def __init__(self) -> None:
+        self.started = time.time()
+        self.counters = dict.fromkeys(_COUNTERS, 0)
+        self.poll = Histogram()
+        self.stages = {s: Histogram() for s in STAGES}
+        self.feeds: dict[int, FeedTimings] = {}
+        self._lock = threading.Lock()
+
+    def record_feed(
+        self,
+        feed_id: int,
+        name: str,
+        sw: Stopwatch,
+        *,
+        nbytes: int = 0,
+        seen: int = 0,
+        new: int = 0,
+        alerts: int = 0,
+        failed: bool = False,
+    ) -> None:
+        total = sw.total()
+        with self._lock:
+            c = self.counters
+            c["feeds_polled"] += 1
+            c["feed_errors"] += int(failed)
+            c["bytes_downloaded"] += nbytes
+            c["entries_seen"] += seen
+            c["entries_new"] += new
+            c["alerts"] += alerts
+            for stage, seconds in sw.seconds.items():
+                self.stages[stage].observe(seconds)
+            f = self.feeds.get(feed_id)
+            if f is None:
+                f = self.feeds[feed_id] = FeedTimings(name=name)
+            f.name = name
+            f.polls += 1
+            f.failures += int(failed)
+            f.bytes += nbytes
+            f.last_seconds = total
+            f.max_seconds = max(f.max_seconds, total)
+            f.total.observe(total)
+            for stage, seconds in sw.seconds.items():
+                f.stage_seconds[stage] = f.stage_seconds.get(stage, 0.0) + seconds
+
+    def record_poll(self, wall: float) -> None:
+        with self._lock:
+            self.counters["polls"] += 1
+            self.poll.observe(wall)
+
+    def state(self) -> dict[str, Any]:
+        """Everything recorded so far, as plain JSON-able data for `merge`."""
+        with self._lock:
+            return {
+                "started": self.started,
+                "counters": dict(self.counters),
+                "poll": self.poll.state(),
+                "stages": {s: h.state() for s, h in self.stages.items()},
+                "feeds": {str(fid): f.state() for fid, f in self.feeds.items()},
+            }
+
+    def merge(self, state: dict[str, Any], feed_ids: Iterable[int] | None = None) -> None:
+        """Add another registry's `state()` to this one, keeping only `feed_ids` if given."""
+        keep = None if feed_ids is None else set(feed_ids)
+        with self._lock:
+            self.started = min(self.started, state["started"])
+            for name, n in state["counters"].items():
+                if name in self.counters:
+                    self.counters[name] += n
+            self.poll.merge(state["poll"])
+            for stage, h in state["stages"].items():
+                if stage in self.stages:
+                    self.stages[stage].merge(h)
+            for key, f in state["feeds"].items():
+                fid = int(key)
+                if keep is not None and fid not in keep:
+                    continue
+                if fid not in self.feeds:
+                    self.feeds[fid] = FeedTimings(name=f["name"])
+                self.feeds[fid].merge(f)
+
+    def forget_feed(self, feed_id: int) -> None:
+        with self._lock:
+            self.feeds.pop(feed_id, None)
+
+    def slowest(self, n: int = 10) -> list[dict[str, Any]]:
+        """Feeds by mean time per poll, slowest first, with the mean split by stage."""
+        with self._lock:
+            ranked = sorted(self.feeds.items(), key=lambda kv: kv[1].mean_seconds, reverse=True)[:n]
+            return [
+                {
+                    "feed_id": fid,
+                    "name": f.name,
+                    "polls": f.polls,
+                    "failures": f.failures,
+                    "bytes": f.bytes,
+                    "mean_seconds": round(f.mean_seconds, 4),
+                    "p95_seconds": f.total.quantile(0.95),
+                    "max_seconds": round(f.max_seconds, 4),
+                    "stages": {s: round(f.stage_seconds.get(s, 0.0) / f.polls, 4) for s in STAGES},
+                }
+                for fid, f in ranked
+            ]
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                **self.counters,
+                "poll_p50_seconds": self.poll.quantile(0.5),
+                "poll_p99_seconds": self.poll.quantile(0.99),
+                "stage_seconds": {s: round(h.sum, 3) for s, h in self.stages.items()},
+            }
+
+    def exposition(self) -> str:
+        """All metrics in the Prometheus text format."""
+        out: list[str] = []
+        with self._lock:
+            for name, help_text in _COUNTERS.items():
+                metric = f"rsswatcher_{name}_total"
+                out += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter", f"{metric} {self.counters[name]}"]
+            out += _histogram("rsswatcher_poll_seconds", "Wall time of a whole poll.", [({}, self.poll)])
+            out += _histogram(
+                "rsswatcher_stage_seconds",
+                "Time one feed spent in each pipeline stage.",
+                [({"stage": s}, h) for s, h in self.stages.items() if h.count],
+            )
+            out += _histogram(
+                "rsswatcher_feed_seconds",
+                "Time to handle one feed, all stages.",
+                [({"feed_id": str(fid), "feed": f.name}, f.total) for fid, f in sorted(self.feeds.items())],
+            )
+            out += [
+                "# HELP rsswatcher_start_time_seconds Unix time the process started.",
+                "# TYPE rsswatcher_start_time_seconds gauge",
+                f"rsswatcher_start_time_seconds {self.started:.3f}",
+            ]
+        return "\n".join(out) + "\n"
+
+
+def _labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    esc = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, esc)) + "}"
+
+
+def _histogram(name: str, help_text: str, series: Iterable[tuple[dict[str, str], Histogram]]) -> list[str]:
+    out = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for labels, h in series:
+        cumulative = 0
+        for bound, n in zip(BUCKETS, h.counts):
+            cumulative += n
+            out.append(f"{name}_bucket{_labels({**labels, 'le': repr(bound)})} {cumulative}")
+        out.append(f"{name}_bucket{_labels({**labels, 'le': '+Inf'})} {h.count}")
+        out.append(f"{name}_sum{_labels(labels)} {h.sum:.6f}")
+        out.append(f"{name}_count{_labels(labels)} {h.count}")
+    return out
+
+
+_registry = Registry()
+
+# A process that stopped publishing this long ago is taken to be gone.
+PUBLISHED_MAX_AGE = 30.0
+
+
+def registry() -> Registry:
+    return _registry
+
+
+def reset() -> None:
+    global _registry
+    _registry = Registry()
+
+
+def publish(con: sqlite3.Connection, **extra: Any) -> None:
+    """
+    Store this process's registry, plus `extra` snapshots (pool stats and the like), for
+    web processes to read with `collected`.
+    """
+    now = time.time()
+    state = {"metrics": registry().state(), **extra}
+    con.execute(
+        """
+        INSERT INTO process_stats(holder, published_at, state) VALUES(?, ?, ?)
+        ON CONFLICT(holder) DO UPDATE SET published_at = excluded.published_at, state = excluded.state
+        """,
+        (lease.process_id(), now, json.dumps(state, separators=(",", ":"))),
+    )
+    con.execute("DELETE FROM process_stats WHERE published_at < ?", (now - 10 * PUBLISHED_MAX_AGE,))
+
+
+def unpublish(con: sqlite3.Connection) -> None:
+    con.execute("DELETE FROM process_stats WHERE holder = ?", (lease.process_id(),))
+
+
+def collected(con: sqlite3.Connection) -> tuple[Registry, dict[str, dict[str, Any]]]:
+    """
+    This process's registry merged with every other live process's published one, so the
+    numbers are the same whichever process serves them; and the other processes' published
+    extras by holder.
+    """
+    combined = Registry()
+    combined.merge(registry().state())
+    extras: dict[str, dict[str, Any]] = {}
+    rows = con.execute(
+        "SELECT holder, state FROM process_stats WHERE published_at >= ? AND holder != ?",
+        (time.time() - PUBLISHED_MAX_AGE, lease.process_id()),
+    ).fetchall()
+    if rows:
+        # Another process may still hold timings for feeds deleted since.
+        feed_ids = [int(r[0]) for r in con.execute("SELECT id FROM feeds")]
+        for r in rows:
+            state = json.loads(r["state"])
+            combined.merge(state.pop("metrics"), feed_ids)
+            extras[r["holder"]] = state
+    return combined, extras
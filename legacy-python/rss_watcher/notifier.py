@@ -2,12 +2,15 @@ from __future__ import annotations
 
 import os
 import smtplib
+import sqlite3
 from dataclasses import dataclass
 from email.message import EmailMessage
-from typing import Optional
+from typing import Optional, Sequence
 
 import httpx
 
+from . import db
+
 
 @dataclass(frozen=True)
 class PushoverConfig:
@@ -50,7 +53,38 @@ def env_smtp() -> Optional[SmtpConfig]:
     return SmtpConfig(host=host, port=port, user=user, password=password, mail_from=mail_from, mail_to=mail_to)
 
 
-async def send_pushover(cfg: PushoverConfig, title: str, message: str, url: str) -> None:
+def load_config(con: sqlite3.Connection) -> tuple[Optional[PushoverConfig], Optional[SmtpConfig]]:
+    # Environment overrides (preferred for secrets).
+    push_cfg = env_pushover()
+    smtp_cfg = env_smtp()
+
+    if not push_cfg:
+        t = db.kv_get(con, "pushover_app_token", "") or ""
+        u = db.kv_get(con, "pushover_user_key", "") or ""
+        if t.strip() and u.strip():
+            push_cfg = PushoverConfig(app_token=t.strip(), user_key=u.strip())
+
+    if not smtp_cfg:
+        host = (db.kv_get(con, "smtp_host", "") or "").strip()
+        port_s = (db.kv_get(con, "smtp_port", "") or "").strip()
+        mail_from = (db.kv_get(con, "smtp_from", "") or "").strip()
+        mail_to = (db.kv_get(con, "smtp_to", "") or "").strip()
+        user = (db.kv_get(con, "smtp_user", "") or "").strip()
+        password = (db.kv_get(con, "smtp_pass", "") or "").strip()
+        try:
+            port = int(port_s) if port_s else 0
+        except ValueError:
+            port = 0
+        if host and port and mail_from and mail_to:
+            smtp_cfg = SmtpConfig(
+                host=host, port=port, user=user, password=password, mail_from=mail_from, mail_to=mail_to
+            )
+    return push_cfg, smtp_cfg
+
+
+async def send_pushover(
+    cfg: PushoverConfig, title: str, message: str, url: str, *, client: httpx.AsyncClient | None = None
+) -> httpx.Response:
     payload = {
         "token": cfg.app_token,
         "user": cfg.user_key,
@@ -59,19 +93,33 @@ async def send_pushover(cfg: PushoverConfig, title: str, message: str, url: str)
         "url": url[:500],
         "url_title": "Open item",
     }
-    async with httpx.AsyncClient(timeout=15) as client:
-        r = await client.post("https://api.pushover.net/1/messages.json", data=payload)
-        r.raise_for_status()
-
-
-def send_email(cfg: SmtpConfig, subject: str, body: str) -> None:
-    msg = EmailMessage()
-    msg["Subject"] = subject
-    msg["From"] = cfg.mail_from
-    msg["To"] = cfg.mail_to
-    msg.set_content(body)
-
-    with smtplib.SMTP(cfg.host, cfg.port, timeout=20) as smtp:
+    if client is None:
+        async with httpx.AsyncClient(timeout=15) as own_client:
+            return await send_pushover(cfg, title, message, url, client=own_client)
+    r = await client.post("https://api.pushover.net/1/messages.json", data=payload, timeout=15)
+    r.raise_for_status()
+    return r
+
+
+def _connection_lost(e: Exception) -> bool:
+    # smtplib's own errors subclass OSError; those other than a disconnect leave the session usable.
+    if isinstance(e, smtplib.SMTPServerDisconnected):
+        return True
+    return isinstance(e, OSError) and not isinstance(e, smtplib.SMTPException)
+
+
+def send_emails(cfg: SmtpConfig, messages: Sequence[tuple[str, str]]) -> list[Optional[Exception]]:
+    """
+    Send several (subject, body) messages over one SMTP session.
+
+    Returns one entry per message: None if it was accepted, else the error. A failure to
+    connect or log in raises instead, since nothing was sent. Once sending has started it
+    never raises: if the connection breaks, that message and the rest get the error, and
+    the ones already accepted still count as sent.
+    """
+    results: list[Optional[Exception]] = []
+    smtp = smtplib.SMTP(cfg.host, cfg.port, timeout=20)
+    try:
         try:
             smtp.starttls()
         except smtplib.SMTPException:
@@ -79,5 +127,33 @@ def send_email(cfg: SmtpConfig, subject: str, body: str) -> None:
             pass
         if cfg.user and cfg.password:
             smtp.login(cfg.user, cfg.password)
-        smtp.send_message(msg)
+        lost: Optional[Exception] = None
+        for subject, body in messages:
+            if lost is not None:
+                results.append(lost)
+                continue
+            msg = EmailMessage()
+            msg["Subject"] = subject
+            msg["From"] = cfg.mail_from
+            msg["To"] = cfg.mail_to
+            msg.set_content(body)
+            try:
+                smtp.send_message(msg)
+            except Exception as e:
+                results.append(e)
+                if _connection_lost(e):
+                    lost = e
+            else:
+                results.append(None)
+    finally:
+        try:
+            smtp.quit()
+        except Exception:
+            smtp.close()
+    return results
 
+
+def send_email(cfg: SmtpConfig, subject: str, body: str) -> None:
+    err = send_emails(cfg, [(subject, body)])[0]
+    if err is not None:
+        raise err
@@ -0,0 +1,316 @@
+from __future__ import annotations
+
+import asyncio
+import sqlite3
+import time
+import traceback
+from typing import Any, Sequence
+
+import httpx
+
+from . import db
+from .notifier import PushoverConfig, SmtpConfig, load_config, send_emails, send_pushover
+
+
+PUSHOVER = "pushover"
+EMAIL = "email"
+
+_dispatchers: "set[Dispatcher]" = set()
+
+
+def enqueue(
+    con: sqlite3.Connection,
+    *,
+    channel: str,
+    feed_id: int | None,
+    rule_id: int | None,
+    subject: str,
+    title: str,
+    body: str,
+    link: str,
+) -> None:
+    con.execute(
+        """
+        INSERT INTO outbox(channel, feed_id, rule_id, subject, title, body, link)
+        VALUES(?, ?, ?, ?, ?, ?, ?)
+        """,
+        (channel, feed_id, rule_id, subject, title, body, link),
+    )
+
+
+def wake() -> None:
+    """Tell running dispatchers there is new work, instead of waiting for their next tick."""
+    for d in list(_dispatchers):
+        d.wake_event.set()
+
+
+def _backoff_seconds(attempts: int) -> int:
+    return min(3600, 30 * 2 ** max(0, attempts - 1))
+
+
+# Claimed rows are pushed this far into the future, so another dispatcher skips them while
+# they are being sent; if this one dies mid-send they simply come due again.
+_CLAIM_SECONDS = 600
+
+
+def _claim(con: sqlite3.Connection, channel: str, limit: int) -> list[sqlite3.Row]:
+    with db.transaction(con):
+        rows = con.execute(
+            """
+            UPDATE outbox SET next_attempt_at = datetime('now', ?)
+            WHERE id IN (
+              SELECT id FROM outbox
+              WHERE status = 'pending' AND channel = ? AND next_attempt_at <= datetime('now')
+              ORDER BY id ASC
+              LIMIT ?
+            )
+            RETURNING id, feed_id, rule_id, subject, title, body, link, attempts
+            """,
+            (f"+{_CLAIM_SECONDS} seconds", channel, limit),
+        ).fetchall()
+    # RETURNING comes back in no particular order.
+    return sorted(rows, key=lambda r: r["id"])
+
+
+def _release(con: sqlite3.Connection, rows: Sequence[sqlite3.Row]) -> None:
+    """Make claimed rows that weren't attempted due again right away."""
+    con.executemany(
+        "UPDATE outbox SET next_attempt_at = datetime('now') WHERE id = ? AND status = 'pending'",
+        [(r["id"],) for r in rows],
+    )
+
+
+def _mark_sent(con: sqlite3.Connection, rows: Sequence[sqlite3.Row], channel: str) -> None:
+    con.executemany(
+        "UPDATE outbox SET status = 'sent', attempts = attempts + 1, sent_at = datetime('now') WHERE id = ?",
+        [(r["id"],) for r in rows],
+    )
+    for r in rows:
+        db.log_write(
+            con,
+            level="info",
+            area="notify",
+            message=f"{channel} sent",
+            feed_id=r["feed_id"],
+            rule_id=r["rule_id"],
+            entry_link=r["link"],
+        )
+
+
+def _mark_retry(
+    con: sqlite3.Connection,
+    rows: Sequence[sqlite3.Row],
+    channel: str,
+    error: str,
+    *,
+    max_attempts: int,
+    retry_after: int | None = None,
+    permanent: bool = False,
+) -> None:
+    for r in rows:
+        attempts = int(r["attempts"]) + 1
+        if permanent or attempts >= max_attempts:
+            con.execute(
+                "UPDATE outbox SET status = 'failed', attempts = ?, last_error = ? WHERE id = ?",
+                (attempts, error, r["id"]),
+            )
+            message = f"{channel} failed"
+        else:
+            delay = max(retry_after or 0, _backoff_seconds(attempts))
+            con.execute(
+                """
+                UPDATE outbox
+                SET attempts = ?, last_error = ?, next_attempt_at = datetime('now', ?)
+                WHERE id = ?
+                """,
+                (attempts, error, f"+{delay} seconds", r["id"]),
+            )
+            message = f"{channel} failed (attempt {attempts}/{max_attempts}, retry in {delay}s)"
+        db.log_write(
+            con,
+            level="error",
+            area="notify",
+            message=message,
+            feed_id=r["feed_id"],
+            rule_id=r["rule_id"],
+            entry_link=r["link"],
+            error=error,
+        )
+
+
+def _retry_after(resp: httpx.Response) -> int | None:
+    v = (resp.headers.get("Retry-After") or "").strip()
+    return int(v) if v.isdigit() else None
+
+
+class Dispatcher:
+    """
+    Drains the `outbox` table: Pushover over the shared HTTP client, email over one SMTP
+    session per batch in a worker thread, so neither ever blocks the event loop.
+    """
+
+    def __init__(self, client: httpx.AsyncClient | None = None) -> None:
+        self.client = client
+        self.wake_event = asyncio.Event()
+        # Pushover tells us when the app's monthly quota is exhausted; hold sends until reset.
+        self.pushover_paused_until = 0.0
+
+    async def _send_pushover(self, cfg: PushoverConfig, rows: Sequence[sqlite3.Row], max_attempts: int) -> int:
+        sent = 0
+        for i, r in enumerate(rows):
+            if time.time() < self.pushover_paused_until:
+                with db.writer() as con:
+                    _release(con, rows[i:])
+                break
+            try:
+                resp = await send_pushover(cfg, r["subject"], r["title"], r["link"], client=self.client)
+            except httpx.HTTPStatusError as e:
+                status = e.response.status_code
+                with db.writer() as con, db.transaction(con):
+                    _mark_retry(
+                        con,
+                        [r],
+                        PUSHOVER,
+                        traceback.format_exc(limit=10),
+                        max_attempts=max_attempts,
+                        retry_after=_retry_after(e.response),
+                        # 4xx other than 429 means the request itself is bad; retrying won't help.
+                        permanent=400 <= status < 500 and status != 429,
+                    )
+                if status == 429:
+                    with db.writer() as con:
+                        _release(con, rows[i + 1 :])
+                    break
+                continue
+            except Exception:
+                with db.writer() as con, db.transaction(con):
+                    _mark_retry(con, [r], PUSHOVER, traceback.format_exc(limit=10), max_attempts=max_attempts)
+                continue
+
+            sent += 1
+            with db.writer() as con, db.transaction(con):
+                _mark_sent(con, [r], PUSHOVER)
+            if resp is not None and (resp.headers.get("X-Limit-App-Remaining") or "").strip() == "0":
+                reset = (resp.headers.get("X-Limit-App-Reset") or "").strip()
+                self.pushover_paused_until = float(reset) if reset.isdigit() else time.time() + 3600
+        return sent
+
+    async def _send_email(
+        self, cfg: SmtpConfig, rows: Sequence[sqlite3.Row], max_attempts: int, digest_max: int
+    ) -> int:
+        # Each batch is a list of queue rows delivered as one message.
+        if digest_max > 1:
+            batches = [rows[i : i + digest_max] for i in range(0, len(rows), digest_max)]
+        else:
+            batches = [[r] for r in rows]
+
+        messages: list[tuple[str, str]] = []
+        for batch in batches:
+            if len(batch) == 1:
+                messages.append((batch[0]["subject"], batch[0]["body"]))
+            else:
+                body = "\n\n---\n\n".join(r["body"] for r in batch)
+                messages.append((f"RSS Watcher: {len(batch)} new alerts", body))
+
+        try:
+            results = await asyncio.to_thread(send_emails, cfg, messages)
+        except Exception:
+            with db.writer() as con, db.transaction(con):
+                _mark_retry(con, rows, EMAIL, traceback.format_exc(limit=10), max_attempts=max_attempts)
+            return 0
+
+        sent = 0
+        with db.writer() as con, db.transaction(con):
+            for batch, err in zip(batches, results):
+                if err is None:
+                    sent += len(batch)
+                    _mark_sent(con, batch, EMAIL)
+                else:
+                    _mark_retry(con, batch, EMAIL, repr(err), max_attempts=max_attempts)
+        return sent
+
+    async def drain_once(self) -> int:
+        """Deliver everything currently due; returns the number of queue rows sent."""
+        with db.writer() as con:
+            push_cfg, smtp_cfg = load_config(con)
+            max_attempts = db.kv_int(con, "notify_max_attempts", 5)
+            digest = (db.kv_get(con, "notify_email_digest", "0") or "0").strip() == "1"
+            digest_max = db.kv_int(con, "notify_digest_max", 20) if digest else 1
+            push_rows = _claim(con, PUSHOVER, 50)
+            email_rows = _claim(con, EMAIL, 200)
+
+            unconfigured = [(PUSHOVER, push_rows)] if push_rows and not push_cfg else []
+            if email_rows and not smtp_cfg:
+                unconfigured.append((EMAIL, email_rows))
+            for channel, rows in unconfigured:
+                with db.transaction(con):
+                    _mark_retry(
+                        con, rows, channel, f"{channel} is not configured", max_attempts=1, permanent=True
+                    )
+
+        sent = 0
+        if push_rows and push_cfg:
+            sent += await self._send_pushover(push_cfg, push_rows, max_attempts)
+        if email_rows and smtp_cfg:
+            sent += await self._send_email(smtp_cfg, email_rows, max_attempts, digest_max)
+        if push_rows or email_rows:
+            with db.writer() as con:
+                db.manager().logs.flush(con)
+        return sent
+
+    async def run(self, stop_event: asyncio.Event, *, tick_seconds: float = 15.0) -> None:
+        _dispatchers.add(self)
+        last_trim = 0.0
+        try:
+            while not stop_event.is_set():
+                self.wake_event.clear()
+                try:
+                    await self.drain_once()
+                    if time.monotonic() - last_trim > 3600:
+                        last_trim = time.monotonic()
+                        with db.writer() as con:
+                            con.execute(
+                                "DELETE FROM outbox WHERE status != 'pending' AND created_at < datetime('now', '-7 days')"
+                            )
+                except Exception:
+                    pass
+                # Wake early for new alerts; otherwise tick to pick up retries that came due.
+                try:
+                    await asyncio.wait_for(self.wake_event.wait(), timeout=tick_seconds)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            _dispatchers.discard(self)
+
+
+async def run_dispatcher(stop_event: asyncio.Event, client: httpx.AsyncClient | None = None) -> None:
+    db.migrate()
+    await Dispatcher(client).run(stop_event)
+
+
+def metrics(con: sqlite3.Connection) -> dict[str, Any]:
+    depth = {str(r[0]): int(r[1]) for r in con.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status")}
+    oldest = con.execute(
+        """
+        SELECT (julianday('now') - julianday(MIN(created_at))) * 86400
+        FROM outbox WHERE status = 'pending'
+        """
+    ).fetchone()[0]
+    latencies = sorted(
+        float(r[0])
+        for r in con.execute(
+            """
+            SELECT (julianday(sent_at) - julianday(created_at)) * 86400
+            FROM outbox WHERE status = 'sent'
+            ORDER BY id DESC LIMIT 200
+            """
+        )
+    )
+    return {
+        "pending": depth.get("pending", 0),
+        "sent": depth.get("sent", 0),
+        "failed": depth.get("failed", 0),
+        "oldest_pending_seconds": round(oldest, 1) if oldest is not None else None,
+        "latency_p50_seconds": round(latencies[len(latencies) // 2], 1) if latencies else None,
+        "latency_max_seconds": round(latencies[-1], 1) if latencies else None,
+    }
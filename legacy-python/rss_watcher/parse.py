@@ -0,0 +1,279 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import html
+import multiprocessing
+import os
+import sqlite3
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Any
+
+import feedparser
+# Private, but feedparser is pinned: the streamed parser sanitizes exactly as it does.
+from feedparser.mixin import _FeedParserMixin
+from feedparser.sanitizer import _sanitize_html
+
+from . import db
+from .ingest import EntryRow
+
+
+def _entry_key(entry: dict) -> str:
+    # Prefer stable IDs; fall back to link or hashed title+published.
+    for k in ("id", "guid", "link"):
+        v = (entry.get(k) or "").strip()
+        if v:
+            return v
+    raw = f"{entry.get('title','')}|{entry.get('published','')}|{entry.get('updated','')}"
+    return hashlib.sha256(raw.encode("utf-8", errors="ignore")).hexdigest()
+
+
+def _entry_content(entry: dict) -> str | None:
+    # Title and summary are fields of their own; this is only the extra full-text content.
+    content = entry.get("content")
+    if not isinstance(content, list):
+        return None
+    parts = [v for v in ((c or {}).get("value") for c in content) if isinstance(v, str) and v.strip()]
+    return "\n".join(parts) or None
+
+
+def _entry_row(entry: dict, feed_url: str) -> EntryRow:
+    return EntryRow(
+        key=_entry_key(entry),
+        link=(entry.get("link") or "").strip() or feed_url,
+        title=(entry.get("title") or "").strip() or "(untitled)",
+        published=(entry.get("published") or entry.get("updated") or "").strip() or None,
+        summary=(entry.get("summary") or entry.get("description") or "").strip() or None,
+        content=_entry_content(entry),
+    )
+
+
+@dataclass(frozen=True)
+class ParsedFeed:
+    """What the watcher needs from a parsed feed: plain rows, not feedparser's dict tree."""
+
+    rows: list[EntryRow]
+    ttl: str | None = None
+    # False when a streamed parse stopped before the end of the document.
+    complete: bool = True
+
+
+def parse_feed(content: bytes, feed_url: str) -> ParsedFeed:
+    # Module-level so a process pool can pickle a reference to it.
+    parsed = feedparser.parse(content)
+    ttl = parsed.feed.get("ttl")
+    return ParsedFeed(
+        rows=[_entry_row(e, feed_url) for e in parsed.entries or []],
+        ttl=str(ttl) if ttl is not None else None,
+    )
+
+
+_ATOM = "{http://www.w3.org/2005/Atom}"
+_RSS1 = "{http://purl.org/rss/1.0/}"
+_DC = "{http://purl.org/dc/elements/1.1/}"
+_DCTERMS = "{http://purl.org/dc/terms/}"
+_RDF_ABOUT = "{http://www.w3.org/1999/02/22-rdf-syntax-ns#}about"
+_CONTENT_ENCODED = "{http://purl.org/rss/1.0/modules/content/}encoded"
+_ENTRY_TAGS = frozenset({"item", _RSS1 + "item", _ATOM + "entry"})
+_ROOT_TAGS = frozenset({"rss", "{http://www.w3.org/1999/02/22-rdf-syntax-ns#}RDF", _ATOM + "feed"})
+# The elements feedparser fills `published` and `updated` from; the last one present wins.
+_PUBLISHED_TAGS = frozenset({"pubDate", _ATOM + "published", _ATOM + "issued", _DCTERMS + "issued"})
+_UPDATED_TAGS = frozenset({_ATOM + "updated", _ATOM + "modified", _DC + "date", _DCTERMS + "modified"})
+
+
+class UnsupportedFeed(ValueError):
+    pass
+
+
+def _text(el: ET.Element | None) -> str:
+    return "".join(el.itertext()).strip() if el is not None else ""
+
+
+def _markup(el: ET.Element) -> str:
+    tag = el.tag.rpartition("}")[2]
+    attrs = "".join(f' {k.rpartition("}")[2]}="{html.escape(v)}"' for k, v in el.attrib.items())
+    return f"<{tag}{attrs}>{_inner_markup(el)}</{tag}>"
+
+
+def _inner_markup(el: ET.Element) -> str:
+    return html.escape(el.text or "", quote=False) + "".join(
+        _markup(c) + html.escape(c.tail or "", quote=False) for c in el
+    )
+
+
+def _sanitize(value: str, content_type: str) -> str:
+    # The sanitizer only touches markup; most titles and many summaries have none.
+    return _sanitize_html(value, "utf-8", content_type).strip() if "<" in value else value
+
+
+def _atom_text(el: ET.Element | None) -> str:
+    """An Atom text construct as feedparser reports it: html and xhtml sanitized, text as is."""
+    if el is None:
+        return ""
+    kind = el.get("type", "text").lower()
+    if kind in ("xhtml", "application/xhtml+xml"):
+        # feedparser drops the wrapping <div> and keeps the markup inside it.
+        divs = [c for c in el if c.tag.rpartition("}")[2] == "div"]
+        inner = _inner_markup(divs[0]) if len(divs) == 1 and not (el.text or "").strip() else _inner_markup(el)
+        return _sanitize(inner.strip(), "application/xhtml+xml")
+    if kind in ("html", "text/html"):
+        return _sanitize(_text(el), "text/html")
+    return _text(el)
+
+
+def _rss_html(el: ET.Element | None) -> str:
+    # RSS descriptions and content:encoded are HTML to feedparser.
+    return _sanitize(_text(el), "text/html")
+
+
+def _element_row(el: ET.Element, feed_url: str) -> EntryRow:
+    """
+    Build an EntryRow from one <item>/<entry> element.
+
+    Follows feedparser's rules for the fields _entry_row reads (id/link fallbacks, which
+    date elements fill published/updated, summary falling back to content, sanitized
+    markup), so a feed switched between streamed and full parsing keeps its entry keys.
+    tests/test_stream_parse.py checks that on a corpus of awkward items.
+    """
+    atom = el.tag == _ATOM + "entry"
+    ns = _ATOM if atom else (_RSS1 if el.tag.startswith(_RSS1) else "")
+
+    def child(name: str) -> ET.Element | None:
+        return el.find(ns + name)
+
+    published = updated = ""
+    for c in el:
+        if c.tag in _PUBLISHED_TAGS:
+            published = _text(c)
+        elif c.tag in _UPDATED_TAGS:
+            updated = _text(c)
+    # feedparser answers entry["updated"] with `published` when there is no update date.
+    updated = updated or published
+
+    if atom:
+        title = _atom_text(child("title"))
+        ident = _text(child("id"))
+        link = ""
+        for ln in el.findall(_ATOM + "link"):
+            if ln.get("rel", "alternate") == "alternate" and ln.get("href"):
+                link = ln.get("href", "").strip()
+                break
+        link = link or ident
+        summary = _atom_text(child("summary"))
+        contents = [_atom_text(c) for c in el.findall(_ATOM + "content")]
+    else:
+        title = _text(child("title"))
+        if title and _FeedParserMixin.looks_like_html(title):
+            title = _sanitize(title, "text/html")
+        guid = child("guid")
+        ident = _text(guid) or (el.get(_RDF_ABOUT) or "").strip()
+        link = _text(child("link"))
+        if not link and guid is not None and guid.get("isPermaLink", "true") != "false":
+            link = _text(guid)
+        summary = _rss_html(child("description"))
+        contents = [_rss_html(c) for c in el.findall(_CONTENT_ENCODED)]
+
+    key = ident or link
+    if not key:
+        raw = f"{title}|{published}|{updated}"
+        key = hashlib.sha256(raw.encode("utf-8", errors="ignore")).hexdigest()
+    contents = [c for c in contents if c]
+    return EntryRow(
+        key=key,
+        link=link or feed_url,
+        title=title or "(untitled)",
+        published=published or updated or None,
+        summary=summary or (contents[0] if contents else "") or None,
+        content="\n".join(contents) or None,
+    )
+
+
+class StreamParser:
+    """
+    Incremental RSS 2.0 / RSS 1.0 / Atom parser: feed it bytes as they arrive and get back
+    each entry as soon as its closing tag is seen.
+
+    Finished entries are detached from the tree, so memory stays flat however long the
+    document is. Anything that isn't one of those formats raises UnsupportedFeed on its
+    root element, and malformed XML raises ET.ParseError; callers fall back to feedparser.
+    """
+
+    def __init__(self, feed_url: str) -> None:
+        self.feed_url = feed_url
+        self.ttl: str | None = None
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._stack: list[ET.Element] = []
+
+    def feed(self, data: bytes) -> list[EntryRow]:
+        self._parser.feed(data)
+        out: list[EntryRow] = []
+        for event, el in self._parser.read_events():
+            if event == "start":
+                if not self._stack and el.tag not in _ROOT_TAGS:
+                    raise UnsupportedFeed(el.tag)
+                self._stack.append(el)
+                continue
+            self._stack.pop()
+            if el.tag in _ENTRY_TAGS:
+                out.append(_element_row(el, self.feed_url))
+                if self._stack:
+                    self._stack[-1].remove(el)
+            elif el.tag == "ttl" and self.ttl is None:
+                self.ttl = (el.text or "").strip() or None
+        return out
+
+
+class ParsePool:
+    """
+    Runs `parse_feed` off the event loop, in a pool of worker processes.
+
+    feedparser is pure Python, so threads would still hold the GIL; processes let large
+    feeds parse on other cores while the loop keeps serving the UI. With `workers=0`
+    parsing happens inline on the loop, as before (tests, single-core hosts).
+    """
+
+    def __init__(self, workers: int = 2) -> None:
+        self.workers = max(0, workers)
+        self.parsed = 0
+        self.restarts = 0
+        self._executor: ProcessPoolExecutor | None = None
+
+    @classmethod
+    def from_settings(cls, con: sqlite3.Connection | None = None) -> "ParsePool":
+        if con is None:
+            with db.connect() as con:
+                return cls.from_settings(con)
+        return cls(workers=db.kv_int(con, "parse_workers", min(2, os.cpu_count() or 1), minimum=0))
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn, not fork: forking a process that has an event loop and threads running
+            # can copy held locks into the child.
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def parse(self, content: bytes, feed_url: str) -> ParsedFeed:
+        self.parsed += 1
+        if not self.workers:
+            return parse_feed(content, feed_url)
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._pool(), parse_feed, content, feed_url)
+        except BrokenProcessPool:
+            # A worker died (OOM, segfault in a C extension); start a fresh pool next time.
+            self.restarts += 1
+            self.close()
+            raise
+
+    def snapshot(self) -> dict[str, Any]:
+        return {"workers": self.workers, "parsed": self.parsed, "restarts": self.restarts}
+
+    def close(self) -> None:
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import contextlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Iterator
+
+from . import db
+
+
+# Set (settings page or POST /logs/profile) to profile the next poll; the poller clears it.
+REQUEST_KEY = "profile_next_poll"
+# Profiles kept in the database; older ones are dropped as new ones are saved.
+KEEP = 20
+# 200 Hz: enough samples for a poll of a few seconds, while the sampler itself stays under ~2%.
+INTERVAL = 0.005
+
+# Frame labels show paths relative to these (the app's parent dir, site-packages, ...).
+_ROOTS = tuple(
+    sorted(
+        {os.path.dirname(os.path.dirname(os.path.abspath(__file__))), *(p for p in sys.path if p)},
+        key=len,
+        reverse=True,
+    )
+)
+
+
+def _where(path: str) -> str:
+    for root in _ROOTS:
+        if path.startswith(root):
+            return path[len(root) :].lstrip(os.sep)
+    return path
+
+
+def _label(code) -> str:
+    # Collapsed-stack format separates frames with ';' and ends with ' <count>'.
+    name = f"{code.co_qualname} ({_where(code.co_filename)}:{code.co_firstlineno})"
+    return name.replace(";", ",")
+
+
+@dataclass
+class Profile:
+    interval: float
+    elapsed: float = 0.0
+    stacks: Counter[str] = field(default_factory=Counter)
+
+    @property
+    def samples(self) -> int:
+        return sum(self.stacks.values())
+
+    def collapsed(self) -> str:
+        """One "root;...;leaf count" line per distinct stack, for flamegraph.pl / speedscope."""
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+    def top(self, n: int = 30) -> list[dict[str, Any]]:
+        """Functions by samples with them on top of the stack (self) and anywhere on it (total)."""
+        own: Counter[str] = Counter()
+        total: Counter[str] = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for f in set(frames):
+                total[f] += count
+        samples = self.samples or 1
+        return [
+            {
+                "function": f,
+                "self": own[f],
+                "total": total[f],
+                "self_pct": round(100 * own[f] / samples, 1),
+                "total_pct": round(100 * total[f] / samples, 1),
+            }
+            for f, _ in sorted(total.items(), key=lambda kv: (own[kv[0]], kv[1]), reverse=True)[:n]
+        ]
+
+
+class Sampler:
+    """
+    Statistical profiler for one thread: a helper thread records that thread's Python stack
+    every `interval` seconds. Nothing is hooked into the profiled code, so it runs at full
+    speed and time spent waiting (the event loop's select) shows up as such.
+
+    Only this process is seen; feeds parsed in the parse pool's processes appear as the
+    wait for their result.
+    """
+
+    def __init__(self, thread_id: int | None = None, interval: float = INTERVAL) -> None:
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.profile = Profile(interval=interval)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="poll-profiler", daemon=True)
+        self._started = 0.0
+
+    def _run(self) -> None:
+        stacks = self.profile.stacks
+        labels: dict[Any, str] = {}
+        while not self._stop.wait(self.profile.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            parts: list[str] = []
+            while frame is not None:
+                code = frame.f_code
+                label = labels.get(code)
+                if label is None:
+                    label = labels[code] = _label(code)
+                parts.append(label)
+                frame = frame.f_back
+            if parts:
+                stacks[";".join(reversed(parts))] += 1
+
+    def start(self) -> "Sampler":
+        self._started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def stop(self) -> Profile:
+        self._stop.set()
+        self._thread.join()
+        self.profile.elapsed = time.perf_counter() - self._started
+        return self.profile
+
+
+@contextlib.contextmanager
+def sampling(interval: float = INTERVAL) -> Iterator[Profile]:
+    """Profile the current thread for the duration of the block; the Profile fills in on exit."""
+    sampler = Sampler(interval=interval).start()
+    try:
+        yield sampler.profile
+    finally:
+        sampler.stop()
+
+
+def request(con: sqlite3.Connection) -> None:
+    db.kv_set(con, REQUEST_KEY, "1")
+
+
+def take_request(con: sqlite3.Connection) -> bool:
+    """True (once) if a profile of the next poll was asked for."""
+    # Plain read first: the usual answer costs no write transaction.
+    if db.kv_get(con, REQUEST_KEY) != "1":
+        return False
+    return bool(con.execute("UPDATE kv SET v = '0' WHERE k = ? AND v = '1'", (REQUEST_KEY,)).rowcount)
+
+
+def save(con: sqlite3.Connection, prof: Profile, *, label: str = "poll") -> int:
+    cur = con.execute(
+        """
+        INSERT INTO profiles(label, elapsed, interval, samples, top, collapsed)
+        VALUES(?, ?, ?, ?, ?, ?)
+        """,
+        (label, prof.elapsed, prof.interval, prof.samples, json.dumps(prof.top()), prof.collapsed()),
+    )
+    con.execute(
+        "DELETE FROM profiles WHERE id NOT IN (SELECT id FROM profiles ORDER BY id DESC LIMIT ?)",
+        (KEEP,),
+    )
+    return int(cur.lastrowid)
+
+
+def recent(con: sqlite3.Connection) -> list[dict[str, Any]]:
+    return [
+        dict(r)
+        for r in con.execute(
+            "SELECT id, created_at, label, elapsed, samples FROM profiles ORDER BY id DESC LIMIT ?", (KEEP,)
+        )
+    ]
+
+
+def load(con: sqlite3.Connection, profile_id: int) -> dict[str, Any] | None:
+    r = con.execute("SELECT * FROM profiles WHERE id = ?", (profile_id,)).fetchone()
+    if r is None:
+        return None
+    return {**dict(r), "top": json.loads(r["top"])}
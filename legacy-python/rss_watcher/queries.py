@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import sqlite3
+from dataclasses import dataclass
+from typing import Any
+
+# Listings behind the web pages, keyset-paged newest first: a page is
+# "id < cursor ORDER BY id DESC LIMIT n", so page 500 costs the same as page 1. Filters are
+# equalities on indexed columns (see db.migrate); tests/test_query_plans.py keeps it that way.
+
+# The first page's cursor, so every query has the same shape (and plan).
+FIRST = 2**63 - 1
+
+
+@dataclass(frozen=True)
+class Page:
+    rows: list[dict[str, Any]]
+    # Cursor for the next (older) page; None on the last page.
+    next_before: int | None
+
+
+def _page(con: sqlite3.Connection, sql: str, params: list[Any], limit: int) -> Page:
+    rows = [dict(r) for r in con.execute(sql, [*params, limit + 1])]
+    if len(rows) > limit:
+        return Page(rows=rows[:limit], next_before=int(rows[limit - 1]["id"]))
+    return Page(rows=rows, next_before=None)
+
+
+def alerts_query(
+    *, before: int | None = None, feed_id: int | None = None, rule_id: int | None = None
+) -> tuple[str, list[Any]]:
+    where = ["a.id < ?"]
+    params: list[Any] = [before or FIRST]
+    if feed_id is not None:
+        where.append("a.feed_id = ?")
+        params.append(feed_id)
+    if rule_id is not None:
+        where.append("a.rule_id = ?")
+        params.append(rule_id)
+    sql = f"""
+        SELECT a.id, a.keyword, a.created_at, a.rule_id, a.feed_id, e.title, e.link, f.name AS feed_name
+        FROM alerts a
+        JOIN entries e ON e.id = a.entry_id
+        JOIN feeds f ON f.id = e.feed_id
+        WHERE {" AND ".join(where)}
+        ORDER BY a.id DESC
+        LIMIT ?
+    """
+    return sql, params
+
+
+def alerts(
+    con: sqlite3.Connection,
+    *,
+    before: int | None = None,
+    feed_id: int | None = None,
+    rule_id: int | None = None,
+    limit: int = 50,
+) -> Page:
+    sql, params = alerts_query(before=before, feed_id=feed_id, rule_id=rule_id)
+    return _page(con, sql, params, limit)
+
+
+def logs_query(
+    *,
+    before: int | None = None,
+    feed_id: int | None = None,
+    rule_id: int | None = None,
+    level: str | None = None,
+) -> tuple[str, list[Any]]:
+    where = ["l.id < ?"]
+    params: list[Any] = [before or FIRST]
+    if feed_id is not None:
+        where.append("l.feed_id = ?")
+        params.append(feed_id)
+    if rule_id is not None:
+        where.append("l.rule_id = ?")
+        params.append(rule_id)
+    if level:
+        where.append("l.level = ?")
+        params.append(level)
+    sql = f"""
+        SELECT l.id, l.ts, l.level, l.area, l.message, l.feed_id, l.rule_id, l.entry_link, l.error,
+               f.name AS feed_name,
+               r.keyword AS rule_keyword
+        FROM app_log l
+        LEFT JOIN feeds f ON f.id = l.feed_id
+        LEFT JOIN rules r ON r.id = l.rule_id
+        WHERE {" AND ".join(where)}
+        ORDER BY l.id DESC
+        LIMIT ?
+    """
+    return sql, params
+
+
+def logs(
+    con: sqlite3.Connection,
+    *,
+    before: int | None = None,
+    feed_id: int | None = None,
+    rule_id: int | None = None,
+    level: str | None = None,
+    limit: int = 100,
+) -> Page:
+    sql, params = logs_query(before=before, feed_id=feed_id, rule_id=rule_id, level=level)
+    return _page(con, sql, params, limit)
+
+
+# Plain dicts rather than sqlite3.Row, so results can be cached and fingerprinted.
+
+
+def feeds(con: sqlite3.Connection) -> list[dict[str, Any]]:
+    return [
+        dict(r)
+        for r in con.execute(
+            "SELECT id, name, url, enabled, full_parse, retention_days, retention_max_entries FROM feeds ORDER BY id DESC"
+        )
+    ]
+
+
+def feed_names(con: sqlite3.Connection) -> list[dict[str, Any]]:
+    return [dict(r) for r in con.execute("SELECT id, name FROM feeds ORDER BY name ASC")]
+
+
+def rules(con: sqlite3.Connection) -> list[dict[str, Any]]:
+    return [
+        dict(r)
+        for r in con.execute(
+            """
+            SELECT r.id, r.keyword, r.feed_id, r.enabled, r.kind, r.field, r.all_of, r.none_of,
+                   f.name AS feed_name
+            FROM rules r
+            LEFT JOIN feeds f ON f.id = r.feed_id
+            ORDER BY r.id DESC
+            """
+        )
+    ]
+
+
+def rule_names(con: sqlite3.Connection) -> list[dict[str, Any]]:
+    return [dict(r) for r in con.execute("SELECT id, keyword FROM rules ORDER BY keyword ASC")]
+
+
+def settings(con: sqlite3.Connection) -> dict[str, str]:
+    return {str(r["k"]): str(r["v"]) for r in con.execute("SELECT k, v FROM kv")}
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Hashable, Iterable
+
+from . import db
+
+
+# What a read model is built from. Writers invalidate the topics they touch.
+FEEDS = "feeds"
+RULES = "rules"
+ALERTS = "alerts"
+SETTINGS = "settings"
+POLL = "poll"
+
+# Filtered / paged listings each get their own entry; keep the cache bounded.
+_MAX_ENTRIES = 256
+
+
+def fingerprint(value: Any) -> str:
+    """Short stable hash of plain data (dicts, lists, tuples, scalars)."""
+    return hashlib.blake2b(repr(value).encode("utf-8"), digest_size=8).hexdigest()
+
+
+@dataclass(frozen=True)
+class Cached:
+    value: Any
+    # Fingerprint of `value`: unchanged when a reload returns the same data, so it doubles as
+    # the ETag ingredient for pages built from it.
+    etag: str
+    versions: tuple[int, ...]
+    loaded_at: float
+
+
+class ReadCache:
+    """
+    The web pages' read models (feed and rule lists, alert pages, kv settings), cached in
+    process so auto-refreshing dashboards don't re-run every query on every hit.
+
+    Each entry remembers the versions of the topics it was built from. Form handlers and
+    the poller call `invalidate`, so the next request after a write reloads. The TTL caps
+    staleness from writers this process never hears about (the sqlite3 shell, a worker
+    process).
+    """
+
+    def __init__(self, ttl: float = 5.0) -> None:
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._versions: dict[str, int] = {}
+        self._entries: OrderedDict[Hashable, Cached] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def invalidate(self, *topics: str) -> None:
+        with self._lock:
+            for t in topics:
+                self._versions[t] = self._versions.get(t, 0) + 1
+
+    def get(self, key: Hashable, topics: Iterable[str], load: Callable[[sqlite3.Connection], Any]) -> Cached:
+        with self._lock:
+            versions = tuple(self._versions.get(t, 0) for t in topics)
+            hit = self._entries.get(key)
+            if hit is not None and hit.versions == versions and time.monotonic() - hit.loaded_at < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return hit
+            self.misses += 1
+        with db.connect() as con:
+            value = load(con)
+        # Stored under the versions read before loading: an invalidation that lands mid-load
+        # makes the entry stale at once, so the next request reloads.
+        entry = Cached(value=value, etag=fingerprint(value), versions=versions, loaded_at=time.monotonic())
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > _MAX_ENTRIES:
+                self._entries.popitem(last=False)
+        return entry
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "ttl": self.ttl}
+
+
+_caches: dict[str, ReadCache] = {}
+_caches_lock = threading.Lock()
+
+
+def cache() -> ReadCache:
+    path = db.db_path()
+    with _caches_lock:
+        c = _caches.get(path)
+        if c is None:
+            c = _caches[path] = ReadCache()
+        return c
+
+
+def get(key: Hashable, topics: Iterable[str], load: Callable[[sqlite3.Connection], Any]) -> Cached:
+    return cache().get(key, topics, load)
+
+
+def invalidate(*topics: str) -> None:
+    cache().invalidate(*topics)
+
+
+def reset() -> None:
+    with _caches_lock:
+        _caches.clear()
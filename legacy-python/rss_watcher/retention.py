@@ -0,0 +1,339 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Sequence
+
+from . import db, ingest
+
+
+# Rows touched per transaction, and the pause between batches so the watcher gets the writer
+# connection back quickly.
+_BATCH = 500
+_PAUSE = 0.05
+# Free pages handed back to the filesystem per pass (4 KiB pages: ~8 MiB).
+_VACUUM_PAGES = 2000
+_ANALYZE_EVERY = 24 * 3600
+# Trimmed keys stay known through entry_tombstones; this floor keeps enough recent rows
+# for the seen index to warm from without falling back to the database on every poll.
+_MIN_ENTRIES = 200
+
+
+@dataclass(frozen=True)
+class Policy:
+    days: int  # strip entry text older than this; 0 = keep forever
+    max_entries: int  # delete the oldest rows beyond this many; 0 = unlimited
+
+
+@dataclass(frozen=True)
+class Report:
+    stripped: int
+    deleted: int
+    bytes_reclaimed: int
+    free_bytes: int
+    file_bytes: int
+    analyzed: bool
+    elapsed: float
+    finished_at: str
+
+
+def defaults(con: sqlite3.Connection) -> Policy:
+    return Policy(
+        days=db.kv_int(con, "entry_retention_days", 30, minimum=0),
+        max_entries=db.kv_int(con, "entry_max_per_feed", 2000, minimum=0),
+    )
+
+
+def policies(con: sqlite3.Connection) -> dict[int, Policy]:
+    base = defaults(con)
+    out: dict[int, Policy] = {}
+    for r in con.execute("SELECT id, retention_days, retention_max_entries FROM feeds"):
+        days = base.days if r["retention_days"] is None else max(0, int(r["retention_days"]))
+        max_entries = base.max_entries if r["retention_max_entries"] is None else max(0, int(r["retention_max_entries"]))
+        if max_entries:
+            max_entries = max(_MIN_ENTRIES, max_entries)
+        out[int(r["id"])] = Policy(days=days, max_entries=max_entries)
+    return out
+
+
+def strip_ceiling(con: sqlite3.Connection, default_days: int) -> int:
+    """Highest entry id that some feed's policy has expired; nothing above it is stripped yet."""
+    row = con.execute(
+        """
+        SELECT MAX((
+          SELECT MAX(e.id) FROM entries e
+          WHERE e.feed_id = f.id
+            AND e.seen_at < datetime('now', '-' || COALESCE(f.retention_days, ?) || ' days')
+        ))
+        FROM feeds f
+        WHERE COALESCE(f.retention_days, ?) > 0
+        """,
+        (default_days, default_days),
+    ).fetchone()
+    return int(row[0] or 0)
+
+
+def strip_batch(
+    con: sqlite3.Connection, default_days: int, after_id: int, ceiling: int, limit: int = _BATCH
+) -> tuple[int, int]:
+    """
+    Reduce expired entries to their dedupe key; returns (rows stripped, last id visited).
+
+    Each batch looks at the next `limit` entries that still have text, by id after the
+    cursor and up to `ceiling` (see strip_ceiling), through idx_entries_unstripped: stubs
+    left by earlier passes and entries still within their retention period are never
+    rescanned, however many there are. Entries with alerts keep their title and link,
+    since the dashboard still shows them.
+    """
+    window = """
+        SELECT id FROM entries INDEXED BY idx_entries_unstripped
+        WHERE id > ? AND id <= ? AND (summary IS NOT NULL OR title != '' OR link != '')
+        ORDER BY id
+        LIMIT ?
+    """
+    params = (after_id, ceiling, limit)
+    visited, last = con.execute(f"SELECT COUNT(*), MAX(id) FROM ({window})", params).fetchone()
+    if not visited:
+        return 0, ceiling
+    rows = con.execute(
+        f"""
+        UPDATE entries SET summary = NULL, title = '', link = ''
+        WHERE id IN (
+          SELECT e.id
+          FROM ({window}) w
+          CROSS JOIN entries e ON e.id = w.id
+          JOIN feeds f ON f.id = e.feed_id
+          WHERE COALESCE(f.retention_days, ?) > 0
+            AND e.seen_at < datetime('now', '-' || COALESCE(f.retention_days, ?) || ' days')
+            AND NOT EXISTS (SELECT 1 FROM alerts a WHERE a.entry_id = e.id)
+        )
+        RETURNING id
+        """,
+        (*params, default_days, default_days),
+    ).fetchall()
+    return len(rows), int(last) if visited == limit else ceiling
+
+
+def trim_threshold(con: sqlite3.Connection, feed_id: int, max_entries: int) -> int | None:
+    """Highest entry id that falls outside the feed's newest `max_entries`, if any."""
+    row = con.execute(
+        "SELECT id FROM entries WHERE feed_id = ? ORDER BY seen_at DESC, id DESC LIMIT 1 OFFSET ?",
+        (feed_id, max_entries),
+    ).fetchone()
+    return int(row[0]) if row else None
+
+
+def trim_batch(
+    con: sqlite3.Connection, feed_id: int, threshold: int, after_id: int, limit: int = _BATCH
+) -> tuple[int, int]:
+    """
+    Delete the feed's entries up to `threshold`, skipping alerted ones; returns (deleted, last id).
+
+    Each deleted key leaves a tombstone, so ingest still knows it if the feed lists it again.
+    """
+    rows = con.execute(
+        """
+        DELETE FROM entries
+        WHERE id IN (
+          SELECT e.id
+          FROM entries e
+          WHERE e.feed_id = ? AND e.id > ? AND e.id <= ?
+            AND NOT EXISTS (SELECT 1 FROM alerts a WHERE a.entry_id = e.id)
+          ORDER BY e.id
+          LIMIT ?
+        )
+        RETURNING id, entry_key
+        """,
+        (feed_id, after_id, threshold, limit),
+    ).fetchall()
+    if not rows:
+        return 0, threshold
+    con.executemany(
+        "INSERT OR IGNORE INTO entry_tombstones(feed_id, key_hash) VALUES(?, ?)",
+        [(feed_id, ingest.key_hash(str(r[1]))) for r in rows],
+    )
+    return len(rows), max(int(r[0]) for r in rows)
+
+
+def _pragma_int(con: sqlite3.Connection, name: str) -> int:
+    return int(con.execute(f"PRAGMA {name}").fetchone()[0])
+
+
+def file_bytes(con: sqlite3.Connection) -> int:
+    return _pragma_int(con, "page_count") * _pragma_int(con, "page_size")
+
+
+def free_bytes(con: sqlite3.Connection) -> int:
+    return _pragma_int(con, "freelist_count") * _pragma_int(con, "page_size")
+
+
+def incremental(con: sqlite3.Connection) -> bool:
+    return _pragma_int(con, "auto_vacuum") == 2
+
+
+def reclaim(con: sqlite3.Connection, pages: int = _VACUUM_PAGES) -> int:
+    """
+    Return up to `pages` free pages to the filesystem; returns bytes reclaimed.
+
+    Only in incremental auto_vacuum mode. Files created before it keep their free pages,
+    which new rows reuse, until converted once with `vacuum()`.
+    """
+    if not incremental(con):
+        return 0
+    before = file_bytes(con)
+    # Frees one page per step, and sqlite3's execute() only steps once; executescript
+    # runs it to completion.
+    con.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+    return max(0, before - file_bytes(con))
+
+
+def vacuum(path: str | None = None) -> int:
+    """
+    Rewrite the database file in incremental auto_vacuum mode; returns bytes reclaimed.
+
+    A full VACUUM copies every page and holds the write lock until it is done, so the
+    retention loop never runs one: this is a one-off, on its own connection, from
+    `python -m rss_watcher.retention --vacuum`.
+    """
+    con = sqlite3.connect(path or db.db_path(), timeout=30, isolation_level=None)
+    try:
+        before = file_bytes(con)
+        con.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        con.execute("VACUUM")
+        return max(0, before - file_bytes(con))
+    finally:
+        con.close()
+
+
+def analyze(con: sqlite3.Connection) -> None:
+    # Sampled, so it stays cheap on large tables.
+    con.execute("PRAGMA analysis_limit=1000")
+    con.execute("ANALYZE")
+
+
+async def run_once(*, batch: int = _BATCH, pause: float = _PAUSE) -> Report:
+    """One retention pass, in short transactions so the writer is never held for long."""
+    started = time.perf_counter()
+    with db.writer() as con:
+        base = defaults(con)
+        feed_policies = policies(con)
+
+    with db.writer() as con:
+        ceiling = strip_ceiling(con, base.days)
+    stripped = 0
+    after_id = 0
+    while after_id < ceiling:
+        with db.writer() as con, db.transaction(con):
+            n, after_id = strip_batch(con, base.days, after_id, ceiling, batch)
+        stripped += n
+        if after_id < ceiling:
+            await asyncio.sleep(pause)
+
+    deleted = 0
+    for feed_id, policy in feed_policies.items():
+        if not policy.max_entries:
+            continue
+        with db.writer() as con:
+            threshold = trim_threshold(con, feed_id, policy.max_entries)
+        after_id = 0
+        while threshold is not None:
+            with db.writer() as con, db.transaction(con):
+                n, after_id = trim_batch(con, feed_id, threshold, after_id, batch)
+            deleted += n
+            if n < batch:
+                break
+            await asyncio.sleep(pause)
+
+    with db.writer() as con:
+        reclaimed = reclaim(con)
+        last = float(db.kv_get(con, "retention_analyzed_at", "0") or 0)
+        analyzed = time.time() - last > _ANALYZE_EVERY
+        if analyzed:
+            analyze(con)
+            db.kv_set(con, "retention_analyzed_at", str(int(time.time())))
+
+        report = Report(
+            stripped=stripped,
+            deleted=deleted,
+            bytes_reclaimed=reclaimed,
+            free_bytes=free_bytes(con),
+            file_bytes=file_bytes(con),
+            analyzed=analyzed,
+            elapsed=round(time.perf_counter() - started, 3),
+            finished_at=time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime()),
+        )
+        db.kv_set(con, "retention_last_report", json.dumps(asdict(report)))
+        if stripped or deleted or reclaimed:
+            db.log_write(
+                con,
+                level="info",
+                area="retention",
+                message=(
+                    f"retention: {stripped} entries stripped, {deleted} deleted, "
+                    f"{reclaimed // 1024} KiB reclaimed"
+                ),
+            )
+    return report
+
+
+def last_report(con: sqlite3.Connection) -> dict[str, Any] | None:
+    raw = db.kv_get(con, "retention_last_report")
+    if not raw:
+        return None
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return None
+
+
+async def run_retention(stop_event: asyncio.Event, *, every: float = 3600, delay: float = 60) -> None:
+    db.migrate()
+    # Let startup (and the first poll) settle before touching the database.
+    timeout = delay
+    while not stop_event.is_set():
+        try:
+            await asyncio.wait_for(stop_event.wait(), timeout=timeout)
+            break
+        except asyncio.TimeoutError:
+            pass
+        timeout = every
+        try:
+            await run_once()
+        except Exception:
+            pass
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(
+        prog="python -m rss_watcher.retention",
+        description="Run one retention pass now, or convert the database to incremental auto_vacuum.",
+    )
+    ap.add_argument("--db", help="database file (default: $RSSWATCHER_DB_PATH)")
+    ap.add_argument(
+        "--vacuum",
+        action="store_true",
+        help="rewrite the whole file with VACUUM; blocks writers until done, so stop the worker or pick a quiet time",
+    )
+    args = ap.parse_args(argv)
+    if args.db:
+        os.environ["RSSWATCHER_DB_PATH"] = args.db
+    db.migrate()
+    try:
+        if args.vacuum:
+            reclaimed = vacuum()
+            with db.writer() as con:
+                db.log_write(con, level="info", area="retention", message="database converted to incremental auto_vacuum")
+            print(f"vacuumed: {reclaimed // 1024} KiB reclaimed")
+        else:
+            print(json.dumps(asdict(asyncio.run(run_once()))))
+    finally:
+        db.close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+from dataclasses import dataclass
+
+from . import db
+from .matcher import RuleMatcher
+
+
+_VERSION_KEY = "rules_version"
+
+
+def bump(con: sqlite3.Connection) -> None:
+    """Mark the enabled rule set as changed; call after any write to `rules`."""
+    con.execute(
+        """
+        INSERT INTO kv(k, v) VALUES(?, '1')
+        ON CONFLICT(k) DO UPDATE SET v = CAST(v AS INTEGER) + 1
+        """,
+        (_VERSION_KEY,),
+    )
+
+
+def version(con: sqlite3.Connection) -> int:
+    return db.kv_int(con, _VERSION_KEY, 0, minimum=0)
+
+
+def load(con: sqlite3.Connection) -> list[sqlite3.Row]:
+    return con.execute(
+        """
+        SELECT id, keyword, feed_id, created_at, kind, field, all_of, none_of
+        FROM rules WHERE enabled = 1 ORDER BY id ASC
+        """
+    ).fetchall()
+
+
+@dataclass(frozen=True)
+class _Compiled:
+    version: int
+    matcher: RuleMatcher
+
+
+_cache: dict[str, _Compiled] = {}
+_cache_lock = threading.Lock()
+builds = 0
+
+
+def matcher(con: sqlite3.Connection) -> RuleMatcher:
+    """
+    The compiled matcher for the enabled rules, rebuilt only when the version has moved.
+
+    A poll with unchanged rules costs one kv lookup. Edits made outside the app's rule
+    handlers (e.g. with the sqlite3 shell) need a `bump` to be picked up.
+    """
+    global builds
+    path = db.db_path()
+    # Read the version before the rules: a concurrent edit can then only cache newer rules
+    # under the older version (one extra rebuild next poll), never stale rules as current.
+    v = version(con)
+    cached = _cache.get(path)
+    if cached is not None and cached.version == v:
+        return cached.matcher
+    compiled = _Compiled(version=v, matcher=RuleMatcher(load(con)))
+    with _cache_lock:
+        _cache[path] = compiled
+        builds += 1
+    return compiled.matcher
+
+
+def reset() -> None:
+    with _cache_lock:
+        _cache.clear()
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import heapq
+import random
+import re
+import sqlite3
+import statistics
+import time
+from dataclasses import dataclass
+from typing import Any, Iterable
+
+from . import db
+
+# How much an interval shrinks after a poll that found new items, and grows after one that didn't.
+_SPEEDUP = 0.5
+_SLOWDOWN = 1.25
+# Spread due times a little so feeds added together don't stay in lockstep forever.
+_JITTER = 0.1
+
+
+@dataclass(frozen=True)
+class Limits:
+    base: int
+    minimum: int
+    maximum: int
+
+    @classmethod
+    def from_settings(cls, con: sqlite3.Connection) -> "Limits":
+        base = db.kv_int(con, "poll_interval_seconds", 300, minimum=60)
+        minimum = db.kv_int(con, "poll_min_interval_seconds", 60, minimum=60)
+        maximum = db.kv_int(con, "poll_max_interval_seconds", base * 8, minimum=base)
+        return cls(base=base, minimum=min(minimum, base), maximum=maximum)
+
+
+@dataclass(frozen=True)
+class Outcome:
+    """What one fetch of a feed told us about how often it is worth fetching."""
+
+    new_entries: int = 0
+    failed: bool = False
+    # Server/feed hints, in seconds: Cache-Control max-age or RSS <ttl> (a floor on the
+    # interval), and Retry-After (a one-off delay before the next attempt).
+    min_interval: int | None = None
+    retry_after: int | None = None
+
+
+def parse_max_age(cache_control: str | None) -> int | None:
+    if not cache_control:
+        return None
+    if re.search(r"\bno-(cache|store)\b", cache_control, re.I):
+        return None
+    m = re.search(r"\bmax-age\s*=\s*(\d+)", cache_control, re.I)
+    return int(m.group(1)) if m else None
+
+
+def parse_retry_after(value: str | None) -> int | None:
+    v = (value or "").strip()
+    return int(v) if v.isdigit() else None
+
+
+def parse_ttl_minutes(value: Any) -> int | None:
+    v = str(value or "").strip()
+    return int(v) * 60 if v.isdigit() else None
+
+
+def next_interval(current: int, outcome: Outcome, limits: Limits) -> int:
+    if outcome.failed:
+        interval = current * 2
+    elif outcome.new_entries:
+        interval = current * _SPEEDUP
+    else:
+        interval = current * _SLOWDOWN
+    interval = max(limits.minimum, min(limits.maximum, int(interval)))
+    if outcome.min_interval:
+        interval = max(interval, min(outcome.min_interval, limits.maximum))
+    return interval
+
+
+def record(con: sqlite3.Connection, feed_id: int, outcome: Outcome, limits: Limits) -> int:
+    """Persist the feed's next interval and due time; returns the interval."""
+    row = con.execute("SELECT interval_seconds FROM feed_schedule WHERE feed_id = ?", (feed_id,)).fetchone()
+    current = int(row["interval_seconds"]) if row else limits.base
+    interval = next_interval(current, outcome, limits)
+    delay = interval * random.uniform(1 - _JITTER, 1 + _JITTER)
+    if outcome.retry_after:
+        delay = max(delay, outcome.retry_after)
+    now = time.time()
+    con.execute(
+        """
+        INSERT INTO feed_schedule(feed_id, interval_seconds, next_due_at, last_polled_at, last_new_at)
+        VALUES(?, ?, ?, ?, ?)
+        ON CONFLICT(feed_id) DO UPDATE SET
+          interval_seconds = excluded.interval_seconds,
+          next_due_at = excluded.next_due_at,
+          last_polled_at = excluded.last_polled_at,
+          last_new_at = COALESCE(excluded.last_new_at, feed_schedule.last_new_at)
+        """,
+        (feed_id, interval, now + delay, now, now if outcome.new_entries else None),
+    )
+    return interval
+
+
+def defer(con: sqlite3.Connection, feed_ids: Iterable[int], seconds: int) -> None:
+    """Push feeds out without adapting their interval (e.g. nothing to match against yet)."""
+    due = time.time() + seconds
+    con.executemany(
+        """
+        INSERT INTO feed_schedule(feed_id, interval_seconds, next_due_at) VALUES(?, ?, ?)
+        ON CONFLICT(feed_id) DO UPDATE SET next_due_at = excluded.next_due_at
+        """,
+        [(fid, seconds, due) for fid in feed_ids],
+    )
+
+
+class Queue:
+    """Min-heap of (next_due_at, feed_id) for enabled feeds, rebuilt from the database."""
+
+    def __init__(self) -> None:
+        self._heap: list[tuple[float, int]] = []
+
+    def sync(self, con: sqlite3.Connection, holder: str | None = None) -> None:
+        """
+        Load the enabled feeds this process should poll: those leased to `holder` when
+        sharded, otherwise every feed no live shard has claimed.
+        """
+        rows = con.execute(
+            """
+            SELECT f.id, COALESCE(s.next_due_at, 0) AS due
+            FROM feeds f
+            LEFT JOIN feed_schedule s ON s.feed_id = f.id
+            LEFT JOIN feed_leases l ON l.feed_id = f.id AND l.expires_at >= ?
+            WHERE f.enabled = 1 AND (CASE WHEN ? IS NULL THEN l.holder IS NULL ELSE l.holder = ? END)
+            """,
+            (time.time(), holder, holder),
+        ).fetchall()
+        self._heap = [(float(r["due"]), int(r["id"])) for r in rows]
+        heapq.heapify(self._heap)
+
+    def pop_due(self, now: float, *, window: float = 0.0) -> list[int]:
+        """Pop every feed due by `now + window` (a small window batches near-simultaneous feeds)."""
+        out: list[int] = []
+        while self._heap and self._heap[0][0] <= now + window:
+            out.append(heapq.heappop(self._heap)[1])
+        return out
+
+    def next_due(self) -> float | None:
+        return self._heap[0][0] if self._heap else None
+
+
+def summary(con: sqlite3.Connection) -> dict[str, Any]:
+    rows = con.execute(
+        """
+        SELECT s.interval_seconds
+        FROM feed_schedule s JOIN feeds f ON f.id = s.feed_id
+        WHERE f.enabled = 1
+        """
+    ).fetchall()
+    intervals = [int(r[0]) for r in rows if r[0]]
+    return {
+        "scheduled_feeds": len(intervals),
+        "median_interval_seconds": int(statistics.median(intervals)) if intervals else None,
+        "fetches_per_hour": round(sum(3600 / i for i in intervals), 1) if intervals else 0,
+    }
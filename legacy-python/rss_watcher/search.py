@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import re
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Any, Mapping
+
+from markupsafe import Markup, escape
+
+from . import db
+from .matcher import RuleMatcher, normalize_keyword, required_literal, split_terms
+
+
+# Trigram index: shorter terms have no token to look up.
+MIN_TERM = 3
+# A dry run verifies at most this many index candidates, and scans this many of the newest
+# entries when the rule has no term the index can use.
+_DRY_RUN_CANDIDATES = 5000
+_DRY_RUN_SCAN = 5000
+# Snippet highlight markers; escaped text can't contain them, so they're safe to swap for tags.
+_MARK_OPEN, _MARK_CLOSE = "\x02", "\x03"
+_COLUMNS = {"title": "title", "body": "summary"}
+_TERM_RE = re.compile(r'"([^"]+)"|(\S+)')
+
+
+@dataclass(frozen=True)
+class Hit:
+    id: int
+    feed_id: int
+    feed_name: str
+    title: str
+    link: str
+    published: str | None
+    seen_at: str
+    snippet: str = ""
+
+    def snippet_html(self) -> Markup:
+        return Markup(str(escape(self.snippet)).replace(_MARK_OPEN, "<mark>").replace(_MARK_CLOSE, "</mark>"))
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "feed_id": self.feed_id,
+            "feed_name": self.feed_name,
+            "title": self.title,
+            "link": self.link,
+            "published": self.published,
+            "seen_at": self.seen_at,
+            "snippet": self.snippet.replace(_MARK_OPEN, "").replace(_MARK_CLOSE, ""),
+        }
+
+
+@dataclass(frozen=True)
+class DryRun:
+    hits: list[Hit]
+    examined: int  # entries checked against the rule
+    indexed: bool  # False when the rule had no term the index could narrow on
+    elapsed: float
+    error: str | None = None
+
+
+def terms(q: str) -> list[str]:
+    """Query terms (whitespace-separated, "quoted phrases" kept whole) the index can use."""
+    out = []
+    for phrase, word in _TERM_RE.findall(q):
+        t = normalize_keyword(phrase or word)
+        if len(t) >= MIN_TERM:
+            out.append(t)
+    return out
+
+
+def fts_query(terms: list[str], column: str | None = None) -> str:
+    prefix = f"{column} : " if column else ""
+    return " AND ".join(prefix + '"' + t.replace('"', '""') + '"' for t in terms)
+
+
+_SELECT = """
+    SELECT e.id, e.feed_id, f.name AS feed_name, e.title, e.link, e.published, e.seen_at, e.summary
+"""
+
+
+def _hit(r: sqlite3.Row, snippet: str = "") -> Hit:
+    return Hit(
+        id=int(r["id"]),
+        feed_id=int(r["feed_id"]),
+        feed_name=str(r["feed_name"]),
+        title=str(r["title"]),
+        link=str(r["link"]),
+        published=r["published"],
+        seen_at=str(r["seen_at"]),
+        snippet=snippet,
+    )
+
+
+def _matching(
+    con: sqlite3.Connection, query: str, *, feed_id: int | None, before: int | None, limit: int, snippet: bool
+) -> sqlite3.Cursor:
+    sql = _SELECT
+    params: list[Any] = []
+    if snippet:
+        sql += ", snippet(entries_fts, -1, ?, ?, '…', 16) AS snippet"
+        params += [_MARK_OPEN, _MARK_CLOSE]
+    # rowid order and the rowid bound are both handled inside FTS5, so LIMIT stops early.
+    sql += """
+        FROM entries_fts
+        JOIN entries e ON e.id = entries_fts.rowid
+        JOIN feeds f ON f.id = e.feed_id
+        WHERE entries_fts MATCH ?
+    """
+    params.append(query)
+    if before is not None:
+        sql += " AND entries_fts.rowid < ?"
+        params.append(before)
+    if feed_id is not None:
+        sql += " AND e.feed_id = ?"
+        params.append(feed_id)
+    sql += " ORDER BY entries_fts.rowid DESC LIMIT ?"
+    params.append(limit)
+    return con.execute(sql, params)
+
+
+def search(
+    con: sqlite3.Connection, q: str, *, feed_id: int | None = None, before: int | None = None, limit: int = 50
+) -> list[Hit]:
+    """Entries whose title or summary contains every term of `q`, newest first."""
+    ts = terms(q)
+    if not ts or not db.fts_available(con):
+        return []
+    cur = _matching(con, fts_query(ts), feed_id=feed_id, before=before, limit=limit, snippet=True)
+    return [_hit(r, r["snippet"] or "") for r in cur]
+
+
+def dry_run(con: sqlite3.Connection, rule: Mapping[str, Any], *, limit: int = 50) -> DryRun:
+    """
+    Stored entries a rule would match, newest first, ignoring when the rule was created.
+
+    The index narrows the candidates on the rule's literal terms, then the real matcher
+    decides, so results follow the rule's exact semantics. Only titles and summaries are
+    stored, so full-content-only matches don't show up here.
+    """
+    started = time.perf_counter()
+    feed_id = rule.get("feed_id")
+    m = RuleMatcher([{**rule, "id": 0, "created_at": ""}])
+    if m.invalid:
+        return DryRun(hits=[], examined=0, indexed=False, elapsed=0.0, error="invalid regular expression")
+    if not len(m):
+        return DryRun(hits=[], examined=0, indexed=False, elapsed=0.0)
+
+    keyword = str(rule["keyword"])
+    must = [required_literal(keyword) if rule.get("kind") == "regex" else normalize_keyword(keyword)]
+    must += split_terms(rule.get("all_of"))
+    must = [t for t in must if len(t) >= MIN_TERM]
+    indexed = bool(must) and db.fts_available(con)
+    if indexed:
+        query = fts_query(must, _COLUMNS.get(str(rule.get("field") or "any")))
+        cur = _matching(con, query, feed_id=feed_id, before=None, limit=_DRY_RUN_CANDIDATES, snippet=False)
+    else:
+        sql = _SELECT + " FROM entries e JOIN feeds f ON f.id = e.feed_id"
+        params: list[Any] = []
+        if feed_id is not None:
+            sql += " WHERE e.feed_id = ?"
+            params.append(feed_id)
+        cur = con.execute(sql + " ORDER BY e.id DESC LIMIT ?", (*params, _DRY_RUN_SCAN))
+
+    hits: list[Hit] = []
+    examined = 0
+    for r in cur:
+        examined += 1
+        if m.find(int(r["feed_id"]), r["summary"] or "", r["title"]):
+            hits.append(_hit(r))
+            if len(hits) >= limit:
+                break
+    return DryRun(hits=hits, examined=examined, indexed=indexed, elapsed=time.perf_counter() - started)
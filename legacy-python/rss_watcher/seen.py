@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Iterable
+
+from . import db
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8", errors="ignore"), digest_size=8).digest(), "big")
+
+
+class SeenIndex:
+    """
+    Per-feed LRU of hashed entry keys that are already stored in `entries`.
+
+    A hit means "already seen" and the entry is dropped without touching SQLite; a miss only
+    means "possibly new" and is confirmed against the database. Keys are 64-bit hashes, so a
+    false "seen" needs a hash collision (about n / 2**64 per lookup). A Bloom filter would be
+    smaller, but its false positives would silently swallow new items, i.e. missed alerts.
+    """
+
+    def __init__(self, per_feed: int = 1024) -> None:
+        self.per_feed = per_feed
+        self._feeds: dict[int, OrderedDict[int, None]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.misses_known = 0
+
+    def warm(self, con: sqlite3.Connection, feed_ids: Iterable[int] | None = None) -> None:
+        if feed_ids is None:
+            feed_ids = [int(r[0]) for r in con.execute("SELECT id FROM feeds WHERE enabled = 1")]
+        for fid in feed_ids:
+            if fid in self._feeds:
+                continue
+            rows = con.execute(
+                "SELECT entry_key FROM entries WHERE feed_id = ? ORDER BY seen_at DESC, id DESC LIMIT ?",
+                (fid, self.per_feed),
+            ).fetchall()
+            # Oldest first, so the newest keys end up most-recently-used.
+            lru: OrderedDict[int, None] = OrderedDict((_hash(str(r[0])), None) for r in reversed(rows))
+            with self._lock:
+                self._feeds.setdefault(fid, lru)
+
+    def filter_new(self, con: sqlite3.Connection, feed_id: int, keys: Iterable[str]) -> list[str]:
+        """Return the keys that are not known to be seen (order preserved)."""
+        self.warm(con, [feed_id])
+        out: list[str] = []
+        with self._lock:
+            lru = self._feeds[feed_id]
+            for k in keys:
+                h = _hash(k)
+                if h in lru:
+                    lru.move_to_end(h)
+                    self.hits += 1
+                else:
+                    self.misses += 1
+                    out.append(k)
+        return out
+
+    def contains(self, feed_id: int, key: str) -> bool:
+        """Membership only: no LRU bump and no hit/miss accounting (filter_new does that later)."""
+        lru = self._feeds.get(feed_id)
+        return lru is not None and _hash(key) in lru
+
+    def add(self, feed_id: int, keys: Iterable[str], *, known: bool = False) -> None:
+        """Record keys as seen; `known=True` marks index misses the database already had."""
+        with self._lock:
+            lru = self._feeds.setdefault(feed_id, OrderedDict())
+            for k in keys:
+                if known:
+                    self.misses_known += 1
+                h = _hash(k)
+                lru[h] = None
+                lru.move_to_end(h)
+            while len(lru) > self.per_feed:
+                lru.popitem(last=False)
+
+    def forget(self, feed_id: int) -> None:
+        with self._lock:
+            self._feeds.pop(feed_id, None)
+
+    def memory_bytes(self) -> int:
+        with self._lock:
+            keys = sum(len(lru) for lru in self._feeds.values())
+            containers = sum(sys.getsizeof(lru) for lru in self._feeds.values())
+        return sys.getsizeof(self._feeds) + containers + keys * sys.getsizeof(2**62)
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            feeds = len(self._feeds)
+            keys = sum(len(lru) for lru in self._feeds.values())
+        lookups = self.hits + self.misses
+        return {
+            "feeds": feeds,
+            "keys": keys,
+            "per_feed_capacity": self.per_feed,
+            "memory_bytes": self.memory_bytes(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else None,
+            # Misses that turned out to be in SQLite already (evicted or never warmed).
+            "misses_known": self.misses_known,
+            "false_positive_rate": keys / 2**64,
+        }
+
+
+_indexes: dict[str, SeenIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def index() -> SeenIndex:
+    path = db.db_path()
+    idx = _indexes.get(path)
+    if idx is None:
+        with _indexes_lock:
+            idx = _indexes.setdefault(path, SeenIndex())
+    return idx
+
+
+def reset() -> None:
+    with _indexes_lock:
+        _indexes.clear()
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import math
+import sqlite3
+import time
+from typing import Any
+
+from . import db, lease, metrics, seen
+
+
+# Sharded polling: any number of worker processes, on one host or several sharing the
+# database, split the enabled feeds between them. Each worker keeps a membership lease
+# ("shard:<holder>") alive and, on every heartbeat, evens out its feed leases against the
+# number of live members: it releases feeds beyond its fair share and claims free or
+# expired ones up to it. A worker that dies stops renewing, so after one ttl its feeds
+# lapse and the survivors (whose share just grew) pick them up.
+
+MEMBER_PREFIX = "shard:"
+
+
+class Shard:
+    """This worker's membership and the feeds it currently owns."""
+
+    def __init__(self, holder: str | None = None, ttl: float = 30.0) -> None:
+        self.holder = holder or lease.process_id()
+        self.ttl = ttl
+        self.member = lease.Lease(MEMBER_PREFIX + self.holder, self.holder, ttl)
+        self.started = time.time()
+        self.owned: frozenset[int] = frozenset()
+        # Bumped whenever `owned` changes, so the poll loop can re-sync without waiting.
+        self.version = 0
+
+    def heartbeat(self, con: sqlite3.Connection) -> frozenset[int]:
+        """Renew membership and feed leases, rebalance, and publish this shard's counters."""
+        now = time.time()
+        expires = now + self.ttl
+        self.member.renew(con)
+        with db.transaction(con):
+            members = con.execute(
+                "SELECT COUNT(*) FROM leases WHERE name LIKE ? || '%' AND expires_at >= ?",
+                (MEMBER_PREFIX, now),
+            ).fetchone()[0]
+            enabled = con.execute("SELECT COUNT(*) FROM feeds WHERE enabled = 1").fetchone()[0]
+            share = math.ceil(enabled / max(1, members))
+
+            # Feeds that were disabled since we claimed them are not ours to poll any more.
+            con.execute(
+                """
+                DELETE FROM feed_leases
+                WHERE holder = ? AND feed_id IN (SELECT id FROM feeds WHERE enabled = 0)
+                """,
+                (self.holder,),
+            )
+            con.execute("UPDATE feed_leases SET expires_at = ? WHERE holder = ?", (expires, self.holder))
+            mine = [
+                int(r[0])
+                for r in con.execute("SELECT feed_id FROM feed_leases WHERE holder = ? ORDER BY feed_id", (self.holder,))
+            ]
+            if len(mine) > share:
+                # Always the highest ids, so repeated rebalancing doesn't shuffle the rest around.
+                extra = mine[share:]
+                con.executemany(
+                    "DELETE FROM feed_leases WHERE feed_id = ? AND holder = ?",
+                    [(fid, self.holder) for fid in extra],
+                )
+                mine = mine[:share]
+            elif len(mine) < share:
+                rows = con.execute(
+                    """
+                    SELECT f.id FROM feeds f
+                    LEFT JOIN feed_leases l ON l.feed_id = f.id
+                    WHERE f.enabled = 1 AND (l.feed_id IS NULL OR l.expires_at < ?)
+                    ORDER BY f.id
+                    LIMIT ?
+                    """,
+                    (now, share - len(mine)),
+                ).fetchall()
+                for fid in (int(r[0]) for r in rows):
+                    got = con.execute(
+                        """
+                        INSERT INTO feed_leases(feed_id, holder, expires_at) VALUES(?, ?, ?)
+                        ON CONFLICT(feed_id) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at
+                        WHERE feed_leases.expires_at < ?
+                        RETURNING feed_id
+                        """,
+                        (fid, self.holder, expires, now),
+                    ).fetchone()
+                    if got is not None:
+                        mine.append(fid)
+            self._publish(con, now, len(mine))
+
+        owned = frozenset(mine)
+        if owned != self.owned:
+            for fid in self.owned - owned:
+                # Another worker polls it now; drop our copy of its seen keys.
+                seen.index().forget(fid)
+            self.owned = owned
+            self.version += 1
+        return owned
+
+    def _publish(self, con: sqlite3.Connection, now: float, owned: int) -> None:
+        reg = metrics.registry()
+        snap = reg.snapshot()
+        con.execute(
+            """
+            INSERT INTO shard_stats(
+              holder, started_at, heartbeat_at, feeds_owned, polls, feeds_polled,
+              entries_seen, entries_new, alerts, poll_seconds
+            ) VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(holder) DO UPDATE SET
+              heartbeat_at = excluded.heartbeat_at,
+              feeds_owned = excluded.feeds_owned,
+              polls = excluded.polls,
+              feeds_polled = excluded.feeds_polled,
+              entries_seen = excluded.entries_seen,
+              entries_new = excluded.entries_new,
+              alerts = excluded.alerts,
+              poll_seconds = excluded.poll_seconds
+            """,
+            (
+                self.holder,
+                self.started,
+                now,
+                owned,
+                snap["polls"],
+                snap["feeds_polled"],
+                snap["entries_seen"],
+                snap["entries_new"],
+                snap["alerts"],
+                reg.poll.sum,
+            ),
+        )
+        # Rows of workers gone for a while (ten heartbeats' worth of ttl) are of no more use.
+        con.execute("DELETE FROM shard_stats WHERE heartbeat_at < ?", (now - 10 * self.ttl,))
+
+    def leave(self, con: sqlite3.Connection) -> None:
+        """Give everything back at once so the others need not wait for expiry."""
+        with db.transaction(con):
+            con.execute("DELETE FROM feed_leases WHERE holder = ?", (self.holder,))
+            con.execute("DELETE FROM shard_stats WHERE holder = ?", (self.holder,))
+            self.member.release(con)
+        self.owned = frozenset()
+        self.version += 1
+
+
+def report(con: sqlite3.Connection) -> list[dict[str, Any]]:
+    """Live shards with their feed count and throughput since each worker started."""
+    now = time.time()
+    rows = con.execute(
+        """
+        SELECT s.* FROM shard_stats s
+        JOIN leases l ON l.name = ? || s.holder
+        WHERE l.expires_at >= ?
+        ORDER BY s.started_at
+        """,
+        (MEMBER_PREFIX, now),
+    ).fetchall()
+    out = []
+    for r in rows:
+        up = max(1.0, float(r["heartbeat_at"]) - float(r["started_at"]))
+        busy = float(r["poll_seconds"])
+        out.append(
+            {
+                "holder": r["holder"],
+                "feeds": int(r["feeds_owned"]),
+                "uptime_seconds": int(up),
+                "heartbeat_age": round(now - float(r["heartbeat_at"]), 1),
+                "polls": int(r["polls"]),
+                "feeds_polled": int(r["feeds_polled"]),
+                "alerts": int(r["alerts"]),
+                "feeds_per_minute": round(60 * int(r["feeds_polled"]) / up, 1),
+                "entries_per_second": round(int(r["entries_seen"]) / up, 2),
+                # Feeds handled per second of poll wall time: what this shard does when busy.
+                "busy_feeds_per_second": round(int(r["feeds_polled"]) / busy, 1) if busy else None,
+                "busy_pct": round(100 * busy / up, 1),
+            }
+        )
+    return out
+
@@ -2,128 +2,486 @@ from __future__ import annotations
 
 import asyncio
 import hashlib
-import re
 import sqlite3
+import time
 import traceback
+import xml.etree.ElementTree as ET
 from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Iterable
+from typing import AsyncIterator, Callable, Iterable, Sequence
+from urllib.parse import urlsplit
 
-import feedparser
 import httpx
 
-from . import db
-from .notifier import PushoverConfig, SmtpConfig, env_pushover, env_smtp, send_email, send_pushover
+from . import db, events, ingest, metrics, outbox, profiling, readcache, ruleindex, scheduler, seen
+from .httppool import HttpPool
+from .parse import ParsedFeed, ParsePool, StreamParser, UnsupportedFeed
+from .matcher import RuleMatcher
+from .notifier import load_config
+from .shards import Shard
 
 
 def _now_utc_iso() -> str:
     return datetime.now(timezone.utc).replace(microsecond=0).isoformat()
 
 
-def _entry_key(entry: dict) -> str:
-    # Prefer stable IDs; fall back to link or hashed title+published.
-    for k in ("id", "guid", "link"):
-        v = (entry.get(k) or "").strip()
-        if v:
-            return v
-    raw = f"{entry.get('title','')}|{entry.get('published','')}|{entry.get('updated','')}"
-    return hashlib.sha256(raw.encode("utf-8", errors="ignore")).hexdigest()
+@dataclass(frozen=True)
+class Validators:
+    etag: str | None = None
+    last_modified: str | None = None
+    content_hash: str | None = None
 
 
-def _entry_text(entry: dict) -> str:
-    parts: list[str] = []
-    for k in ("title", "summary", "description"):
-        v = entry.get(k)
-        if isinstance(v, str) and v.strip():
-            parts.append(v)
-    content = entry.get("content")
-    if isinstance(content, list):
-        for c in content:
-            v = (c or {}).get("value")
-            if isinstance(v, str) and v.strip():
-                parts.append(v)
-    return "\n".join(parts)
+@dataclass(frozen=True)
+class FetchResponse:
+    status: int
+    content: bytes
+    etag: str | None = None
+    last_modified: str | None = None
+    max_age: int | None = None
+    # Set instead of `content` when a large body was parsed while it streamed in.
+    parsed: ParsedFeed | None = None
+    # Body bytes read, which for a streamed parse that stopped early is less than the document.
+    nbytes: int = 0
+
+    @property
+    def not_modified(self) -> bool:
+        return self.status == 304
 
 
 @dataclass(frozen=True)
-class Match:
-    rule_id: int
-    keyword: str
-    created_at: str
+class StreamLimits:
+    """When and how far to parse a body incrementally instead of buffering it (sizes in bytes)."""
+
+    min_bytes: int
+    max_bytes: int
+    stop_after_seen: int
+
+    @classmethod
+    def from_settings(cls, con: sqlite3.Connection) -> "StreamLimits | None":
+        min_kib = db.kv_int(con, "stream_min_kib", 256, minimum=0)
+        if not min_kib:
+            return None
+        return cls(
+            min_bytes=min_kib * 1024,
+            max_bytes=db.kv_int(con, "stream_max_kib", 4096, minimum=min_kib) * 1024,
+            stop_after_seen=db.kv_int(con, "stream_stop_after_seen", 10),
+        )
 
 
-def _load_rules(con: sqlite3.Connection) -> list[sqlite3.Row]:
-    return con.execute(
-        "SELECT id, keyword, feed_id, created_at FROM rules WHERE enabled = 1 ORDER BY id ASC"
-    ).fetchall()
+async def _fetch_feed(
+    url: str,
+    client: httpx.AsyncClient,
+    validators: Validators | None = None,
+    *,
+    stream: StreamLimits | None = None,
+    is_seen: Callable[[str], bool] | None = None,
+) -> FetchResponse:
+    headers: dict[str, str] = {}
+    if validators and validators.etag:
+        headers["If-None-Match"] = validators.etag
+    if validators and validators.last_modified:
+        headers["If-Modified-Since"] = validators.last_modified
+    if stream is None:
+        r = await client.get(url, headers=headers, follow_redirects=True)
+        max_age = scheduler.parse_max_age(r.headers.get("Cache-Control"))
+        if r.status_code == 304:
+            return FetchResponse(status=304, content=b"", max_age=max_age)
+        r.raise_for_status()
+        return FetchResponse(
+            status=r.status_code,
+            content=r.content,
+            etag=r.headers.get("ETag"),
+            last_modified=r.headers.get("Last-Modified"),
+            max_age=max_age,
+            nbytes=len(r.content),
+        )
 
+    async with client.stream("GET", url, headers=headers, follow_redirects=True) as r:
+        max_age = scheduler.parse_max_age(r.headers.get("Cache-Control"))
+        if r.status_code == 304:
+            return FetchResponse(status=304, content=b"", max_age=max_age)
+        if r.is_error:
+            await r.aread()
+        r.raise_for_status()
+        meta = dict(
+            status=r.status_code,
+            etag=r.headers.get("ETag"),
+            last_modified=r.headers.get("Last-Modified"),
+            max_age=max_age,
+        )
 
-def _normalize_keyword(s: str) -> str:
-    return re.sub(r"\s+", " ", s.strip())
+        # Small bodies take the normal path (feedparser, unchanged-body hash).
+        buf = bytearray()
+        chunks = r.aiter_bytes()
+        async for chunk in chunks:
+            buf += chunk
+            if len(buf) > stream.min_bytes:
+                break
+        else:
+            return FetchResponse(content=bytes(buf), nbytes=len(buf), **meta)
+
+        # Large body: parse as it arrives and stop once we are into entries we already have
+        # (feeds list newest first) or hit the byte cap. The raw bytes (at most the cap) are
+        # kept in case the document turns out not to be streamable part way through.
+        sp = StreamParser(url)
+        rows: list[ingest.EntryRow] = []
+        pending = buf
+        data: bytes | None = bytes(buf)
+        read = len(buf)
+        known_run = 0
+        complete = True
+        # Set when we stop on the byte cap rather than on entries we already have.
+        truncated = False
+        while data is not None:
+            try:
+                new_rows = sp.feed(data)
+            except (ET.ParseError, UnsupportedFeed):
+                # Read the rest and let feedparser have all of it: stopping here would leave
+                # everything after the bad markup unread for good.
+                async for chunk in chunks:
+                    pending += chunk
+                return FetchResponse(content=bytes(pending), nbytes=len(pending), **meta)
+            for row in new_rows:
+                rows.append(row)
+                known_run = known_run + 1 if is_seen is not None and is_seen(row.key) else 0
+            if known_run >= stream.stop_after_seen or read >= stream.max_bytes:
+                complete = False
+                truncated = known_run < stream.stop_after_seen
+                break
+            data = await anext(chunks, None)
+            if data is not None:
+                read += len(data)
+                pending += data
+    if truncated:
+        # Don't let the next poll be answered with a 304 for a document we only read part of.
+        meta.update(etag=None, last_modified=None)
+    return FetchResponse(
+        content=b"", parsed=ParsedFeed(rows=rows, ttl=sp.ttl, complete=complete), nbytes=read, **meta
+    )
 
 
-def _find_matches(feed_id: int, text: str, rules: Iterable[sqlite3.Row]) -> list[Match]:
-    hay = text.lower()
-    out: list[Match] = []
-    for r in rules:
-        kw = _normalize_keyword(r["keyword"])
-        if not kw:
-            continue
-        if r["feed_id"] is not None and int(r["feed_id"]) != int(feed_id):
-            continue
-        if kw.lower() in hay:
-            out.append(Match(rule_id=int(r["id"]), keyword=kw, created_at=str(r["created_at"])))
-    return out
+@dataclass(frozen=True)
+class FetchResult:
+    feed: sqlite3.Row
+    response: FetchResponse | None
+    error: str | None
+    elapsed: float
+    retry_after: int | None = None
+    parse_elapsed: float = 0.0
+    # Set for a 200 response: the body's hash, and either `unchanged` or the parse result.
+    content_hash: str | None = None
+    unchanged: bool = False
+    parsed: ParsedFeed | None = None
+
+
+@dataclass
+class PollStats:
+    cache_not_modified: int = 0
+    cache_unchanged: int = 0
+    cache_misses: int = 0
+    streamed: int = 0
+    stream_stopped: int = 0
+
+    @property
+    def cache_hits(self) -> int:
+        return self.cache_not_modified + self.cache_unchanged
+
+
+def _load_validators(con: sqlite3.Connection) -> dict[int, tuple[str, Validators]]:
+    rows = con.execute("SELECT feed_id, url, etag, last_modified, content_hash FROM feed_http_cache").fetchall()
+    return {
+        int(r["feed_id"]): (
+            str(r["url"]),
+            Validators(etag=r["etag"], last_modified=r["last_modified"], content_hash=r["content_hash"]),
+        )
+        for r in rows
+    }
 
 
-async def _fetch_feed(url: str) -> bytes:
-    async with httpx.AsyncClient(timeout=20, follow_redirects=True) as client:
-        r = await client.get(url, headers={"User-Agent": "rss-watcher/1.0"})
-        r.raise_for_status()
-        return r.content
+def _save_validators(
+    con: sqlite3.Connection, feed_id: int, url: str, resp: FetchResponse, content_hash: str | None
+) -> None:
+    if resp.not_modified:
+        con.execute(
+            "UPDATE feed_http_cache SET last_status = 304, checked_at = datetime('now') WHERE feed_id = ?",
+            (feed_id,),
+        )
+        return
+    con.execute(
+        """
+        INSERT INTO feed_http_cache(feed_id, url, etag, last_modified, content_hash, last_status, checked_at)
+        VALUES(?, ?, ?, ?, ?, ?, datetime('now'))
+        ON CONFLICT(feed_id) DO UPDATE SET
+          url = excluded.url,
+          etag = excluded.etag,
+          last_modified = excluded.last_modified,
+          content_hash = excluded.content_hash,
+          last_status = excluded.last_status,
+          checked_at = excluded.checked_at
+        """,
+        (feed_id, url, resp.etag, resp.last_modified, content_hash, resp.status),
+    )
+
+
+async def _fetch_all(
+    feeds: Iterable[sqlite3.Row],
+    client: httpx.AsyncClient,
+    validators: dict[int, tuple[str, Validators]],
+    *,
+    concurrency: int,
+    per_host: int,
+    parser: ParsePool,
+    stream: StreamLimits | None = None,
+) -> AsyncIterator[FetchResult]:
+    """
+    Fetch and parse feeds concurrently, yielding results in completion order.
+
+    `concurrency` caps in-flight requests overall; `per_host` caps them per hostname
+    so one slow or rate-limited site can't occupy every slot. Parsing happens after the
+    slots are released, so several feeds can parse in `parser` while others download.
+    Bodies larger than `stream.min_bytes` are parsed while they download instead, unless
+    the feed is marked for full parsing.
+    """
+    global_sem = asyncio.Semaphore(concurrency)
+    host_sems: dict[str, asyncio.Semaphore] = {}
+
+    async def fetch_one(f: sqlite3.Row) -> FetchResult:
+        url = str(f["url"])
+        cached_url, cached = validators.get(int(f["id"]), (None, None))
+        # Validators belong to a URL; if the feed was re-pointed, fetch unconditionally.
+        v = cached if cached_url == url else None
+        host = (urlsplit(url).hostname or "").lower()
+        host_sem = host_sems.setdefault(host, asyncio.Semaphore(per_host))
+        if stream is not None and not int(f["full_parse"] or 0):
+            feed_id = int(f["id"])
+            known = seen.index()
+            kwargs = {"stream": stream, "is_seen": lambda key: known.contains(feed_id, key)}
+        else:
+            kwargs = {}
+        # Take the host slot first so feeds queued behind a busy host don't hold global slots.
+        async with host_sem, global_sem:
+            t0 = time.perf_counter()
+            try:
+                resp = await _fetch_feed(url, client, v, **kwargs)
+            except Exception as e:
+                retry_after = None
+                if isinstance(e, httpx.HTTPStatusError):
+                    retry_after = scheduler.parse_retry_after(e.response.headers.get("Retry-After"))
+                return FetchResult(
+                    feed=f,
+                    response=None,
+                    error=traceback.format_exc(limit=10),
+                    elapsed=time.perf_counter() - t0,
+                    retry_after=retry_after,
+                )
+            elapsed = time.perf_counter() - t0
+
+        if resp.not_modified:
+            return FetchResult(feed=f, response=resp, error=None, elapsed=elapsed)
+        if resp.parsed is not None:
+            return FetchResult(feed=f, response=resp, error=None, elapsed=elapsed, parsed=resp.parsed)
+        # Servers without validators (or that ignore them) still often return identical bytes;
+        # skip parsing entirely when the body matches what we processed last time.
+        content_hash = hashlib.sha256(resp.content).hexdigest()
+        if v is not None and v.content_hash == content_hash:
+            return FetchResult(
+                feed=f, response=resp, error=None, elapsed=elapsed, content_hash=content_hash, unchanged=True
+            )
+        t0 = time.perf_counter()
+        try:
+            parsed = await parser.parse(resp.content, url)
+        except Exception:
+            return FetchResult(
+                feed=f,
+                response=resp,
+                error=traceback.format_exc(limit=10),
+                elapsed=elapsed,
+                content_hash=content_hash,
+                parse_elapsed=time.perf_counter() - t0,
+            )
+        return FetchResult(
+            feed=f,
+            response=resp,
+            error=None,
+            elapsed=elapsed,
+            content_hash=content_hash,
+            parsed=parsed,
+            parse_elapsed=time.perf_counter() - t0,
+        )
+
+    tasks = [asyncio.create_task(fetch_one(f)) for f in feeds]
+    try:
+        for fut in asyncio.as_completed(tasks):
+            yield await fut
+    finally:
+        for t in tasks:
+            t.cancel()
+
+
+async def _process_feed(
+    fetched: FetchResult,
+    matcher: RuleMatcher,
+    channels: Sequence[str],
+    stats: PollStats,
+    sw: metrics.Stopwatch,
+) -> tuple[int, scheduler.Outcome]:
+    """Handle one fetched feed; returns (alerts created, scheduling outcome). Stages are timed on `sw`."""
+    f = fetched.feed
+    feed_id = int(f["id"])
+    url = str(f["url"])
+    name = str(f["name"])
+    armed = int(f["armed"] or 0)
+    resp = fetched.response
+    parsed = fetched.parsed
+    content_hash = fetched.content_hash
+    sw.add("fetch", fetched.elapsed)
+    if fetched.parse_elapsed:
+        sw.add("parse", fetched.parse_elapsed)
+    sw.reset()
+    if resp is not None:
+        unchanged = scheduler.Outcome(min_interval=resp.max_age)
+        if resp.not_modified:
+            stats.cache_not_modified += 1
+            with db.writer() as con:
+                _save_validators(con, feed_id, url, resp, None)
+            sw.lap("persist")
+            return 0, unchanged
+        if fetched.unchanged:
+            stats.cache_unchanged += 1
+            with db.writer() as con:
+                _save_validators(con, feed_id, url, resp, content_hash)
+            sw.lap("persist")
+            return 0, unchanged
+        stats.cache_misses += 1
+        if resp.parsed is not None:
+            stats.streamed += 1
+            stats.stream_stopped += 0 if resp.parsed.complete else 1
+    if parsed is None:
+        with db.writer() as con:
+            db.log_write(
+                con,
+                level="error",
+                area="feed",
+                message=f"feed fetch/parse failed: {name}",
+                feed_id=feed_id,
+                error=fetched.error,
+            )
+        sw.lap("persist")
+        return 0, scheduler.Outcome(failed=True, retry_after=fetched.retry_after)
+
+    hints = [h for h in (resp.max_age, scheduler.parse_ttl_minutes(parsed.ttl)) if h]
+    min_interval = max(hints) if hints else None
+
+    rows = parsed.rows
 
+    # Baseline pass for newly-added feeds: store the current set of items as "seen",
+    # but do not alert. Next poll will alert only for newly-discovered items.
+    if armed == 0:
+        with db.writer() as con:
+            ingest.baseline(con, feed_id, rows, seen.index())
+            _save_validators(con, feed_id, url, resp, content_hash)
+            db.log_write(
+                con,
+                level="info",
+                area="feed",
+                message=f"feed baselined (no alerts): {name}",
+                feed_id=feed_id,
+            )
+        sw.lap("persist")
+        return 0, scheduler.Outcome(min_interval=min_interval)
+
+    with db.writer() as con:
+        result = ingest.ingest(
+            con, feed_id, rows, matcher, seen.index(), feed_name=name, channels=channels, timer=sw
+        )
+    sw.lap("persist")
+    if result.alerts:
+        outbox.wake()
+    for a in result.alerts:
+        events.publish(
+            events.ALERT, feed_id=feed_id, feed_name=name, rule_id=a.rule_id, keyword=a.keyword, title=a.title, link=a.link
+        )
+    sw.lap("notify")
+
+    # Only remember validators once every entry has been handled, so a failure mid-feed
+    # means the next poll re-fetches and re-processes it.
+    with db.writer() as con:
+        _save_validators(con, feed_id, url, resp, content_hash)
+    sw.lap("persist")
+    return len(result.alerts), scheduler.Outcome(new_entries=result.new_entries, min_interval=min_interval)
+
+
+async def poll_once(
+    http: HttpPool | None = None, feed_ids: Sequence[int] | None = None, parser: ParsePool | None = None
+) -> int:
+    """
+    Fetch and process enabled feeds once; returns the number of alerts created.
+
+    `feed_ids` restricts the poll to those feeds (the scheduler passes the ones that are due);
+    by default every enabled feed is polled. Without a `parser`, feeds are parsed inline.
+    """
+    if http is None:
+        # Standalone call (tests, one-off runs): use a throwaway pool.
+        http = HttpPool()
+        try:
+            return await poll_once(http, feed_ids, parser)
+        finally:
+            await http.aclose()
+    if parser is None:
+        parser = ParsePool(workers=0)
 
-async def poll_once() -> int:
     db.migrate()
 
-    push_cfg: PushoverConfig | None = None
-    smtp_cfg: SmtpConfig | None = None
+    with db.writer() as con:
+        profile = profiling.take_request(con)
+    if not profile:
+        return await _poll(http, feed_ids, parser)
+    with profiling.sampling() as prof:
+        created = await _poll(http, feed_ids, parser)
+    with db.writer() as con:
+        profile_id = profiling.save(con, prof)
+        db.log_write(
+            con,
+            level="info",
+            area="profile",
+            message=f"poll profiled: {prof.samples} samples over {prof.elapsed:.2f}s, see /logs/profiles/{profile_id}",
+        )
+    return created
+
 
-    with db.connect() as con:
-        db.log_write(con, level="info", area="poll", message="poll started")
+def _flush_logs(con: sqlite3.Connection) -> None:
+    # Logging must never fail a poll; rows that couldn't be written stay queued for the flusher.
+    try:
+        db.manager().logs.flush(con)
+    except sqlite3.Error:
+        pass
 
-    with db.connect() as con:
-        # Environment overrides (preferred for secrets).
-        push_cfg = env_pushover()
-        smtp_cfg = env_smtp()
-
-        if not push_cfg:
-            t = db.kv_get(con, "pushover_app_token", "") or ""
-            u = db.kv_get(con, "pushover_user_key", "") or ""
-            if t.strip() and u.strip():
-                push_cfg = PushoverConfig(app_token=t.strip(), user_key=u.strip())
-
-        if not smtp_cfg:
-            host = (db.kv_get(con, "smtp_host", "") or "").strip()
-            port_s = (db.kv_get(con, "smtp_port", "") or "").strip()
-            mail_from = (db.kv_get(con, "smtp_from", "") or "").strip()
-            mail_to = (db.kv_get(con, "smtp_to", "") or "").strip()
-            user = (db.kv_get(con, "smtp_user", "") or "").strip()
-            password = (db.kv_get(con, "smtp_pass", "") or "").strip()
-            try:
-                port = int(port_s) if port_s else 0
-            except ValueError:
-                port = 0
-            if host and port and mail_from and mail_to:
-                smtp_cfg = SmtpConfig(
-                    host=host, port=port, user=user, password=password, mail_from=mail_from, mail_to=mail_to
-                )
 
-        feeds = con.execute("SELECT id, name, url, armed FROM feeds WHERE enabled = 1 ORDER BY id ASC").fetchall()
-        rules = _load_rules(con)
+async def _poll(http: HttpPool, feed_ids: Sequence[int] | None, parser: ParsePool) -> int:
+    with db.writer() as con:
+        db.log_write(con, level="info", area="poll", message="poll started")
 
-    if not feeds or not rules:
-        with db.connect() as con:
+    with db.writer() as con:
+        push_cfg, smtp_cfg = load_config(con)
+        channels = [c for c, cfg in ((outbox.PUSHOVER, push_cfg), (outbox.EMAIL, smtp_cfg)) if cfg]
+        feeds = con.execute("SELECT id, name, url, armed, full_parse FROM feeds WHERE enabled = 1 ORDER BY id ASC").fetchall()
+        if feed_ids is not None:
+            wanted = set(feed_ids)
+            feeds = [f for f in feeds if int(f["id"]) in wanted]
+        matcher = ruleindex.matcher(con)
+        limits = scheduler.Limits.from_settings(con)
+        concurrency = db.kv_int(con, "fetch_concurrency", 16)
+        per_host = db.kv_int(con, "fetch_per_host", 4)
+        stream = StreamLimits.from_settings(con)
+        validators = _load_validators(con)
+        if stream is not None:
+            # Streaming stops on runs of known keys, so the index must be loaded first.
+            seen.index().warm(con, [int(f["id"]) for f in feeds])
+
+    if not feeds or not len(matcher):
+        with db.writer() as con:
+            scheduler.defer(con, [int(f["id"]) for f in feeds], limits.base)
             db.kv_set(con, "last_poll_at", _now_utc_iso())
             db.log_write(
                 con,
@@ -131,194 +489,149 @@ async def poll_once() -> int:
                 area="poll",
                 message="poll finished (no enabled feeds or no enabled rules)",
             )
+            _flush_logs(con)
+        readcache.invalidate(readcache.POLL)
+        events.publish(events.POLL, phase="finished", feeds=len(feeds), alerts=0)
         return 0
 
     created_alerts = 0
-    for f in feeds:
-        feed_id = int(f["id"])
-        url = str(f["url"])
-        name = str(f["name"])
-        armed = int(f["armed"] or 0)
-        try:
-            content = await _fetch_feed(url)
-            parsed = feedparser.parse(content)
-        except Exception:
-            with db.connect() as con:
-                db.log_write(
-                    con,
-                    level="error",
-                    area="feed",
-                    message=f"feed fetch/parse failed: {name}",
-                    feed_id=feed_id,
-                    error=traceback.format_exc(limit=10),
-                )
-            continue
-
-        # Baseline pass for newly-added feeds: store the current set of items as "seen",
-        # but do not alert. Next poll will alert only for newly-discovered items.
-        if armed == 0:
-            with db.connect() as con:
-                for e in parsed.entries or []:
-                    ek = _entry_key(e)
-                    link = (e.get("link") or "").strip() or url
-                    title = (e.get("title") or "").strip() or "(untitled)"
-                    published = (e.get("published") or e.get("updated") or "").strip() or None
-                    summary = (e.get("summary") or e.get("description") or "").strip() or None
-                    con.execute(
-                        "INSERT OR IGNORE INTO entries(feed_id, entry_key, link, title, published, summary) VALUES(?, ?, ?, ?, ?, ?)",
-                        (feed_id, ek, link, title, published, summary),
-                    )
-                con.execute("UPDATE feeds SET armed = 1 WHERE id = ?", (feed_id,))
-                db.log_write(
-                    con,
-                    level="info",
-                    area="feed",
-                    message=f"feed baselined (no alerts): {name}",
-                    feed_id=feed_id,
-                )
-            continue
+    fetch_sum = 0.0
+    stats = PollStats()
+    t0 = time.perf_counter()
+    done = 0
+    registry = metrics.registry()
+    poll_stages = metrics.Stopwatch()
+    events.publish(events.POLL, phase="started", feeds=len(feeds))
+    async for fetched in _fetch_all(
+        feeds, http.client, validators, concurrency=concurrency, per_host=per_host, parser=parser, stream=stream
+    ):
+        fetch_sum += fetched.elapsed
+        sw = metrics.Stopwatch()
+        alerts, outcome = await _process_feed(fetched, matcher, channels, stats, sw)
+        created_alerts += alerts
+        with db.writer() as con:
+            scheduler.record(con, int(fetched.feed["id"]), outcome, limits)
+        sw.lap("persist")
+        registry.record_feed(
+            int(fetched.feed["id"]),
+            str(fetched.feed["name"]),
+            sw,
+            nbytes=fetched.response.nbytes if fetched.response is not None else 0,
+            seen=len(fetched.parsed.rows) if fetched.parsed is not None else 0,
+            new=outcome.new_entries,
+            alerts=alerts,
+            failed=outcome.failed,
+        )
+        for stage, seconds in sw.seconds.items():
+            poll_stages.add(stage, seconds)
+        if alerts:
+            # Committed by _process_feed; let the dashboard show them before the poll ends.
+            readcache.invalidate(readcache.ALERTS)
+        done += 1
+        events.publish(
+            events.PROGRESS,
+            done=done,
+            total=len(feeds),
+            feed_id=int(fetched.feed["id"]),
+            failed=outcome.failed,
+            new_entries=outcome.new_entries,
+            alerts=alerts,
+        )
+    wall = time.perf_counter() - t0
+    registry.record_poll(wall)
 
-        for e in parsed.entries or []:
-            ek = _entry_key(e)
-            link = (e.get("link") or "").strip() or url
-            title = (e.get("title") or "").strip() or "(untitled)"
-            published = (e.get("published") or e.get("updated") or "").strip() or None
-            summary = (e.get("summary") or e.get("description") or "").strip() or None
-            with db.connect() as con:
-                row = con.execute(
-                    "SELECT id, seen_at FROM entries WHERE feed_id = ? AND entry_key = ?",
-                    (feed_id, ek),
-                ).fetchone()
-                if row:
-                    # Only alert on newly-discovered entries. Existing entries are part
-                    # of history/baseline and should not produce new alerts later.
-                    continue
-                else:
-                    con.execute(
-                        "INSERT OR IGNORE INTO entries(feed_id, entry_key, link, title, published, summary) VALUES(?, ?, ?, ?, ?, ?)",
-                        (feed_id, ek, link, title, published, summary),
-                    )
-                    row2 = con.execute(
-                        "SELECT id, seen_at FROM entries WHERE feed_id = ? AND entry_key = ?",
-                        (feed_id, ek),
-                    ).fetchone()
-                    if not row2:
-                        continue
-                    entry_id = int(row2["id"])
-                    entry_seen_at = str(row2["seen_at"])
-
-                text = _entry_text(e)
-                matches = _find_matches(feed_id, text, rules)
-                if not matches:
-                    continue
-
-                for m in matches:
-                    # Apply rules going forward: if this entry was first seen before the rule existed,
-                    # skip alerting (prevents "backfilling" when you add a new rule).
-                    if entry_seen_at < m.created_at:
-                        continue
-                    try:
-                        con.execute(
-                            "INSERT INTO alerts(entry_id, rule_id, keyword) VALUES(?, ?, ?)",
-                            (entry_id, m.rule_id, m.keyword),
-                        )
-                    except sqlite3.IntegrityError:
-                        continue
-
-                    created_alerts += 1
-                    subj = f"RSS Watcher: '{m.keyword}' in {name}"
-                    msg = f"{title}\n\nFeed: {name}\nKeyword: {m.keyword}\nLink: {link}\n"
-                    db.log_write(
-                        con,
-                        level="info",
-                        area="match",
-                        message=f"keyword match: {m.keyword}",
-                        feed_id=feed_id,
-                        rule_id=m.rule_id,
-                        entry_link=link,
-                    )
-
-                    if push_cfg:
-                        try:
-                            await send_pushover(push_cfg, subj, title, link)
-                            with db.connect() as con2:
-                                db.log_write(
-                                    con2,
-                                    level="info",
-                                    area="notify",
-                                    message="pushover sent",
-                                    feed_id=feed_id,
-                                    rule_id=m.rule_id,
-                                    entry_link=link,
-                                )
-                        except Exception:
-                            with db.connect() as con2:
-                                db.log_write(
-                                    con2,
-                                    level="error",
-                                    area="notify",
-                                    message="pushover failed",
-                                    feed_id=feed_id,
-                                    rule_id=m.rule_id,
-                                    entry_link=link,
-                                    error=traceback.format_exc(limit=10),
-                                )
-                    if smtp_cfg:
-                        try:
-                            send_email(smtp_cfg, subj, msg)
-                            with db.connect() as con2:
-                                db.log_write(
-                                    con2,
-                                    level="info",
-                                    area="notify",
-                                    message="email sent",
-                                    feed_id=feed_id,
-                                    rule_id=m.rule_id,
-                                    entry_link=link,
-                                )
-                        except Exception:
-                            with db.connect() as con2:
-                                db.log_write(
-                                    con2,
-                                    level="error",
-                                    area="notify",
-                                    message="email failed",
-                                    feed_id=feed_id,
-                                    rule_id=m.rule_id,
-                                    entry_link=link,
-                                    error=traceback.format_exc(limit=10),
-                                )
-
-    with db.connect() as con:
+    with db.writer() as con:
         db.kv_set(con, "last_poll_at", _now_utc_iso())
         if created_alerts:
             db.kv_set(con, "last_alert_at", _now_utc_iso())
+        db.log_write(
+            con,
+            level="info",
+            area="poll",
+            message=(
+                f"fetch stats: {len(feeds)} feeds, wall {wall:.2f}s, "
+                f"sum of fetches {fetch_sum:.2f}s (concurrency {concurrency}, per host {per_host})"
+                + (f", {stats.streamed} streamed ({stats.stream_stopped} stopped early)" if stats.streamed else "")
+            ),
+        )
+        db.log_write(
+            con,
+            level="info",
+            area="poll",
+            message=(
+                f"http cache: {stats.cache_hits} hits ({stats.cache_not_modified} not modified, "
+                f"{stats.cache_unchanged} unchanged body), {stats.cache_misses} misses"
+            ),
+        )
+        db.log_write(
+            con,
+            level="info",
+            area="poll",
+            message="stage time, summed over feeds: "
+            + ", ".join(f"{s} {poll_stages.seconds.get(s, 0.0):.2f}s" for s in metrics.STAGES),
+        )
         db.log_write(
             con,
             level="info",
             area="poll",
             message=f"poll finished (new alerts: {created_alerts})",
         )
+        # One batched insert for the whole poll's log lines.
+        _flush_logs(con)
+    readcache.invalidate(readcache.POLL)
+    events.publish(events.POLL, phase="finished", feeds=len(feeds), alerts=created_alerts, wall=round(wall, 3))
     return created_alerts
 
 
-async def run_loop(stop_event: asyncio.Event) -> None:
+async def run_loop(
+    stop_event: asyncio.Event,
+    http: HttpPool | None = None,
+    parser: ParsePool | None = None,
+    shard: Shard | None = None,
+) -> None:
+    """Poll feeds as they come due; with a `shard`, only the feeds it currently owns."""
     db.migrate()
-    while not stop_event.is_set():
-        with db.connect() as con:
-            interval_s = db.kv_get(con, "poll_interval_seconds", "300") or "300"
+    if http is None:
+        http = HttpPool.from_settings()
         try:
-            interval = max(60, int(interval_s))
-        except ValueError:
-            interval = 300
-
+            return await run_loop(stop_event, http, parser, shard)
+        finally:
+            await http.aclose()
+    if parser is None:
+        parser = ParsePool.from_settings()
         try:
-            await poll_once()
-        except Exception:
-            pass
+            return await run_loop(stop_event, http, parser, shard)
+        finally:
+            parser.close()
+
+    if shard is None:
+        # A shard's feeds change over time; its seen index fills in per feed instead.
+        with db.writer() as con:
+            seen.index().warm(con)
+
+    queue = scheduler.Queue()
+    while not stop_event.is_set():
+        version = shard.version if shard is not None else 0
+        with db.writer() as con:
+            queue.sync(con, shard.holder if shard is not None else None)
+        # Batch feeds that come due within a few seconds of each other into one poll.
+        due = queue.pop_due(time.time(), window=5)
+        if due:
+            try:
+                await poll_once(http, due, parser)
+            except Exception:
+                # Don't spin on feeds whose outcome never got recorded.
+                with db.writer() as con:
+                    scheduler.defer(con, due, 60)
+            continue
 
-        # Sleep in small increments so stop is responsive.
-        for _ in range(interval):
-            if stop_event.is_set():
+        # Sleep until the next feed is due, in small increments so stop is responsive;
+        # re-sync at least every 30s to pick up feeds added or re-enabled in the UI, and at
+        # once when the shard's feeds change.
+        next_due = queue.next_due()
+        wait = 30.0 if next_due is None else min(30.0, max(1.0, next_due - time.time()))
+        deadline = time.monotonic() + wait
+        while not stop_event.is_set() and time.monotonic() < deadline:
+            if shard is not None and shard.version != version:
                 break
-            await asyncio.sleep(1)
+            await asyncio.sleep(min(1.0, deadline - time.monotonic()))
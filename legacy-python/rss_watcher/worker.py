@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import os
+import signal
+import sqlite3
+from typing import Callable, Coroutine, Sequence
+
+from . import db, events, lease, metrics, seen, shards
+from .httppool import HttpPool
+from .outbox import run_dispatcher
+from .parse import ParsePool
+from .retention import run_retention
+from .watcher import poll_once, run_loop
+
+
+# The background jobs (poll loop, notification dispatcher, retention) run in exactly one
+# process per database: whichever holds the "poller" lease. That is either this module run
+# on its own (`python -m rss_watcher.worker`) or, unless turned off, the web process.
+#
+# With --sharded, any number of workers poll side by side instead, each owning a share of
+# the feeds (see shards.py); the dispatcher and retention still run in just one of them.
+
+LEASE_NAME = "poller"
+LEASE_SECONDS = 30.0
+# How often a polling process publishes its metrics for the web processes.
+STATS_SECONDS = 5.0
+
+Jobs = Callable[[asyncio.Event], Sequence[Coroutine]]
+
+
+def poll_in_web(con: sqlite3.Connection) -> bool:
+    """Whether the web process should run the background jobs (RSSWATCHER_POLL_IN_WEB overrides)."""
+    v = os.environ.get("RSSWATCHER_POLL_IN_WEB", "").strip() or (db.kv_get(con, "poll_in_web", "1") or "1")
+    return v.strip() != "0"
+
+
+def background_jobs(http: HttpPool, parser: ParsePool) -> Jobs:
+    def start(stop: asyncio.Event) -> list[Coroutine]:
+        return [run_loop(stop, http, parser), run_dispatcher(stop, http.client), run_retention(stop)]
+
+    return start
+
+
+async def run_stats_publisher(
+    stop: asyncio.Event, http: HttpPool, parser: ParsePool, *, every: float = STATS_SECONDS
+) -> None:
+    """
+    Publish this process's poll metrics and pool stats (see metrics.publish) every `every`
+    seconds until `stop` is set, so /stats and /metrics show them from any web process.
+    """
+    while not stop.is_set():
+        try:
+            with db.connect() as con:
+                metrics.publish(con, http=http.snapshot(), parse=parser.snapshot(), seen=seen.index().snapshot())
+        except sqlite3.Error:
+            pass
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(stop.wait(), timeout=every)
+    with contextlib.suppress(sqlite3.Error), db.connect() as con:
+        metrics.unpublish(con)
+
+
+def publishing(stop: asyncio.Event, http: HttpPool, parser: ParsePool) -> list[asyncio.Task]:
+    """Start relaying events and publishing stats, for a process that polls."""
+    return [
+        asyncio.create_task(events.run_relay(stop)),
+        asyncio.create_task(run_stats_publisher(stop, http, parser)),
+    ]
+
+
+def singleton_jobs(http: HttpPool) -> Jobs:
+    """The jobs that must not run twice when polling itself is sharded."""
+
+    def start(stop: asyncio.Event) -> list[Coroutine]:
+        return [run_dispatcher(stop, http.client), run_retention(stop)]
+
+    return start
+
+
+async def run_shard(stop: asyncio.Event, http: HttpPool, parser: ParsePool, shard: shards.Shard) -> None:
+    """
+    Poll this shard's feeds until `stop` is set, heartbeating every ttl/3 so its leases stay
+    put and its share follows the number of live workers.
+    """
+    tick = shard.ttl / 3
+    with db.connect() as con:
+        shard.heartbeat(con)
+        db.log_write(
+            con, level="info", area="worker", message=f"shard {shard.holder} joined with {len(shard.owned)} feeds"
+        )
+    poller = asyncio.create_task(run_loop(stop, http, parser, shard))
+    try:
+        while not stop.is_set():
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(stop.wait(), timeout=tick)
+            if stop.is_set():
+                break
+            with db.connect() as con:
+                shard.heartbeat(con)
+                if poller.done():
+                    db.log_write(
+                        con,
+                        level="error",
+                        area="worker",
+                        message=f"shard poll loop exited; restarting ({shard.holder})",
+                        error=repr(poller.exception()) if not poller.cancelled() else None,
+                    )
+                    poller = asyncio.create_task(run_loop(stop, http, parser, shard))
+    finally:
+        # Let a poll in progress finish before handing its feeds over.
+        with contextlib.suppress(Exception, asyncio.CancelledError):
+            await poller
+        with db.connect() as con:
+            shard.leave(con)
+
+
+async def run_as_leader(
+    stop: asyncio.Event, jobs: Jobs, *, holder: str | None = None, ttl: float = LEASE_SECONDS
+) -> None:
+    """
+    Wait for the poller lease, run `jobs` while it is held, and go back to waiting if it is
+    lost; until `stop` is set.
+
+    The lease is renewed every ttl/3. If a renewal fails (this process stalled for longer
+    than the ttl and another took over), the jobs are cancelled at once rather than left to
+    race the new leader.
+    """
+    claim = lease.Lease(LEASE_NAME, holder or lease.process_id(), ttl)
+    tick = ttl / 3
+    while not stop.is_set():
+        with db.connect() as con:
+            leader = claim.acquire(con)
+        if leader:
+            await _lead(stop, jobs, claim, tick)
+        else:
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(stop.wait(), timeout=tick)
+
+
+async def _lead(stop: asyncio.Event, jobs: Jobs, claim: lease.Lease, tick: float) -> None:
+    with db.connect() as con:
+        db.log_write(con, level="info", area="worker", message=f"background jobs started by {claim.holder}")
+    inner = asyncio.Event()
+    tasks = [asyncio.create_task(c) for c in jobs(inner)]
+    try:
+        while not stop.is_set():
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(stop.wait(), timeout=tick)
+            if stop.is_set():
+                break
+            with db.connect() as con:
+                kept = claim.renew(con)
+                if not kept:
+                    db.log_write(con, level="error", area="worker", message=f"poller lease lost by {claim.holder}")
+                    break
+                failed = [t for t in tasks if t.done()]
+                if failed:
+                    # Give the lease back so this or another process starts the jobs afresh.
+                    db.log_write(
+                        con,
+                        level="error",
+                        area="worker",
+                        message=f"background job exited; restarting ({claim.holder})",
+                        error=repr(failed[0].exception()) if not failed[0].cancelled() else None,
+                    )
+                    claim.release(con)
+                    break
+    finally:
+        inner.set()
+        for t in tasks:
+            t.cancel()
+        for t in tasks:
+            with contextlib.suppress(Exception, asyncio.CancelledError):
+                await t
+        if stop.is_set():
+            with db.connect() as con:
+                claim.release(con)
+
+
+async def _serve(args: argparse.Namespace) -> None:
+    db.migrate()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        with contextlib.suppress(NotImplementedError):
+            loop.add_signal_handler(sig, stop.set)
+    http = HttpPool.from_settings()
+    parser = ParsePool.from_settings()
+    try:
+        if args.once:
+            await poll_once(http, None, parser)
+            return
+        flusher = asyncio.create_task(db.run_log_flusher(stop))
+        publishers = publishing(stop, http, parser)
+        if args.sharded:
+            shard = shards.Shard(ttl=args.lease_seconds)
+            await asyncio.gather(
+                run_shard(stop, http, parser, shard),
+                run_as_leader(stop, singleton_jobs(http), holder=shard.holder, ttl=args.lease_seconds),
+            )
+        else:
+            await run_as_leader(stop, background_jobs(http, parser), ttl=args.lease_seconds)
+        await flusher
+        await asyncio.gather(*publishers)
+    finally:
+        await http.aclose()
+        parser.close()
+        db.flush_logs()
+        db.close_all()
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(
+        prog="python -m rss_watcher.worker",
+        description="Run the feed poller, notification dispatcher and retention outside the web process.",
+    )
+    ap.add_argument("--db", help="database file (default: $RSSWATCHER_DB_PATH)")
+    ap.add_argument("--once", action="store_true", help="poll every enabled feed once and exit (no lease)")
+    ap.add_argument(
+        "--sharded",
+        action="store_true",
+        help="poll a share of the feeds alongside other --sharded workers instead of all of them",
+    )
+    ap.add_argument(
+        "--lease-seconds",
+        type=float,
+        default=LEASE_SECONDS,
+        help="how long a silent worker keeps its leases before another takes over",
+    )
+    args = ap.parse_args(argv)
+    if args.db:
+        os.environ["RSSWATCHER_DB_PATH"] = args.db
+    asyncio.run(_serve(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,9 +3,24 @@ from __future__ import annotations
 import sys
 from pathlib import Path
 
+import pytest
+
 # Ensure the repository root is importable (so `import rss_watcher` works in
 # CI, containers, and other non-editable installs).
 ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
+
+@pytest.fixture(autouse=True)
+def _close_db_connections():
+    # Each test points RSSWATCHER_DB_PATH at its own file; drop per-database state afterwards.
+    yield
+    from rss_watcher import db, events, metrics, readcache, ruleindex, seen
+
+    db.close_all()
+    seen.reset()
+    ruleindex.reset()
+    readcache.reset()
+    events.reset()
+    metrics.reset()
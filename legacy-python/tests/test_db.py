@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import threading
+
+from rss_watcher import db
+
+
+def test_connections_are_pooled_and_configured_once(tmp_path, monkeypatch):
+    monkeypatch.setenv("RSSWATCHER_DB_PATH", str(tmp_path / "sub" / "t.db"))
+    db.migrate()
+    mgr = db.manager()
+    opened = mgr.opened
+
+    for _ in range(20):
+        with db.connect() as con:
+            con.execute("SELECT COUNT(*) FROM feeds").fetchone()
+    assert mgr.opened == opened
+
+    with db.connect() as con:
+        assert con.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert con.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+        assert con.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+
+
+def test_writer_is_shared_and_reentrant(tmp_path, monkeypatch):
+    monkeypatch.setenv("RSSWATCHER_DB_PATH", str(tmp_path / "t.db"))
+    db.migrate()
+    with db.writer() as a:
+        with db.writer() as b:
+            assert a is b
+
+
+def test_open_transaction_is_rolled_back_before_reuse(tmp_path, monkeypatch):
+    monkeypatch.setenv("RSSWATCHER_DB_PATH", str(tmp_path / "t.db"))
+    db.migrate()
+    with db.connect() as con:
+        con.execute("BEGIN")
+        db.kv_set(con, "k", "v")
+
+    seen = []
+
+    def read():
+        with db.connect() as con:
+            seen.append(db.kv_get(con, "k"))
+
+    t = threading.Thread(target=read)
+    t.start()
+    t.join()
+    assert seen == [None]
+
+
+def test_log_writes_are_buffered_and_trimmed_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setenv("RSSWATCHER_DB_PATH", str(tmp_path / "t.db"))
+    db.migrate()
+    count = "SELECT COUNT(*) FROM app_log"
+    with db.connect() as con:
+        db.kv_set(con, "log_max_rows", "200")
+        db.log_write(con, level="info", area="test", message="one")
+        assert con.execute(count).fetchone()[0] == 0
+        assert db.flush_logs() == 1
+        assert con.execute("SELECT message FROM app_log").fetchone()[0] == "one"
+
+        # Rows written inside a transaction never flush into it.
+        with db.transaction(con):
+            for i in range(500):
+                db.log_write(con, level="info", area="test", message=f"m{i}")
+        assert con.execute(count).fetchone()[0] == 1
+
+        for i in range(1000):
+            db.log_write(con, level="info", area="test", message=f"n{i}")
+        db.flush_logs()
+        # Trimmed periodically rather than per row, so it may overshoot a little.
+        assert 200 <= con.execute(count).fetchone()[0] <= 200 + 200
+        assert con.execute("SELECT message FROM app_log ORDER BY id DESC").fetchone()[0] == "n999"
+
+
+def test_buffered_logs_are_written_on_close(tmp_path, monkeypatch):
+    monkeypatch.setenv("RSSWATCHER_DB_PATH", str(tmp_path / "t.db"))
+    db.migrate()
+    with db.writer() as con:
+        db.log_write(con, level="info", area="test", message="bye")
+    db.close_all()
+    with db.connect() as con:
+        assert con.execute("SELECT COUNT(*) FROM app_log").fetchone()[0] == 1
+
+
+def test_buffered_logs_for_a_deleted_feed_still_flush(tmp_path, monkeypatch):
+    monkeypatch.setenv("RSSWATCHER_DB_PATH", str(tmp_path / "t.db"))
+    db.migrate()
+    with db.connect() as con:
+        fid = con.execute("INSERT INTO feeds(name, url) VALUES('f', 'https://example.com/f.xml')").lastrowid
+        db.log_write(con, level="info", area="feed", message="polled", feed_id=fid)
+        con.execute("DELETE FROM feeds WHERE id = ?", (fid,))
+        db.log_write(con, level="info", area="test", message="after")
+        assert db.flush_logs() == 2
+        assert len(db.manager().logs) == 0
+        rows = con.execute("SELECT message, feed_id FROM app_log ORDER BY id").fetchall()
+        assert [tuple(r) for r in rows] == [("polled", None), ("after", None)]
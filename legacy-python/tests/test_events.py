@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+from collections import deque
+
+import pytest
+import respx
+
+from rss_watcher import db, events, lease, watcher
+
+RSS_XML = """<rss version="2.0"><channel><title>x</title>
+<item><title>Breaking: ransomware hits ACME</title><link>http://example.test/a</link><guid>a</guid></item>
+</channel></rss>"""
+
+
+@pytest.mark.asyncio
+async def test_slow_client_buffer_is_bounded_and_progress_coalesces():
+    with events.subscribe(maxlen=3) as sub:
+        for i in range(5):
+            events.publish(events.PROGRESS, done=i)
+        events.publish(events.ALERT, n=0)
+        events.publish(events.PROGRESS, done=9)
+        assert [e.kind for e in await sub.next(0)] == [events.PROGRESS, events.ALERT, events.PROGRESS]
+        assert sub.take_dropped() == 0
+
+        for i in range(5):
+            events.publish(events.ALERT, n=i)
+        assert [e.data["n"] for e in await sub.next(0)] == [2, 3, 4]
+        assert sub.take_dropped() == 2
+    assert events.subscribers() == 0
+
+
+@pytest.mark.asyncio
+async def test_reconnect_replays_after_last_event_id_and_threads_can_publish():
+    with events.subscribe() as first:
+        events.publish(events.ALERT, n=1)
+        events.publish(events.ALERT, n=2)
+        last_seen = (await first.next(0))[0].id
+    with events.subscribe(after=last_seen) as sub:
+        assert [e.data["n"] for e in await sub.next(0)] == [2]
+        threading.Thread(target=events.publish, args=(events.ALERT,), kwargs={"n": 3}).start()
+        assert [e.data["n"] for e in await sub.next(5)] == [3]
+
+
+@pytest.mark.asyncio
+async def test_sse_stream_format():
+    calls = 0
+
+    async def disconnected():
+        nonlocal calls
+        calls += 1
+        return calls > 2
+
+    with events.subscribe(maxlen=1) as sub:
+        events.publish(events.ALERT, n=1)
+        events.publish(events.ALERT, n=2)
+        chunks = [c async for c in events.sse(sub, keepalive=0.01, disconnected=disconnected)]
+    assert chunks[0].startswith("retry:")
+    assert chunks[1] == 'event: resync\ndata: {"dropped": 1}\n\n'
+    assert chunks[2].startswith("id: ") and chunks[2].endswith('event: alert\ndata: {"n":2}\n\n')
+    assert chunks[3] == ": keepalive\n\n"
+
+
+@pytest.mark.asyncio
+async def test_poll_once_publishes_alerts_and_progress(tmp_path, monkeypatch):
+    monkeypatch.setenv("RSSWATCHER_DB_PATH", str(tmp_path / "t.db"))
+    feed_url = "https://feed.test/rss.xml"
+    db.migrate()
+    with db.connect() as con:
+        con.execute("INSERT INTO feeds(name, url, enabled) VALUES(?, ?, 1)", ("Example", feed_url))
+        con.execute("INSERT INTO rules(keyword, feed_id, enabled) VALUES(?, NULL, 1)", ("ransomware",))
+
+    with events.subscribe() as sub, respx.mock() as router:
+        router.get(feed_url).respond(200, text=RSS_XML)
+        assert await watcher.poll_once() == 1
+        got = await sub.next(0)
+
+    assert [e.kind for e in got] == [events.POLL, events.ALERT, events.PROGRESS, events.POLL]
+    alert = got[1].data
+    assert alert["keyword"] == "ransomware" and alert["feed_name"] == "Example"
+    assert got[2].data["done"] == got[2].data["total"] == 1
+    assert got[3].data == {"phase": "finished", "feeds": 1, "alerts": 1, "wall": got[3].data["wall"]}
+
+
+@pytest.mark.asyncio
+async def test_events_reach_clients_of_another_process(tmp_path, monkeypatch):
+    monkeypatch.setenv("RSSWATCHER_DB_PATH", str(tmp_path / "t.db"))
+    db.migrate()
+    with db.connect() as con:
+        # The worker process: its events queue up for the relay while it runs.
+        monkeypatch.setattr(lease, "process_id", lambda: "worker")
+        events._outbound = deque(maxlen=10)
+        for i in range(3):
+            events.publish(events.PROGRESS, done=i)
+        events.publish(events.ALERT, n=1)
+        sent = [e.id for e in events._recent]
+        assert events.relay(con) == 2
+        events.reset()
+
+        # A web process tails the table; its own relayed events would be skipped.
+        monkeypatch.setattr(lease, "process_id", lambda: "web")
+        with events.subscribe() as sub:
+            cursor = events.tail(con, 0)
+            got = await sub.next(0)
+            assert [(e.kind, e.data) for e in got] == [(events.PROGRESS, {"done": 2}), (events.ALERT, {"n": 1})]
+            assert [e.id for e in got] == sent[2:]
+            assert events.tail(con, cursor) == cursor
+
+
+def test_relay_keeps_events_queued_when_the_write_fails(tmp_path, monkeypatch):
+    monkeypatch.setenv("RSSWATCHER_DB_PATH", str(tmp_path / "t.db"))
+    db.migrate()
+    events._outbound = deque(maxlen=10)
+    events.publish(events.ALERT, n=1)
+    with db.connect() as con, db.connect() as other:
+        other.execute("BEGIN IMMEDIATE")
+        con.execute("PRAGMA busy_timeout = 0")
+        with pytest.raises(sqlite3.OperationalError):
+            events.relay(con)
+        other.rollback()
+        con.execute("PRAGMA busy_timeout = 30000")
+
+        events.publish(events.ALERT, n=2)
+        assert events.relay(con) == 2
+        assert events.relay(con) == 0
+        assert [r[0] for r in con.execute("SELECT data FROM poll_events ORDER BY id")] == ['{"n":1}', '{"n":2}']
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from rss_watcher.httppool import HttpPool
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b"<rss/>"
+        self.send_response(200)
+        self.send_header("Content-Type", "application/rss+xml")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def local_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    t = threading.Thread(target=server.serve_forever, daemon=True)
+    t.start()
+    try:
+        yield f"http://localhost:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.mark.asyncio
+async def test_pool_reuses_connections_and_caches_dns(local_server):
+    pool = HttpPool(max_connections=4, max_keepalive=4)
+    try:
+        for i in range(3):
+            r = await pool.client.get(f"{local_server}/feed{i}.xml")
+            assert r.status_code == 200
+    finally:
+        await pool.aclose()
+
+    stats = pool.snapshot()
+    assert stats["requests"] == 3
+    assert stats["connections_opened"] == 1
+    assert stats["connections_reused"] == 2
+    assert stats["dns_lookups"] == 1
+
+
+@pytest.mark.asyncio
+async def test_pool_raises_httpx_errors():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    pool = HttpPool()
+    try:
+        with pytest.raises(httpx.ConnectError):
+            await pool.client.get(f"http://127.0.0.1:{port}/feed.xml")
+    finally:
+        await pool.aclose()
+    assert pool.snapshot()["connections_opened"] == 1
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+from rss_watcher import db, ingest
+from rss_watcher.matcher import RuleMatcher
+from rss_watcher.seen import SeenIndex
+
+
+def _row(key: str, text: str) -> ingest.EntryRow:
+    return ingest.EntryRow(key=key, link=f"http://x.test/{key}", title=key, published=None, summary=None, content=text)
+
+
+def _setup(tmp_path, monkeypatch) -> None:
+    monkeypatch.setenv("RSSWATCHER_DB_PATH", str(tmp_path / "t.db"))
+    db.migrate()
+    with db.connect() as con:
+        con.execute("INSERT INTO feeds(name, url) VALUES('F', 'http://x.test/rss')")
+
+
+def test_ingest_skips_known_and_duplicate_keys(tmp_path, monkeypatch):
+    _setup(tmp_path, monkeypatch)
+    rules = [{"id": 1, "keyword": "ransomware", "feed_id": None, "created_at": "2000-01-01 00:00:00"}]
+    with db.connect() as con:
+        con.execute("INSERT INTO rules(id, keyword, created_at) VALUES(1, 'ransomware', '2000-01-01 00:00:00')")
+        ingest.baseline(con, 1, [_row("old", "ransomware")])
+
+        result = ingest.ingest(
+            con,
+            1,
+            [_row("old", "ransomware"), _row("new", "Ransomware!"), _row("new", "ransomware again"), _row("x", "-")],
+            RuleMatcher(rules),
+        )
+        assert [(a.rule_id, a.title) for a in result.alerts] == [(1, "new")]
+        assert result.new_entries == 2
+        assert con.execute("SELECT COUNT(*) FROM entries").fetchone()[0] == 3
+        assert con.execute("SELECT COUNT(*) FROM alerts").fetchone()[0] == 1
+        assert not con.in_transaction
+
+
+def test_ingest_does_not_alert_for_rules_newer_than_entry(tmp_path, monkeypatch):
+    _setup(tmp_path, monkeypatch)
+    rules = [{"id": 1, "keyword": "acme", "feed_id": None, "created_at": "2999-01-01 00:00:00"}]
+    with db.connect() as con:
+        con.execute("INSERT INTO rules(id, keyword, created_at) VALUES(1, 'acme', '2999-01-01 00:00:00')")
+        assert ingest.ingest(con, 1, [_row("a", "acme")], RuleMatcher(rules)).alerts == []
+        assert con.execute("SELECT COUNT(*) FROM entries").fetchone()[0] == 1
+
+
+def test_seen_index_drops_known_keys_without_querying(tmp_path, monkeypatch):
+    _setup(tmp_path, monkeypatch)
+    idx = SeenIndex(per_feed=8)
+    matcher = RuleMatcher([])
+    with db.connect() as con:
+        ingest.baseline(con, 1, [_row("a", ""), _row("b", "")], idx)
+        queried = []
+        monkeypatch.setattr(ingest, "existing_keys", lambda con, fid, keys: queried.append(list(keys)) or set())
+        ingest.ingest(con, 1, [_row("a", ""), _row("b", ""), _row("c", "")], matcher, idx)
+
+    assert queried == [["c"]]
+    snap = idx.snapshot()
+    assert (snap["hits"], snap["misses"], snap["keys"]) == (2, 1, 3)
+
+
+def test_seen_index_warms_from_db_and_evicts(tmp_path, monkeypatch):
+    _setup(tmp_path, monkeypatch)
+    with db.connect() as con:
+        ingest.baseline(con, 1, [_row(str(i), "") for i in range(5)])
+        idx = SeenIndex(per_feed=3)
+        idx.warm(con)
+        assert idx.filter_new(con, 1, ["0", "1", "2", "3", "4"]) == ["0", "1"]
+        idx.add(1, ["x"])
+        assert idx.snapshot()["keys"] == 3
+
+
+def test_match_fields_are_only_built_for_covered_feeds(tmp_path, monkeypatch):
+    _setup(tmp_path, monkeypatch)
+    with db.connect() as con:
+        con.execute("INSERT INTO feeds(id, name, url) VALUES(2, 'Other', 'http://y.test/rss')")
+        con.execute("INSERT INTO rules(id, keyword, feed_id, created_at) VALUES(1, 'Ransomware', 1, '2000-01-01 00:00:00')")
+    matcher = RuleMatcher([{"id": 1, "keyword": "Ransomware", "feed_id": 1, "created_at": "2000-01-01 00:00:00"}])
+    assert matcher.covers(1) and not matcher.covers(2)
+
+    hit, other = _row("a", "new RANSOMWARE strain"), _row("b", "ransomware elsewhere")
+    with db.connect() as con:
+        assert len(ingest.ingest(con, 1, [hit], matcher).alerts) == 1
+        assert ingest.ingest(con, 2, [other], matcher).new_entries == 1
+    assert hit.match_fields() == ("a", "new ransomware strain")
+    assert other._folded is None
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import random
+import re
+
+import pytest
+
+from rss_watcher import matcher
+from rss_watcher.matcher import Automaton, Match, RuleMatcher, normalize_keyword, required_literal, split_terms
+
+
+def _legacy_find_matches(feed_id, text, rules):
+    hay = text.lower()
+    out = []
+    for r in rules:
+        kw = normalize_keyword(r["keyword"])
+        if not kw:
+            continue
+        if r["feed_id"] is not None and int(r["feed_id"]) != int(feed_id):
+            continue
+        if kw.lower() in hay:
+            out.append(Match(rule_id=int(r["id"]), keyword=kw, created_at=str(r["created_at"])))
+    return out
+
+
+def test_automaton_reports_overlapping_and_nested_patterns():
+    a = Automaton(["he", "she", "his", "hers"])
+    found = {a.patterns[i] for i in a.search("ushers")}
+    assert found == {"he", "she", "hers"}
+
+
+@pytest.mark.parametrize("scan_threshold", [0, 1000])
+def test_rule_matcher_agrees_with_per_rule_scan(monkeypatch, scan_threshold):
+    monkeypatch.setattr(matcher, "_SCAN_THRESHOLD", scan_threshold)
+    rnd = random.Random(7)
+    words = ["ransomware", "acme", "breach", "zero day", "cve", "patch", "ran", "ware", "  Zero   Day "]
+    rules = [
+        {
+            "id": i + 1,
+            "keyword": rnd.choice(words),
+            "feed_id": rnd.choice([None, None, 1, 2]),
+            "created_at": "2024-01-01 00:00:00",
+        }
+        for i in range(60)
+    ]
+    rules.append({"id": 999, "keyword": "   ", "feed_id": None, "created_at": "2024-01-01 00:00:00"})
+    m = RuleMatcher(rules)
+
+    texts = [
+        "Breaking: Ransomware hits ACME",
+        "New zero day in the wild, patch now (CVE-2024-0001)",
+        "nothing to see",
+        "",
+    ]
+    for feed_id in (1, 2, 3):
+        for text in texts:
+            assert m.find(feed_id, text) == _legacy_find_matches(feed_id, text, rules)
+
+
+def _naive_rich_matches(feed_id, title, body, rules):
+    # Each rule on its own, straight from its definition.
+    out = []
+    for r in rules:
+        if r["feed_id"] is not None and int(r["feed_id"]) != int(feed_id):
+            continue
+        field = r.get("field", "any")
+        text = {"title": title, "body": body, "any": "\n".join(p for p in (title, body) if p)}[field].lower()
+        kind = r.get("kind", "keyword")
+
+        def has(term):
+            term = term.lower()
+            if kind == "word":
+                return re.search(r"(?<!\w)" + re.escape(term) + r"(?!\w)", text) is not None
+            return term in text
+
+        if kind == "regex":
+            ok = re.search(r["keyword"], text, re.IGNORECASE) is not None
+        else:
+            ok = has(normalize_keyword(r["keyword"]))
+        ok = ok and all(has(t) for t in split_terms(r.get("all_of")))
+        ok = ok and not any(has(t) for t in split_terms(r.get("none_of")))
+        if ok:
+            kw = r["keyword"].strip() if kind == "regex" else normalize_keyword(r["keyword"])
+            out.append(Match(rule_id=int(r["id"]), keyword=kw, created_at=str(r["created_at"])))
+    return out
+
+
+@pytest.mark.parametrize("scan_threshold", [0, 1000])
+def test_rich_rules_agree_with_naive_evaluation(monkeypatch, scan_threshold):
+    monkeypatch.setattr(matcher, "_SCAN_THRESHOLD", scan_threshold)
+    rnd = random.Random(11)
+    words = ["ransomware", "acme", "breach", "zero day", "cve", "patch", "ran", "ware", "hospital"]
+    regexes = [r"cve-\d{4}-\d+", r"\bacme\b", r"zero.?day", r"(foo|bar)+", r"^breaking", r"[0-9]{3,}"]
+    rules = []
+    for i in range(200):
+        kind = rnd.choice(["keyword", "word", "regex"])
+        rules.append(
+            {
+                "id": i + 1,
+                "keyword": rnd.choice(regexes if kind == "regex" else words),
+                "feed_id": rnd.choice([None, None, 1, 2]),
+                "created_at": "2024-01-01 00:00:00",
+                "kind": kind,
+                "field": rnd.choice(["any", "any", "title", "body"]),
+                "all_of": ", ".join(rnd.sample(words, rnd.choice([0, 0, 1, 2]))),
+                "none_of": ", ".join(rnd.sample(words, rnd.choice([0, 0, 1]))),
+            }
+        )
+    m = RuleMatcher(rules)
+
+    entries = [
+        ("Breaking: Ransomware hits ACME hospital", "Attackers used CVE-2024-12345 before the patch."),
+        ("acmeware breach", "zero-day ransom ware, foo bar 2024"),
+        ("Zero Day at Acme", ""),
+        ("nothing to see", "nothing here either"),
+        ("", ""),
+    ]
+    for feed_id in (1, 2, 3):
+        for title, body in entries:
+            assert m.find(feed_id, body, title) == _naive_rich_matches(feed_id, title, body, rules)
+
+
+def test_rule_kinds_fields_and_terms():
+    def one(**rule):
+        return RuleMatcher([{"id": 1, "feed_id": None, "created_at": "x", **rule}])
+
+    assert one(keyword="ran", kind="word").find(1, "ransomware") == []
+    assert one(keyword="ran", kind="word").find(1, "they ran.") != []
+    assert one(keyword="acme", field="title").find(1, "acme", title="Other") == []
+    assert one(keyword="acme", field="body").find(1, "body", title="acme") == []
+    assert one(keyword="breach", all_of="acme, bank").find(1, "acme breach at a bank") != []
+    assert one(keyword="breach", all_of="acme, bank").find(1, "acme breach") == []
+    assert one(keyword="breach", none_of="webinar").find(1, "breach webinar") == []
+    assert one(keyword=r"cve-\d+", kind="regex").find(1, "see CVE-2024") != []
+
+    bad = one(keyword="(unclosed", kind="regex")
+    assert bad.invalid == [1] and not len(bad)
+
+
+def test_required_literal_picks_the_longest_certain_run():
+    assert required_literal(r"CVE-\d{4}-\d+") == "cve-"
+    assert required_literal(r"\bransom(ware)?\b") == "ransom"
+    assert required_literal(r"(?:zero)+ days") == " days"
+    assert required_literal(r"foo|barbaz") == ""
+    assert required_literal(r"a?b*") == ""
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import pytest
+import respx
+
+from rss_watcher import db, metrics, watcher
+
+
+RSS_XML = """<rss version="2.0"><channel><title>x</title>
+<item><title>ransomware one</title><link>http://example.test/a</link><guid>a</guid></item>
+<item><title>nothing here</title><link>http://example.test/b</link><guid>b</guid></item>
+</channel></rss>"""
+
+
+def test_stopwatch_charges_laps_to_stages():
+    sw = metrics.Stopwatch()
+    sw.add("fetch", 0.5)
+    sw.lap("parse")
+    sw.lap("parse")
+    assert set(sw.seconds) == {"fetch", "parse"} and sw.total() >= 0.5
+
+
+def test_histogram_buckets_and_exposition():
+    r = metrics.Registry()
+    for seconds in (0.003, 0.003, 0.2, 7.0):
+        sw = metrics.Stopwatch()
+        sw.add("fetch", seconds)
+        r.record_feed(1, 'Say "hi"', sw, nbytes=10)
+    h = r.feeds[1].total
+    assert h.count == 4 and h.quantile(0.5) == 0.005 and h.quantile(1.0) == 10.0
+
+    text = r.exposition()
+    assert "rsswatcher_bytes_downloaded_total 40" in text
+    assert 'rsswatcher_feed_seconds_bucket{feed_id="1",feed="Say \\"hi\\"",le="0.005"} 2' in text
+    assert 'rsswatcher_stage_seconds_bucket{stage="fetch",le="+Inf"} 4' in text
+    assert 'rsswatcher_stage_seconds_count{stage="parse"}' not in text
+
+
+@pytest.mark.asyncio
+async def test_poll_once_records_stages_and_counters(tmp_path, monkeypatch):
+    monkeypatch.setenv("RSSWATCHER_DB_PATH", str(tmp_path / "t.db"))
+    db.migrate()
+    with db.connect() as con:
+        con.execute("INSERT INTO feeds(name, url, enabled, armed) VALUES('Slow', 'https://slow.test/rss', 1, 1)")
+        con.execute("INSERT INTO feeds(name, url, enabled, armed) VALUES('Down', 'https://down.test/rss', 1, 1)")
+        con.execute("INSERT INTO rules(keyword, feed_id, enabled) VALUES('ransomware', NULL, 1)")
+
+    with respx.mock() as router:
+        router.get("https://slow.test/rss").respond(200, text=RSS_XML)
+        router.get("https://down.test/rss").respond(500)
+        assert await watcher.poll_once() == 1
+
+    r = metrics.registry()
+    snap = r.snapshot()
+    assert snap["polls"] == 1 and snap["feeds_polled"] == 2 and snap["feed_errors"] == 1
+    assert snap["bytes_downloaded"] == len(RSS_XML)
+    assert (snap["entries_seen"], snap["entries_new"], snap["alerts"]) == (2, 2, 1)
+    assert set(metrics.STAGES) <= set(snap["stage_seconds"])
+    assert r.stages["match"].count == 1 and r.stages["parse"].count == 1
+
+    slowest = {f["name"]: f for f in r.slowest()}
+    assert slowest["Slow"]["stages"]["persist"] > 0 and slowest["Down"]["failures"] == 1
+
+    with db.connect() as con:
+        messages = [m for (m,) in con.execute("SELECT message FROM app_log WHERE area = 'poll'")]
+    assert any(m.startswith("stage time, summed over feeds: fetch ") for m in messages)
+
+
+def test_metrics_endpoint_and_stats_page(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from rss_watcher.main import app
+
+    monkeypatch.setenv("RSSWATCHER_DB_PATH", str(tmp_path / "t.db"))
+    db.migrate()
+    sw = metrics.Stopwatch()
+    sw.add("fetch", 1.5)
+    metrics.registry().record_feed(7, "Sluggish", sw)
+    client = TestClient(app)
+    r = client.get("/metrics")
+    assert r.status_code == 200 and r.headers["content-type"].startswith("text/plain")
+    assert "# TYPE rsswatcher_feed_seconds histogram" in r.text
+    assert "Sluggish" in client.get("/stats").text
+
+
+def test_web_process_shows_what_a_worker_published(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from rss_watcher import lease
+    from rss_watcher.main import app
+
+    monkeypatch.setenv("RSSWATCHER_DB_PATH", str(tmp_path / "t.db"))
+    db.migrate()
+    with db.connect() as con:
+        con.execute("INSERT INTO feeds(id, name, url) VALUES(1, 'Kept', 'https://a.test/rss')")
+        con.execute("INSERT INTO leases(name, holder, acquired_at, expires_at) VALUES('poller', 'worker', 0, 9e9)")
+
+    # As the worker process would: record a poll and publish it.
+    for fid, name in ((1, "Kept"), (2, "Deleted since")):
+        sw = metrics.Stopwatch()
+        sw.add("fetch", 0.2)
+        metrics.registry().record_feed(fid, name, sw, nbytes=100)
+    metrics.registry().record_poll(0.5)
+    web = lease.process_id()
+    monkeypatch.setattr(lease, "process_id", lambda: "worker")
+    with db.connect() as con:
+        metrics.publish(con, http={"http2": False, "requests": 42}, parse=None, seen=None)
+    monkeypatch.setattr(lease, "process_id", lambda: web)
+    metrics.reset()
+
+    client = TestClient(app)
+    text = client.get("/metrics").text
+    assert "rsswatcher_polls_total 1" in text and "rsswatcher_bytes_downloaded_total 200" in text
+    assert 'feed="Kept"' in text and "Deleted since" not in text
+    stats = client.get("/stats.json").json()
+    assert stats["pipeline"]["feeds_polled"] == 2 and stats["http"]["requests"] == 42
+    assert [f["name"] for f in stats["slowest_feeds"]] == ["Kept"]
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import smtplib
+
+import httpx
+import pytest
+
+from rss_watcher import db, notifier, outbox
+
+
+def _seed(tmp_path, monkeypatch, n: int, channel: str) -> None:
+    monkeypatch.setenv("RSSWATCHER_DB_PATH", str(tmp_path / "t.db"))
+    monkeypatch.setenv("PUSHOVER_APP_TOKEN", "app")
+    monkeypatch.setenv("PUSHOVER_USER_KEY", "user")
+    monkeypatch.setenv("SMTP_HOST", "smtp.test")
+    monkeypatch.setenv("SMTP_PORT", "587")
+    monkeypatch.setenv("SMTP_FROM", "alerts@test")
+    monkeypatch.setenv("SMTP_TO", "you@test")
+    db.migrate()
+    with db.connect() as con:
+        for i in range(n):
+            outbox.enqueue(
+                con,
+                channel=channel,
+                feed_id=None,
+                rule_id=None,
+                subject=f"s{i}",
+                title=f"t{i}",
+                body=f"b{i}",
+                link=f"http://x.test/{i}",
+            )
+
+
+def _status(request_status: int, headers=None):
+    async def fake(cfg, title, message, url, client=None):
+        req = httpx.Request("POST", "https://api.pushover.net/1/messages.json")
+        resp = httpx.Response(request_status, request=req, headers=headers or {})
+        resp.raise_for_status()
+        return resp
+
+    return fake
+
+
+@pytest.mark.asyncio
+async def test_pushover_rate_limit_is_retried_with_backoff(tmp_path, monkeypatch):
+    _seed(tmp_path, monkeypatch, 2, outbox.PUSHOVER)
+    monkeypatch.setattr(outbox, "send_pushover", _status(429, {"Retry-After": "120"}))
+
+    assert await outbox.Dispatcher().drain_once() == 0
+
+    with db.connect() as con:
+        rows = con.execute(
+            """
+            SELECT status, attempts,
+                   CAST((julianday(next_attempt_at) - julianday('now')) * 86400 AS INTEGER) AS wait_s
+            FROM outbox ORDER BY id
+            """
+        ).fetchall()
+    # The first send hit the limit; the second wasn't attempted in this pass.
+    assert (rows[0]["status"], rows[0]["attempts"]) == ("pending", 1)
+    assert 100 <= rows[0]["wait_s"] <= 120
+    assert (rows[1]["status"], rows[1]["attempts"], rows[1]["wait_s"]) == ("pending", 0, 0)
+
+
+@pytest.mark.asyncio
+async def test_pushover_client_error_fails_permanently(tmp_path, monkeypatch):
+    _seed(tmp_path, monkeypatch, 1, outbox.PUSHOVER)
+    monkeypatch.setattr(outbox, "send_pushover", _status(400))
+
+    await outbox.Dispatcher().drain_once()
+
+    with db.connect() as con:
+        assert con.execute("SELECT status FROM outbox").fetchone()[0] == "failed"
+        assert outbox.metrics(con)["failed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_email_digest_coalesces_alerts_into_one_session(tmp_path, monkeypatch):
+    _seed(tmp_path, monkeypatch, 5, outbox.EMAIL)
+    with db.connect() as con:
+        db.kv_set(con, "notify_email_digest", "1")
+        db.kv_set(con, "notify_digest_max", "3")
+
+    sessions = []
+
+    def fake_send_emails(cfg, messages):
+        sessions.append(messages)
+        return [None] * len(messages)
+
+    monkeypatch.setattr(outbox, "send_emails", fake_send_emails)
+
+    assert await outbox.Dispatcher().drain_once() == 5
+    assert len(sessions) == 1
+    assert [subject for subject, _ in sessions[0]] == ["RSS Watcher: 3 new alerts", "RSS Watcher: 2 new alerts"]
+
+    with db.connect() as con:
+        m = outbox.metrics(con)
+    assert (m["pending"], m["sent"]) == (0, 5)
+
+
+def test_claims_are_exclusive_until_they_lapse(tmp_path, monkeypatch):
+    _seed(tmp_path, monkeypatch, 3, outbox.PUSHOVER)
+    with db.connect() as a, db.connect() as b:
+        first = outbox._claim(a, outbox.PUSHOVER, 2)
+        assert [r["subject"] for r in first] == ["s0", "s1"]
+        assert [r["subject"] for r in outbox._claim(b, outbox.PUSHOVER, 2)] == ["s2"]
+        assert outbox._claim(a, outbox.PUSHOVER, 2) == []
+
+        # A dispatcher that died mid-send leaves its rows to be picked up again later.
+        a.execute("UPDATE outbox SET next_attempt_at = datetime('now', '-1 seconds') WHERE id = ?", (first[0]["id"],))
+        assert [r["subject"] for r in outbox._claim(b, outbox.PUSHOVER, 2)] == ["s0"]
+
+
+@pytest.mark.asyncio
+async def test_email_session_dropped_midway_only_retries_unsent(tmp_path, monkeypatch):
+    _seed(tmp_path, monkeypatch, 3, outbox.EMAIL)
+
+    class FakeSMTP:
+        def __init__(self, host, port, timeout=None):
+            self.sent = []
+
+        def starttls(self):
+            pass
+
+        def send_message(self, msg):
+            if self.sent:
+                raise TimeoutError("timed out")
+            self.sent.append(msg["Subject"])
+
+        def quit(self):
+            raise smtplib.SMTPServerDisconnected("gone")
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(notifier.smtplib, "SMTP", FakeSMTP)
+
+    assert await outbox.Dispatcher().drain_once() == 1
+
+    with db.connect() as con:
+        rows = [tuple(r) for r in con.execute("SELECT subject, status, attempts FROM outbox ORDER BY id")]
+    assert rows == [("s0", "sent", 1), ("s1", "pending", 1), ("s2", "pending", 1)]
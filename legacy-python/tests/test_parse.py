@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import pickle
+
+import pytest
+import respx
+
+from rss_watcher import db, parse, watcher
+
+from test_watcher_e2e import RSS_XML
+
+
+def test_parse_feed_returns_plain_rows():
+    parsed = parse.parse_feed(RSS_XML.replace("<channel>", "<channel><ttl>15</ttl>").encode(), "https://feed.test/rss.xml")
+    assert parsed.ttl == "15"
+    [row] = parsed.rows
+    assert row.key == "item-a"
+    assert row.link == "http://example.test/a"
+    assert "ransomware" in row.text
+    # Crosses the process boundary as plain strings.
+    assert pickle.loads(pickle.dumps(parsed)) == parsed
+
+
+@pytest.mark.asyncio
+async def test_poll_parses_in_worker_process(tmp_path, monkeypatch):
+    monkeypatch.setenv("RSSWATCHER_DB_PATH", str(tmp_path / "t.db"))
+    feed_url = "https://feed.test/rss.xml"
+    db.migrate()
+    with db.connect() as con:
+        con.execute("INSERT INTO feeds(name, url, enabled) VALUES(?, ?, 1)", ("Example", feed_url))
+        con.execute("INSERT INTO rules(keyword, feed_id, enabled) VALUES(?, NULL, 1)", ("ransomware",))
+
+    pool = parse.ParsePool(workers=1)
+    try:
+        with respx.mock() as router:
+            router.get(feed_url).respond(200, text=RSS_XML)
+            assert await watcher.poll_once(parser=pool) == 1
+        assert pool.snapshot()["parsed"] == 1
+    finally:
+        pool.close()
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import time
+
+import pytest
+import respx
+
+from rss_watcher import db, profiling, watcher
+
+
+def _busy(seconds: float) -> None:
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_sampler_records_collapsed_stacks_and_top_functions():
+    with profiling.sampling(interval=0.001) as prof:
+        _busy(0.2)
+    assert prof.samples > 20 and prof.elapsed >= 0.2
+
+    lines = prof.collapsed().splitlines()
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) > 0 and stack.split(";")[-1].startswith("_busy (") and "test_profiling.py:" in stack
+
+    top = prof.top()
+    assert top[0]["function"].startswith("_busy ") and top[0]["self_pct"] > 50
+    assert all(f["total"] >= f["self"] for f in top)
+
+
+@pytest.mark.asyncio
+async def test_requested_poll_is_profiled_once(tmp_path, monkeypatch):
+    monkeypatch.setenv("RSSWATCHER_DB_PATH", str(tmp_path / "t.db"))
+    db.migrate()
+    with db.connect() as con:
+        con.execute("INSERT INTO feeds(name, url, enabled) VALUES('F', 'https://feed.test/rss.xml', 1)")
+        con.execute("INSERT INTO rules(keyword) VALUES('ransomware')")
+
+    with respx.mock() as router:
+        router.get("https://feed.test/rss.xml").respond(200, text="<rss><channel></channel></rss>")
+        await watcher.poll_once()
+        with db.connect() as con:
+            assert not profiling.recent(con)
+            profiling.request(con)
+        await watcher.poll_once()
+        await watcher.poll_once()
+
+    db.flush_logs()
+    with db.connect() as con:
+        (saved,) = profiling.recent(con)
+        assert db.kv_get(con, profiling.REQUEST_KEY) == "0"
+        profile = profiling.load(con, saved["id"])
+        logged = con.execute("SELECT message FROM app_log WHERE area = 'profile'").fetchall()
+    assert profile["samples"] == saved["samples"] and isinstance(profile["top"], list)
+    assert len(logged) == 1 and f"/logs/profiles/{saved['id']}" in logged[0]["message"]
+
+
+def test_profile_pages(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from rss_watcher.main import app
+
+    monkeypatch.setenv("RSSWATCHER_DB_PATH", str(tmp_path / "t.db"))
+    db.migrate()
+    with profiling.sampling(interval=0.001) as prof:
+        _busy(0.05)
+    with db.connect() as con:
+        profile_id = profiling.save(con, prof)
+
+    client = TestClient(app)
+    assert client.post("/logs/profile").status_code == 200
+    logs = client.get("/logs").text
+    assert "The next poll will be profiled." in logs and f"/logs/profiles/{profile_id}" in logs
+    assert "_busy" in client.get(f"/logs/profiles/{profile_id}").text
+    collapsed = client.get(f"/logs/profiles/{profile_id}/collapsed.txt")
+    assert collapsed.status_code == 200 and collapsed.text == prof.collapsed()
+    assert client.get("/logs/profiles/999").status_code == 404
+    # Saving the settings form leaves a pending request alone.
+    assert client.post("/settings/save", data={"poll_interval_seconds": "300"}).status_code == 200
+    assert "The next poll will be profiled." in client.get("/logs").text
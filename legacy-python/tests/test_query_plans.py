@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import itertools
+
+import pytest
+
+from rss_watcher import db, queries
+
+
+def _plan(con, sql: str, params) -> list[str]:
+    return [str(r["detail"]) for r in con.execute("EXPLAIN QUERY PLAN " + sql, params)]
+
+
+def _assert_indexed(plan: list[str], filters: tuple[str, ...] = ()) -> None:
+    # "SCAN t" walks a whole table or index; a temp B-tree means sorting every matching row.
+    bad = [step for step in plan if step.startswith("SCAN") or "TEMP B-TREE" in step]
+    assert not bad, plan
+    if filters:
+        # A rowid range alone would still be a SEARCH, but walks every row below the cursor.
+        assert any(f"{c}=?" in plan[0] for c in filters), plan
+
+
+@pytest.fixture
+def con(tmp_path, monkeypatch):
+    monkeypatch.setenv("RSSWATCHER_DB_PATH", str(tmp_path / "t.db"))
+    db.migrate()
+    with db.connect() as con:
+        yield con
+
+
+@pytest.mark.parametrize(
+    "before,feed_id,rule_id", list(itertools.product([None, 100], [None, 1], [None, 2]))
+)
+def test_alert_listing_is_index_backed(con, before, feed_id, rule_id):
+    sql, params = queries.alerts_query(before=before, feed_id=feed_id, rule_id=rule_id)
+    filters = tuple(c for c, v in (("feed_id", feed_id), ("rule_id", rule_id)) if v is not None)
+    _assert_indexed(_plan(con, sql, [*params, 50]), filters)
+
+
+@pytest.mark.parametrize(
+    "feed_id,rule_id,level", list(itertools.product([None, 1], [None, 2], [None, "error"]))
+)
+def test_log_listing_is_index_backed(con, feed_id, rule_id, level):
+    sql, params = queries.logs_query(before=100, feed_id=feed_id, rule_id=rule_id, level=level)
+    filters = tuple(c for c, v in (("feed_id", feed_id), ("rule_id", rule_id), ("level", level)) if v is not None)
+    _assert_indexed(_plan(con, sql, [*params, 250]), filters)
+
+
+@pytest.mark.parametrize(
+    "sql,params",
+    [
+        # seen.SeenIndex.warm
+        ("SELECT entry_key FROM entries WHERE feed_id = ? ORDER BY seen_at DESC, id DESC LIMIT ?", (1, 500)),
+        # retention.trim_threshold
+        ("SELECT id FROM entries WHERE feed_id = ? ORDER BY seen_at DESC, id DESC LIMIT 1 OFFSET ?", (1, 2000)),
+        # ON DELETE from feeds / rules
+        ("SELECT 1 FROM app_log WHERE feed_id = ?", (1,)),
+        ("SELECT 1 FROM app_log WHERE rule_id = ?", (1,)),
+        ("SELECT 1 FROM alerts WHERE rule_id = ?", (1,)),
+        ("SELECT 1 FROM alerts WHERE entry_id = ?", (1,)),
+    ],
+)
+def test_hot_lookups_are_index_backed(con, sql, params):
+    _assert_indexed(_plan(con, sql, params))
+
+
+def test_alert_feed_id_is_filled_in_and_listings_page(con):
+    con.execute("INSERT INTO feeds(id, name, url) VALUES(1, 'F', 'http://x.test/rss'), (2, 'G', 'http://y.test/rss')")
+    con.execute("INSERT INTO rules(id, keyword) VALUES(1, 'k')")
+    for i in range(1, 8):
+        con.execute(
+            "INSERT INTO entries(id, feed_id, entry_key, link, title) VALUES(?, ?, ?, 'l', 't')", (i, 1 + i % 2, str(i))
+        )
+        con.execute("INSERT INTO alerts(entry_id, rule_id, keyword) VALUES(?, 1, 'k')", (i,))
+
+    first = queries.alerts(con, feed_id=2, limit=2)
+    assert [r["id"] for r in first.rows] == [7, 5]
+    second = queries.alerts(con, feed_id=2, before=first.next_before, limit=2)
+    assert [r["id"] for r in second.rows] == [3, 1] and second.next_before is None
+
+
+def test_paged_pages_render(con):
+    from fastapi.testclient import TestClient
+
+    from rss_watcher.main import app
+
+    con.execute("INSERT INTO feeds(id, name, url) VALUES(1, 'F', 'http://x.test/rss')")
+    for i in range(30):
+        db.log_write(con, level="error" if i % 2 else "info", area="poll", message=f"m{i}", feed_id=1)
+    db.flush_logs()
+    client = TestClient(app)
+    assert client.get("/alerts", params={"feed_id": "1", "rule_id": "x"}).status_code == 200
+    assert client.get("/", params={"before": "10"}).status_code == 200
+    page = client.get("/logs", params={"level": "error", "feed_id": "1"}).text
+    assert "m29" in page and "m28" not in page
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import pytest
+
+from rss_watcher import db, readcache
+
+
+@pytest.fixture
+def con(tmp_path, monkeypatch):
+    monkeypatch.setenv("RSSWATCHER_DB_PATH", str(tmp_path / "t.db"))
+    db.migrate()
+    with db.connect() as con:
+        yield con
+
+
+def _names(con):
+    return [r["name"] for r in con.execute("SELECT name FROM feeds ORDER BY id")]
+
+
+def test_entries_are_reused_until_a_topic_is_invalidated(con):
+    c = readcache.cache()
+    con.execute("INSERT INTO feeds(name, url) VALUES('a', 'http://a.test/rss')")
+    first = c.get("names", (readcache.FEEDS,), _names)
+    con.execute("INSERT INTO feeds(name, url) VALUES('b', 'http://b.test/rss')")
+    assert c.get("names", (readcache.FEEDS,), _names) is first
+    assert (c.hits, c.misses) == (1, 1)
+
+    readcache.invalidate(readcache.RULES)
+    assert c.get("names", (readcache.FEEDS,), _names) is first
+    readcache.invalidate(readcache.FEEDS)
+    fresh = c.get("names", (readcache.FEEDS,), _names)
+    assert fresh.value == ["a", "b"] and fresh.etag != first.etag
+
+
+def test_ttl_bounds_staleness_and_etag_follows_content(con):
+    c = readcache.cache()
+    c.ttl = 0.0
+    con.execute("INSERT INTO feeds(name, url) VALUES('a', 'http://a.test/rss')")
+    first = c.get("names", (readcache.FEEDS,), _names)
+    again = c.get("names", (readcache.FEEDS,), _names)
+    assert again is not first and again.etag == first.etag
+
+
+def test_pages_answer_304_until_a_form_changes_them(con):
+    from fastapi.testclient import TestClient
+
+    from rss_watcher.main import app
+
+    client = TestClient(app)
+    for path in ("/", "/feeds", "/rules", "/settings", "/alerts", "/stats.json"):
+        r = client.get(path)
+        assert r.status_code == 200 and r.headers["etag"], path
+        again = client.get(path, headers={"If-None-Match": r.headers["etag"]})
+        if path != "/stats.json":  # uptime and counters move between requests
+            assert again.status_code == 304 and not again.content, path
+
+    etag = client.get("/feeds").headers["etag"]
+    client.post("/feeds/add", data={"name": "n", "url": "http://n.test/rss"})
+    r = client.get("/feeds", headers={"If-None-Match": etag})
+    assert r.status_code == 200 and "http://n.test/rss" in r.text and r.headers["etag"] != etag
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import sqlite3
+
+import pytest
+
+from rss_watcher import db, retention
+
+
+def _seed(con, feed_id: int, n: int, *, age_days: int) -> None:
+    con.executemany(
+        """
+        INSERT INTO entries(feed_id, entry_key, link, title, summary, seen_at)
+        VALUES(?, ?, ?, ?, ?, datetime('now', ?))
+        """,
+        [
+            (feed_id, f"k{feed_id}-{age_days}-{i}", f"https://x.test/{i}", f"Title {i}", "x" * 500, f"-{age_days} days")
+            for i in range(n)
+        ],
+    )
+
+
+@pytest.mark.asyncio
+async def test_retention_strips_trims_and_keeps_alerted_entries(tmp_path, monkeypatch):
+    monkeypatch.setenv("RSSWATCHER_DB_PATH", str(tmp_path / "t.db"))
+    db.migrate()
+    with db.connect() as con:
+        con.execute("INSERT INTO feeds(id, name, url) VALUES(1, 'A', 'https://a.test/rss')")
+        # Feed 2 overrides the defaults: keep text forever, but only 200 entries.
+        con.execute(
+            "INSERT INTO feeds(id, name, url, retention_days, retention_max_entries) VALUES(2, 'B', 'https://b.test/rss', 0, 200)"
+        )
+        db.kv_set(con, "entry_retention_days", "30")
+        db.kv_set(con, "entry_max_per_feed", "0")
+        _seed(con, 1, 120, age_days=60)
+        _seed(con, 1, 10, age_days=1)
+        _seed(con, 2, 250, age_days=60)
+        con.execute("INSERT INTO rules(id, keyword) VALUES(1, 'title')")
+        old_alerted = con.execute("SELECT MIN(id) FROM entries WHERE feed_id = 1").fetchone()[0]
+        first_b = con.execute("SELECT MIN(id) FROM entries WHERE feed_id = 2").fetchone()[0]
+        con.execute("INSERT INTO alerts(entry_id, rule_id, keyword) VALUES(?, 1, 'title')", (old_alerted,))
+        con.execute("INSERT INTO alerts(entry_id, rule_id, keyword) VALUES(?, 1, 'title')", (first_b,))
+
+    report = await retention.run_once(batch=50, pause=0)
+
+    assert report.stripped == 119
+    assert report.deleted == 49
+    with db.connect() as con:
+        stubs = con.execute("SELECT COUNT(*) FROM entries WHERE feed_id = 1 AND summary IS NULL AND title = ''").fetchone()[0]
+        assert stubs == 119
+        kept = con.execute("SELECT title, summary FROM entries WHERE id = ?", (old_alerted,)).fetchone()
+        assert kept["title"] and kept["summary"]
+        assert con.execute("SELECT COUNT(*) FROM entries WHERE feed_id = 2").fetchone()[0] == 201
+        assert con.execute("SELECT COUNT(*) FROM entries WHERE id = ?", (first_b,)).fetchone()[0] == 1
+        assert retention.last_report(con)["stripped"] == 119
+
+    # Nothing left to do on a second pass.
+    again = await retention.run_once(batch=50, pause=0)
+    assert (again.stripped, again.deleted) == (0, 0)
+
+
+def test_new_databases_use_incremental_vacuum(tmp_path, monkeypatch):
+    monkeypatch.setenv("RSSWATCHER_DB_PATH", str(tmp_path / "t.db"))
+    db.migrate()
+    with db.connect() as con:
+        assert con.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+        con.execute("INSERT INTO feeds(id, name, url) VALUES(1, 'A', 'https://a.test/rss')")
+        _seed(con, 1, 2000, age_days=1)
+        con.execute("DELETE FROM entries")
+        assert retention.free_bytes(con) > 0
+        assert retention.reclaim(con) > 0
+        assert retention.free_bytes(con) == 0
+
+
+def test_strip_batches_only_visit_entries_that_still_have_text(tmp_path, monkeypatch):
+    monkeypatch.setenv("RSSWATCHER_DB_PATH", str(tmp_path / "t.db"))
+    db.migrate()
+    with db.connect() as con:
+        con.execute("INSERT INTO feeds(id, name, url) VALUES(1, 'A', 'https://a.test/rss')")
+        _seed(con, 1, 30, age_days=60)
+        _seed(con, 1, 20, age_days=1)
+        ceiling = retention.strip_ceiling(con, 30)
+        assert ceiling == 30
+
+        statements: list[str] = []
+        con.set_trace_callback(statements.append)
+        assert retention.strip_batch(con, 30, 0, ceiling, limit=20) == (20, 20)
+        con.set_trace_callback(None)
+        # Trigger bodies are traced as "-- TRIGGER name" lines.
+        for sql in (s for s in statements if not s.startswith("--")):
+            plan = [str(r["detail"]) for r in con.execute("EXPLAIN QUERY PLAN " + sql)]
+            assert any("idx_entries_unstripped" in step for step in plan), plan
+            # Only the window itself, at most `limit` rows, is scanned.
+            assert all(step in ("SCAN w", "SCAN (subquery-1)") for step in plan if step.startswith("SCAN")), plan
+
+        # The stubs left behind are out of the index; the rest goes in one short batch.
+        assert retention.strip_batch(con, 30, 0, ceiling, limit=20) == (10, ceiling)
+        assert retention.strip_batch(con, 30, 0, ceiling, limit=20) == (0, ceiling)
+
+
+def test_old_databases_are_only_vacuumed_on_request(tmp_path, monkeypatch):
+    path = tmp_path / "t.db"
+    monkeypatch.setenv("RSSWATCHER_DB_PATH", str(path))
+    # A file created before incremental auto_vacuum.
+    sqlite3.connect(path).execute("CREATE TABLE old(x)").connection.close()
+    db.migrate()
+    with db.connect() as con:
+        con.execute("INSERT INTO feeds(id, name, url) VALUES(1, 'A', 'https://a.test/rss')")
+        _seed(con, 1, 2000, age_days=1)
+        con.execute("DELETE FROM entries")
+        assert not retention.incremental(con)
+        assert retention.reclaim(con) == 0
+        assert retention.free_bytes(con) > 0
+
+    assert retention.vacuum() > 0
+    # Connections opened before the VACUUM still report the old mode.
+    db.close_all()
+    with db.connect() as con:
+        assert retention.incremental(con)
+        assert retention.free_bytes(con) == 0
+
+
+@pytest.mark.asyncio
+async def test_trimmed_items_a_feed_still_lists_do_not_come_back(tmp_path, monkeypatch):
+    import respx
+
+    from rss_watcher import seen, watcher
+
+    monkeypatch.setenv("RSSWATCHER_DB_PATH", str(tmp_path / "t.db"))
+    url = "https://big.test/rss"
+    items = "".join(
+        f"<item><title>Story {i}</title><link>https://big.test/{i}</link><guid>g{i}</guid></item>" for i in range(300)
+    )
+    body = f'<rss version="2.0"><channel><title>Big</title>{items}</channel></rss>'
+    db.migrate()
+    with db.connect() as con:
+        con.execute(
+            "INSERT INTO feeds(id, name, url, enabled, retention_max_entries) VALUES(1, 'Big', ?, 1, 200)", (url,)
+        )
+        # Polls only run with some rule enabled.
+        con.execute("INSERT INTO rules(keyword) VALUES('nothing matches this')")
+
+    with respx.mock() as router:
+        router.get(url).respond(200, text=body)
+        await watcher.poll_once()
+        report = await retention.run_once(batch=50, pause=0)
+        assert report.deleted == 100
+
+        # A rule created since, and a seen index that no longer holds the trimmed keys.
+        with db.connect() as con:
+            con.execute("INSERT INTO rules(keyword) VALUES('story')")
+            con.execute("DELETE FROM feed_http_cache")
+        seen.reset()
+        assert await watcher.poll_once() == 0
+
+    with db.connect() as con:
+        assert con.execute("SELECT COUNT(*) FROM entries").fetchone()[0] == 200
+        assert con.execute("SELECT COUNT(*) FROM alerts").fetchone()[0] == 0
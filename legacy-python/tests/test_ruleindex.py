@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import pytest
+import respx
+from fastapi.testclient import TestClient
+
+from rss_watcher import db, ruleindex, watcher
+from rss_watcher.main import app
+
+from test_watcher_e2e import RSS_XML
+
+
+@pytest.mark.asyncio
+async def test_rules_are_compiled_once_until_a_handler_bumps_the_version(tmp_path, monkeypatch):
+    monkeypatch.setenv("RSSWATCHER_DB_PATH", str(tmp_path / "t.db"))
+    feed_url = "https://feed.test/rss.xml"
+    db.migrate()
+    with db.connect() as con:
+        con.execute("INSERT INTO feeds(name, url, enabled) VALUES(?, ?, 1)", ("Example", feed_url))
+    client = TestClient(app)
+    client.post("/rules/add", data={"keyword": "nothing-matches"})
+
+    loads = []
+    real_load = ruleindex.load
+    monkeypatch.setattr(ruleindex, "load", lambda con: loads.append(1) or real_load(con))
+
+    with respx.mock() as router:
+        router.get(feed_url).respond(200, text=RSS_XML)
+        assert await watcher.poll_once() == 0
+        assert await watcher.poll_once() == 0
+        assert len(loads) == 1
+
+        client.post("/rules/add", data={"keyword": "ransomware"})
+        router.get(feed_url).respond(200, text=RSS_XML.replace("item-a", "item-b"))
+        assert await watcher.poll_once() == 1
+        assert len(loads) == 2
+
+        client.post("/rules/toggle", data={"rule_id": 2})
+        router.get(feed_url).respond(200, text=RSS_XML.replace("item-a", "item-c"))
+        assert await watcher.poll_once() == 0
+        assert len(loads) == 3
+
+
+def test_rule_form_stores_kind_field_and_terms_and_rejects_bad_regex(tmp_path, monkeypatch):
+    monkeypatch.setenv("RSSWATCHER_DB_PATH", str(tmp_path / "t.db"))
+    db.migrate()
+    client = TestClient(app)
+    client.post(
+        "/rules/add",
+        data={"keyword": r"cve-\d+", "kind": "regex", "field": "title", "all_of": " Acme ,, bank", "none_of": ""},
+    )
+    client.post("/rules/add", data={"keyword": "(unclosed", "kind": "regex"})
+
+    with db.connect() as con:
+        rows = [dict(r) for r in ruleindex.load(con)]
+        m = ruleindex.matcher(con)
+    assert [(r["kind"], r["field"], r["all_of"], r["none_of"]) for r in rows] == [("regex", "title", "Acme, bank", None)]
+    assert [x.rule_id for x in m.find(1, "", title="CVE-2024 at ACME bank")] == [rows[0]["id"]]
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import time
+
+import pytest
+import respx
+
+from rss_watcher import db, scheduler, watcher
+
+from test_watcher_e2e import RSS_XML
+
+
+LIMITS = scheduler.Limits(base=300, minimum=60, maximum=2400)
+
+
+def test_interval_adapts_to_activity_and_honours_hints():
+    assert scheduler.next_interval(300, scheduler.Outcome(new_entries=3), LIMITS) == 150
+    assert scheduler.next_interval(300, scheduler.Outcome(), LIMITS) == 375
+    assert scheduler.next_interval(2400, scheduler.Outcome(), LIMITS) == 2400
+    assert scheduler.next_interval(80, scheduler.Outcome(new_entries=1), LIMITS) == 60
+    # A server-provided floor wins over a busy feed, but never past the maximum.
+    assert scheduler.next_interval(300, scheduler.Outcome(new_entries=1, min_interval=900), LIMITS) == 900
+    assert scheduler.next_interval(300, scheduler.Outcome(min_interval=86400), LIMITS) == 2400
+
+
+def test_header_parsing():
+    assert scheduler.parse_max_age("public, max-age=600") == 600
+    assert scheduler.parse_max_age("no-cache, max-age=600") is None
+    assert scheduler.parse_retry_after("120") == 120
+    assert scheduler.parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") is None
+    assert scheduler.parse_ttl_minutes("15") == 900
+
+
+def test_queue_pops_due_feeds_in_order(tmp_path, monkeypatch):
+    monkeypatch.setenv("RSSWATCHER_DB_PATH", str(tmp_path / "t.db"))
+    db.migrate()
+    now = time.time()
+    with db.connect() as con:
+        for i in range(1, 4):
+            con.execute("INSERT INTO feeds(id, name, url) VALUES(?, ?, ?)", (i, f"F{i}", f"http://x.test/{i}"))
+        con.execute("INSERT INTO feed_schedule(feed_id, interval_seconds, next_due_at) VALUES(1, 300, ?)", (now + 100,))
+        con.execute("INSERT INTO feed_schedule(feed_id, interval_seconds, next_due_at) VALUES(2, 300, ?)", (now - 5,))
+        q = scheduler.Queue()
+        q.sync(con)
+
+    # Feed 3 has never been scheduled, so it is due immediately.
+    assert q.pop_due(now) == [3, 2]
+    assert q.pop_due(now) == []
+    assert q.next_due() == pytest.approx(now + 100)
+
+
+@pytest.mark.asyncio
+async def test_poll_records_schedule_with_feed_ttl(tmp_path, monkeypatch):
+    monkeypatch.setenv("RSSWATCHER_DB_PATH", str(tmp_path / "t.db"))
+    feed_url = "https://feed.test/rss.xml"
+    db.migrate()
+    with db.connect() as con:
+        con.execute("INSERT INTO feeds(name, url, enabled) VALUES(?, ?, 1)", ("Example", feed_url))
+        con.execute("INSERT INTO rules(keyword, feed_id, enabled) VALUES(?, NULL, 1)", ("ransomware",))
+
+    with respx.mock() as router:
+        router.get(feed_url).respond(200, text=RSS_XML.replace("<channel>", "<channel><ttl>30</ttl>"))
+        await watcher.poll_once()
+
+    with db.connect() as con:
+        row = con.execute("SELECT interval_seconds, next_due_at, last_new_at FROM feed_schedule").fetchone()
+    assert row["interval_seconds"] == 1800
+    assert row["last_new_at"] is not None
+    assert row["next_due_at"] > time.time() + 1800 * 0.85
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+from fastapi.testclient import TestClient
+
+from rss_watcher import db, search
+from rss_watcher.main import app
+
+
+def _setup(tmp_path, monkeypatch) -> None:
+    monkeypatch.setenv("RSSWATCHER_DB_PATH", str(tmp_path / "t.db"))
+    db.migrate()
+    with db.connect() as con:
+        con.execute("INSERT INTO feeds(id, name, url) VALUES(1, 'F', 'http://x.test/rss'), (2, 'G', 'http://y.test/rss')")
+        con.executemany(
+            "INSERT INTO entries(id, feed_id, entry_key, link, title, summary) VALUES(?, ?, ?, ?, ?, ?)",
+            [
+                (1, 1, "a", "http://x.test/a", "Ransomware hits hospital", "Systems down since Monday."),
+                (2, 1, "b", "http://x.test/b", "Quarterly results", "Acme reports ransomware costs."),
+                (3, 2, "c", "http://y.test/c", "Veteran outage", "CVE-2024-1234 exploited in the wild."),
+            ],
+        )
+
+
+def test_index_is_backfilled_and_follows_updates_and_deletes(tmp_path, monkeypatch):
+    monkeypatch.setenv("RSSWATCHER_DB_PATH", str(tmp_path / "t.db"))
+    db.migrate()
+    with db.connect() as con:
+        # An existing database from before the index: drop it, add rows, migrate again.
+        con.executescript(
+            "DROP TRIGGER entries_fts_ai; DROP TRIGGER entries_fts_ad; DROP TRIGGER entries_fts_au; DROP TABLE entries_fts;"
+        )
+        con.execute("INSERT INTO feeds(id, name, url) VALUES(1, 'F', 'http://x.test/rss')")
+        con.execute("INSERT INTO entries(feed_id, entry_key, link, title) VALUES(1, 'k', 'l', 'Old RANSOMWARE story')")
+    db.migrate()
+    with db.connect() as con:
+        assert [h.title for h in search.search(con, "ransom")] == ["Old RANSOMWARE story"]
+        con.execute("UPDATE entries SET title = '', summary = NULL")
+        assert search.search(con, "ransom") == []
+        con.execute("INSERT INTO entries(feed_id, entry_key, link, title) VALUES(1, 'k2', 'l', 'ransom note')")
+        assert len(search.search(con, "ransom")) == 1
+        con.execute("DELETE FROM entries")
+        assert search.search(con, "ransom") == []
+
+
+def test_search_requires_every_term_and_pages_newest_first(tmp_path, monkeypatch):
+    _setup(tmp_path, monkeypatch)
+    with db.connect() as con:
+        assert [h.id for h in search.search(con, "ransomware")] == [2, 1]
+        assert [h.id for h in search.search(con, "ransomware hospital")] == [1]
+        assert [h.id for h in search.search(con, '"reports ransomware"')] == [2]
+        assert [h.id for h in search.search(con, "ransomware", before=2)] == [1]
+        assert [h.id for h in search.search(con, "ransomware", feed_id=2)] == []
+        assert search.search(con, "ra") == []
+        assert "<mark>" in str(search.search(con, "hospital")[0].snippet_html())
+
+
+def test_dry_run_uses_rule_semantics(tmp_path, monkeypatch):
+    _setup(tmp_path, monkeypatch)
+    with db.connect() as con:
+
+        def ids(**rule):
+            result = search.dry_run(con, {"feed_id": None, **rule})
+            return [h.id for h in result.hits], result.indexed
+
+        assert ids(keyword="ran") == ([3, 2, 1], True)
+        assert ids(keyword="ran", kind="word") == ([], True)
+        assert ids(keyword="ransomware", field="title") == ([1], True)
+        assert ids(keyword="ransomware", none_of="acme") == ([1], True)
+        assert ids(keyword=r"cve-\d+", kind="regex") == ([3], True)
+        assert ids(keyword=r"\d{4}", kind="regex") == ([3], False)
+        assert search.dry_run(con, {"keyword": "(", "kind": "regex", "feed_id": None}).error
+
+
+def test_search_endpoints(tmp_path, monkeypatch):
+    _setup(tmp_path, monkeypatch)
+    client = TestClient(app)
+    body = client.get("/search.json", params={"q": "ransomware"}).json()
+    assert [r["id"] for r in body["results"]] == [2, 1]
+    assert body["next_before"] is None
+    assert "Ransomware hits hospital" in client.get("/search", params={"q": "hospital"}).text
+
+    page = client.get("/rules/dry_run", params={"keyword": "outage", "kind": "word"})
+    assert page.status_code == 200 and "Veteran outage" in page.text
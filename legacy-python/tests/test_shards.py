@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+import pytest
+
+from rss_watcher import db, metrics, scheduler, shards, worker
+
+
+@pytest.fixture
+def con(tmp_path, monkeypatch):
+    monkeypatch.setenv("RSSWATCHER_DB_PATH", str(tmp_path / "t.db"))
+    db.migrate()
+    with db.connect() as con:
+        con.executemany(
+            "INSERT INTO feeds(name, url) VALUES(?, ?)", [(f"f{i}", f"https://example.com/{i}.xml") for i in range(5)]
+        )
+        yield con
+
+
+def _clock(monkeypatch, offset: float) -> None:
+    now = time.time() + offset
+    monkeypatch.setattr(shards.time, "time", lambda: now)
+
+
+def test_shards_split_feeds_and_rebalance_on_join(con):
+    a = shards.Shard("a", ttl=30)
+    assert len(a.heartbeat(con)) == 5
+
+    b = shards.Shard("b", ttl=30)
+    # Everything is still held by a; b only gets feeds once a gives some back.
+    assert b.heartbeat(con) == frozenset()
+    assert len(a.heartbeat(con)) == 3
+    assert len(b.heartbeat(con)) == 2
+    assert a.owned.isdisjoint(b.owned)
+    assert a.owned | b.owned == {int(r[0]) for r in con.execute("SELECT id FROM feeds")}
+
+
+def test_survivor_takes_over_a_dead_shard_after_expiry(con, monkeypatch):
+    a, b = shards.Shard("a", ttl=30), shards.Shard("b", ttl=30)
+    a.heartbeat(con)
+    b.heartbeat(con)
+    a.heartbeat(con)
+    b.heartbeat(con)
+    assert len(a.owned) == 3
+
+    # b stops heartbeating; until its leases run out they stay b's.
+    _clock(monkeypatch, 10)
+    assert len(a.heartbeat(con)) == 3
+    _clock(monkeypatch, 31)
+    assert len(a.heartbeat(con)) == 5
+
+
+def test_leaving_hands_feeds_over_at_once(con):
+    a, b = shards.Shard("a", ttl=30), shards.Shard("b", ttl=30)
+    a.heartbeat(con)
+    b.heartbeat(con)
+    a.heartbeat(con)
+    a.leave(con)
+    assert len(b.heartbeat(con)) == 5
+    assert [s["holder"] for s in shards.report(con)] == ["b"]
+
+
+def test_queue_sync_splits_feeds_between_shard_and_unsharded_pollers(con):
+    a = shards.Shard("a", ttl=30)
+    a.heartbeat(con)
+    con.execute("DELETE FROM feed_leases WHERE feed_id IN (SELECT id FROM feeds ORDER BY id DESC LIMIT 2)")
+
+    q = scheduler.Queue()
+    q.sync(con, "a")
+    mine = set(q.pop_due(time.time()))
+    q.sync(con)
+    rest = set(q.pop_due(time.time()))
+    assert len(mine) == 3 and len(rest) == 2 and mine.isdisjoint(rest)
+
+
+def test_report_shows_per_shard_throughput(con):
+    reg = metrics.registry()
+    sw = metrics.Stopwatch()
+    for fid in range(4):
+        reg.record_feed(fid, f"f{fid}", sw, seen=10)
+    reg.record_poll(2.0)
+    shards.Shard("a", ttl=30).heartbeat(con)
+
+    (row,) = shards.report(con)
+    assert row["holder"] == "a" and row["feeds"] == 5
+    assert row["polls"] == 1 and row["feeds_polled"] == 4
+    assert row["busy_feeds_per_second"] == 2.0
+
+
+@pytest.mark.asyncio
+async def test_run_shard_leaves_on_stop(con):
+    stop = asyncio.Event()
+    shard = shards.Shard("a", ttl=0.3)
+    task = asyncio.create_task(worker.run_shard(stop, None, None, shard))
+    await asyncio.sleep(0.05)
+    assert len(shard.owned) == 5
+    stop.set()
+    await asyncio.wait_for(task, 5)
+    assert con.execute("SELECT COUNT(*) FROM feed_leases").fetchone()[0] == 0
+    assert shards.report(con) == []
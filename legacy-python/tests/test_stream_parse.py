@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import httpx
+import pytest
+import respx
+
+from rss_watcher import db, parse, watcher
+
+
+FEED_URL = "https://big.test/archive.xml"
+
+
+def _feed(first: int, last: int) -> bytes:
+    # Newest first, with enough body per item that the document is well past the stream threshold.
+    items = "".join(
+        f"<item><title>Post {i}{' ransomware' if i % 100 == 0 else ''}</title>"
+        f"<link>https://big.test/{i}</link><guid>post-{i}</guid>"
+        f"<description>{'archive text ' * 40}</description></item>"
+        for i in range(last, first - 1, -1)
+    )
+    return f'<?xml version="1.0"?><rss version="2.0"><channel><title>Big</title>{items}</channel></rss>'.encode()
+
+
+def _chunked(body: bytes, sent: list[int], size: int = 4096) -> httpx.Response:
+    async def chunks():
+        for i in range(0, len(body), size):
+            sent.append(size)
+            yield body[i : i + size]
+
+    return httpx.Response(200, content=chunks())
+
+
+def test_stream_parser_matches_feedparser_keys():
+    body = _feed(1, 50)
+    sp = parse.StreamParser(FEED_URL)
+    rows = []
+    for i in range(0, len(body), 1000):
+        rows += sp.feed(body[i : i + 1000])
+    full = parse.parse_feed(body, FEED_URL)
+    assert [(r.key, r.link, r.title, r.summary) for r in rows] == [
+        (r.key, r.link, r.title, r.summary) for r in full.rows
+    ]
+
+
+_RSS = (
+    '<?xml version="1.0"?><rss version="2.0" xmlns:dc="http://purl.org/dc/elements/1.1/"'
+    ' xmlns:dcterms="http://purl.org/dc/terms/" xmlns:atom="http://www.w3.org/2005/Atom"'
+    ' xmlns:content="http://purl.org/rss/1.0/modules/content/"><channel><title>T</title>{}</channel></rss>'
+)
+_ATOM = '<?xml version="1.0"?><feed xmlns="http://www.w3.org/2005/Atom"><title>T</title>{}</feed>'
+_RSS1 = (
+    '<?xml version="1.0"?><rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"'
+    ' xmlns="http://purl.org/rss/1.0/" xmlns:dc="http://purl.org/dc/elements/1.1/">'
+    '<channel rdf:about="https://x.test/"><title>T</title></channel>{}</rdf:RDF>'
+)
+ODD_ITEMS = [
+    # No guid or link: the key hashes title and dates, wherever the dates come from.
+    (_RSS, "<item><title>dc</title><dc:date>2024-01-02T03:04:05Z</dc:date></item>"),
+    (_RSS, "<item><title>dcterms</title><dcterms:issued>2024-01-02</dcterms:issued><dcterms:modified>2024-01-03</dcterms:modified></item>"),
+    (_RSS, "<item><title>atom updated</title><atom:updated>2024-01-02T00:00:00Z</atom:updated></item>"),
+    (_RSS, "<item><title>both</title><pubDate>Tue, 02 Jan 2024 03:04:05 GMT</pubDate><dc:date>2024-01-05</dc:date></item>"),
+    (_RSS, "<item><title>dc first</title><dc:date>2024-01-05</dc:date><pubDate>Tue, 02 Jan 2024 03:04:05 GMT</pubDate></item>"),
+    (_RSS, "<item><description>no title</description></item>"),
+    (_RSS, '<item><title>guid only</title><guid isPermaLink="false">abc</guid></item>'),
+    (_RSS, "<item><title>permalink</title><guid>https://x.test/p</guid></item>"),
+    # Markup feedparser sanitizes away.
+    (_RSS, "<item><title>s</title><link>https://x.test/1</link><description>&lt;p&gt;hi&lt;script&gt;alert(1)&lt;/script&gt;&lt;/p&gt;</description></item>"),
+    (_RSS, '<item><title>c</title><link>https://x.test/2</link><description><![CDATA[<p onclick="x()">a <b>b</b><style>p{}</style><iframe src=x></iframe></p>]]></description></item>'),
+    (_RSS, '<item><title>&lt;b onclick="x()"&gt;bold&lt;/b&gt; title</title></item>'),
+    (_RSS, "<item><title>plain &amp; text</title><link>https://x.test/3</link><description>Tom &amp; Jerry &lt; 3</description></item>"),
+    (_RSS, "<item><title>content</title><link>https://x.test/5</link><content:encoded><![CDATA[<p>full <script>bad()</script>text</p>]]></content:encoded></item>"),
+    (_RSS, "<item><title>after</title><link>https://x.test/9</link><content:encoded>&lt;p&gt;c&lt;/p&gt;</content:encoded><description>d</description></item>"),
+    (_ATOM, "<entry><title>published only</title><published>2024-01-01T00:00:00Z</published></entry>"),
+    (_ATOM, "<entry><title>issued</title><issued>2024-01-01</issued><modified>2024-01-02</modified></entry>"),
+    (_ATOM, '<entry><title type="html">&lt;i&gt;x&lt;/i&gt;</title><id>urn:1</id><summary type="html">&lt;p&gt;a&lt;script&gt;b&lt;/script&gt;&lt;/p&gt;</summary></entry>'),
+    (_ATOM, '<entry><title>xhtml</title><id>urn:2</id><content type="xhtml"><div xmlns="http://www.w3.org/1999/xhtml"><p>hi <b>there</b><br/></p></div></content></entry>'),
+    (_ATOM, '<entry><title>links</title><id>urn:3</id><link rel="self" href="https://x.test/self"/><link href="https://x.test/alt"/></entry>'),
+    (_ATOM, "<entry><title>text</title><id>urn:4</id><summary>a &lt; b &amp; c</summary></entry>"),
+    (_RSS1, "<item><title>r2 no about</title><dc:date>2024-01-01</dc:date><description>&lt;p&gt;d&lt;/p&gt;</description></item>"),
+]
+
+
+@pytest.mark.parametrize("template,item", ODD_ITEMS)
+def test_stream_parser_matches_feedparser_on_odd_items(template, item):
+    body = template.format(item).encode()
+    (streamed,) = parse.StreamParser(FEED_URL).feed(body)
+    (full,) = parse.parse_feed(body, FEED_URL).rows
+    assert streamed == full
+
+
+@pytest.mark.asyncio
+async def test_large_feed_stops_after_known_entries(tmp_path, monkeypatch):
+    monkeypatch.setenv("RSSWATCHER_DB_PATH", str(tmp_path / "t.db"))
+    db.migrate()
+    with db.connect() as con:
+        con.execute("INSERT INTO feeds(name, url, enabled, armed) VALUES('Big', ?, 1, 0)", (FEED_URL,))
+        con.execute("INSERT INTO rules(keyword) VALUES('ransomware')")
+        db.kv_set(con, "stream_min_kib", "16")
+        db.kv_set(con, "stream_stop_after_seen", "5")
+
+    sent: list[int] = []
+    with respx.mock() as router:
+        route = router.get(FEED_URL)
+        route.side_effect = lambda request: _chunked(_feed(1, 1000), sent)
+        # Baseline reads the whole archive.
+        assert await watcher.poll_once() == 0
+        full_read = len(sent)
+
+        # Two new posts on top; one matches. Reading stops a few known posts later.
+        sent.clear()
+        route.side_effect = lambda request: _chunked(_feed(1, 1002).replace(b"Post 1001<", b"Post 1001 ransomware<"), sent)
+        assert await watcher.poll_once() == 1
+        assert len(sent) < full_read / 10
+
+    with db.connect() as con:
+        msgs = [r[0] for r in con.execute("SELECT message FROM app_log WHERE area = 'poll'")]
+        assert con.execute("SELECT COUNT(*) FROM entries").fetchone()[0] == 1002
+    assert any("1 streamed (1 stopped early)" in m for m in msgs)
+
+
+@pytest.mark.asyncio
+async def test_full_parse_flag_and_byte_cap(tmp_path, monkeypatch):
+    monkeypatch.setenv("RSSWATCHER_DB_PATH", str(tmp_path / "t.db"))
+    db.migrate()
+    with db.connect() as con:
+        con.execute("INSERT INTO feeds(id, name, url, enabled, armed) VALUES(1, 'Big', ?, 1, 0)", (FEED_URL,))
+        con.execute("INSERT INTO rules(keyword) VALUES('ransomware')")
+        db.kv_set(con, "stream_min_kib", "16")
+        db.kv_set(con, "stream_max_kib", "64")
+
+    sent: list[int] = []
+    with respx.mock() as router:
+        router.get(FEED_URL).mock(side_effect=lambda request: _chunked(_feed(1, 1000), sent))
+        await watcher.poll_once()
+        with db.connect() as con:
+            capped = con.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            assert 0 < capped < 1000
+            con.execute("UPDATE feeds SET full_parse = 1, armed = 0")
+        await watcher.poll_once()
+
+    with db.connect() as con:
+        assert con.execute("SELECT COUNT(*) FROM entries").fetchone()[0] == 1000
+
+
+@pytest.mark.asyncio
+async def test_malformed_large_feed_falls_back_to_feedparser(tmp_path, monkeypatch):
+    monkeypatch.setenv("RSSWATCHER_DB_PATH", str(tmp_path / "t.db"))
+    db.migrate()
+    with db.connect() as con:
+        con.execute("INSERT INTO feeds(name, url, enabled, armed) VALUES('Big', ?, 1, 0)", (FEED_URL,))
+        con.execute("INSERT INTO rules(keyword) VALUES('ransomware')")
+        db.kv_set(con, "stream_min_kib", "16")
+
+    # HTML entities aren't valid XML; feedparser's loose parser copes with them.
+    body = _feed(1, 200).replace(b"<title>Post 200", b"<title>Post&nbsp;200")
+    sent: list[int] = []
+    with respx.mock() as router:
+        router.get(FEED_URL).mock(side_effect=lambda request: _chunked(body, sent))
+        await watcher.poll_once()
+
+    with db.connect() as con:
+        assert con.execute("SELECT COUNT(*) FROM entries").fetchone()[0] == 200
+
+
+
+@pytest.mark.asyncio
+async def test_cut_short_stream_keeps_no_validators(tmp_path, monkeypatch):
+    monkeypatch.setenv("RSSWATCHER_DB_PATH", str(tmp_path / "t.db"))
+    db.migrate()
+    with db.connect() as con:
+        con.execute("INSERT INTO feeds(name, url, enabled, armed) VALUES('Big', ?, 1, 0)", (FEED_URL,))
+        con.execute("INSERT INTO rules(keyword) VALUES('ransomware')")
+        db.kv_set(con, "stream_min_kib", "16")
+        db.kv_set(con, "stream_max_kib", "64")
+
+    conditional: list[bool] = []
+
+    def respond(request, content):
+        conditional.append("if-none-match" in request.headers)
+        if conditional[-1]:
+            return httpx.Response(304)
+        resp = _chunked(content, [])
+        resp.headers["ETag"] = '"v1"'
+        return resp
+
+    with respx.mock() as router:
+        route = router.get(FEED_URL)
+        # Bad markup half way down, after rows were streamed: feedparser gets the whole
+        # document, so nothing below it is lost, and the validators are kept.
+        broken = _feed(1, 100).replace(b"<title>Post 50<", b"<title>Post 50 &<")
+        route.side_effect = lambda request: respond(request, broken)
+        await watcher.poll_once()
+        with db.connect() as con:
+            assert con.execute("SELECT COUNT(*) FROM entries").fetchone()[0] == 100
+        await watcher.poll_once()
+        assert conditional == [False, True]
+
+        # Cut off by the byte cap: the next poll must not be answered with a 304.
+        conditional.clear()
+        with db.connect() as con:
+            con.execute("DELETE FROM feed_http_cache")
+        route.side_effect = lambda request: respond(request, _feed(1, 1000))
+        await watcher.poll_once()
+        await watcher.poll_once()
+        assert conditional == [False, False]
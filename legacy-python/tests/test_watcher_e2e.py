@@ -1,10 +1,14 @@
+import asyncio
 import os
 import sqlite3
 
+import httpx
 import pytest
 import respx
 
 from rss_watcher import db
+from rss_watcher import outbox
+from rss_watcher import parse
 from rss_watcher import watcher
 
 
@@ -42,14 +46,15 @@ async def test_poll_once_creates_alert_and_logs(tmp_path, monkeypatch):
     # Capture notification calls (no real network).
     sent = {"push": 0, "email": 0}
 
-    async def fake_send_pushover(cfg, title, message, url):
+    async def fake_send_pushover(cfg, title, message, url, client=None):
         sent["push"] += 1
 
-    def fake_send_email(cfg, subject, body):
-        sent["email"] += 1
+    def fake_send_emails(cfg, messages):
+        sent["email"] += len(messages)
+        return [None] * len(messages)
 
-    monkeypatch.setattr(watcher, "send_pushover", fake_send_pushover)
-    monkeypatch.setattr(watcher, "send_email", fake_send_email)
+    monkeypatch.setattr(outbox, "send_pushover", fake_send_pushover)
+    monkeypatch.setattr(outbox, "send_emails", fake_send_emails)
 
     # Enable push/email configs via env (so poll_once tries to notify).
     monkeypatch.setenv("PUSHOVER_APP_TOKEN", "test_app")
@@ -65,6 +70,10 @@ async def test_poll_once_creates_alert_and_logs(tmp_path, monkeypatch):
 
         created = await watcher.poll_once()
 
+    # Notifications are queued with the alert and delivered by the dispatcher.
+    assert sent == {"push": 0, "email": 0}
+    assert await outbox.Dispatcher().drain_once() == 2
+
     assert created == 1
     assert sent["push"] == 1
     assert sent["email"] == 1
@@ -113,3 +122,94 @@ async def test_new_feed_is_baselined_no_alerts_then_alerts_on_new_items(tmp_path
         router.get(feed_url_2).respond(200, text=rss2)
         created2 = await watcher.poll_once()
         assert created2 == 1
+
+
+@pytest.mark.asyncio
+async def test_fetches_run_concurrently_with_per_host_limit(tmp_path, monkeypatch):
+    db_file = tmp_path / "t.db"
+    monkeypatch.setenv("RSSWATCHER_DB_PATH", str(db_file))
+
+    db.migrate()
+    with db.connect() as con:
+        for i in range(6):
+            host = "a.test" if i < 4 else f"b{i}.test"
+            con.execute("INSERT INTO feeds(name, url, enabled) VALUES(?, ?, 1)", (f"F{i}", f"https://{host}/rss{i}.xml"))
+        con.execute("INSERT INTO rules(keyword, feed_id, enabled) VALUES(?, NULL, 1)", ("ransomware",))
+        db.kv_set(con, "fetch_concurrency", "8")
+        db.kv_set(con, "fetch_per_host", "2")
+
+    in_flight: dict[str, int] = {}
+    peak: dict[str, int] = {}
+    overall = {"now": 0, "peak": 0}
+
+    async def fake_fetch(url, client, validators=None, **kwargs):
+        host = url.split("/")[2]
+        in_flight[host] = in_flight.get(host, 0) + 1
+        peak[host] = max(peak.get(host, 0), in_flight[host])
+        overall["now"] += 1
+        overall["peak"] = max(overall["peak"], overall["now"])
+        await asyncio.sleep(0.01)
+        in_flight[host] -= 1
+        overall["now"] -= 1
+        return watcher.FetchResponse(status=200, content=RSS_XML.replace("item-a", f"item-{url}").encode())
+
+    monkeypatch.setattr(watcher, "_fetch_feed", fake_fetch)
+
+    created = await watcher.poll_once()
+
+    assert created == 6
+    assert peak["a.test"] == 2
+    assert overall["peak"] > 2
+
+    with db.connect() as con:
+        msgs = [r["message"] for r in con.execute("SELECT message FROM app_log WHERE area = 'poll'").fetchall()]
+    assert any(m.startswith("fetch stats: 6 feeds") for m in msgs)
+
+
+@pytest.mark.asyncio
+async def test_conditional_get_and_unchanged_body_skip_parsing(tmp_path, monkeypatch):
+    db_file = tmp_path / "t.db"
+    monkeypatch.setenv("RSSWATCHER_DB_PATH", str(db_file))
+
+    etag_url = "https://feed.test/etag.xml"
+    plain_url = "https://feed.test/plain.xml"
+
+    db.migrate()
+    with db.connect() as con:
+        con.execute("INSERT INTO feeds(name, url, enabled) VALUES(?, ?, 1)", ("ETag", etag_url))
+        con.execute("INSERT INTO feeds(name, url, enabled) VALUES(?, ?, 1)", ("Plain", plain_url))
+        con.execute("INSERT INTO rules(keyword, feed_id, enabled) VALUES(?, NULL, 1)", ("ransomware",))
+
+    parses = {"n": 0}
+    real_parse = parse.feedparser.parse
+
+    def counting_parse(content):
+        parses["n"] += 1
+        return real_parse(content)
+
+    monkeypatch.setattr(parse.feedparser, "parse", counting_parse)
+
+    with respx.mock(assert_all_called=True) as router:
+        etag_route = router.get(etag_url)
+        etag_route.side_effect = lambda request: (
+            httpx.Response(304)
+            if request.headers.get("If-None-Match") == '"v1"'
+            else httpx.Response(200, text=RSS_XML, headers={"ETag": '"v1"'})
+        )
+        router.get(plain_url).respond(200, text=RSS_XML.replace("item-a", "item-plain"))
+
+        assert await watcher.poll_once() == 2
+        assert parses["n"] == 2
+
+        assert await watcher.poll_once() == 0
+        assert parses["n"] == 2
+        assert etag_route.calls.last.request.headers["If-None-Match"] == '"v1"'
+
+    with db.connect() as con:
+        msgs = [r["message"] for r in con.execute("SELECT message FROM app_log WHERE area = 'poll'").fetchall()]
+        statuses = {
+            int(r["feed_id"]): r["last_status"]
+            for r in con.execute("SELECT feed_id, last_status FROM feed_http_cache").fetchall()
+        }
+    assert "http cache: 2 hits (1 not modified, 1 unchanged body), 0 misses" in msgs
+    assert statuses == {1: 304, 2: 200}
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+import pytest
+
+from rss_watcher import db, lease, worker
+
+
+@pytest.fixture
+def con(tmp_path, monkeypatch):
+    monkeypatch.setenv("RSSWATCHER_DB_PATH", str(tmp_path / "t.db"))
+    db.migrate()
+    with db.connect() as con:
+        yield con
+
+
+def test_lease_is_exclusive_until_released_or_expired(con, monkeypatch):
+    a = lease.Lease("poller", "a", ttl=30)
+    b = lease.Lease("poller", "b", ttl=30)
+    assert a.acquire(con) and a.renew(con)
+    assert not b.acquire(con)
+    a.release(con)
+    assert b.acquire(con) and not a.renew(con)
+
+    later = time.time() + 31
+    monkeypatch.setattr(lease.time, "time", lambda: later)
+    assert a.acquire(con)
+    (held,) = lease.holders(con)
+    assert held["holder"] == "a" and held["expires_in"] == 30
+
+
+def test_poll_in_web_setting_and_env_override(con, monkeypatch):
+    assert worker.poll_in_web(con)
+    db.kv_set(con, "poll_in_web", "0")
+    assert not worker.poll_in_web(con)
+    monkeypatch.setenv("RSSWATCHER_POLL_IN_WEB", "1")
+    assert worker.poll_in_web(con)
+
+
+@pytest.mark.asyncio
+async def test_only_one_runner_leads_and_a_standby_takes_over(con):
+    running: list[str] = []
+
+    def jobs(name):
+        def start(stop):
+            async def job():
+                running.append(name)
+                try:
+                    await stop.wait()
+                finally:
+                    running.remove(name)
+
+            return [job()]
+
+        return start
+
+    stop_a, stop_b = asyncio.Event(), asyncio.Event()
+    a = asyncio.create_task(worker.run_as_leader(stop_a, jobs("a"), holder="a", ttl=0.3))
+    await asyncio.sleep(0.05)
+    b = asyncio.create_task(worker.run_as_leader(stop_b, jobs("b"), holder="b", ttl=0.3))
+    await asyncio.sleep(0.3)
+    assert running == ["a"]
+
+    # A clean stop hands the lease back; the standby picks it up on its next check.
+    stop_a.set()
+    await a
+    await asyncio.sleep(0.25)
+    assert running == ["b"]
+
+    stop_b.set()
+    await b
+    assert running == [] and lease.holders(con) == []
+
+
+@pytest.mark.asyncio
+async def test_leader_stops_its_jobs_when_the_lease_is_taken(con):
+    cancelled = asyncio.Event()
+
+    def jobs(stop):
+        async def job():
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        return [job()]
+
+    stop = asyncio.Event()
+    task = asyncio.create_task(worker.run_as_leader(stop, jobs, holder="a", ttl=0.3))
+    await asyncio.sleep(0.05)
+    # Simulate a stall: the lease lapsed and another process claimed it.
+    con.execute("UPDATE leases SET holder = 'b', expires_at = ?", (time.time() + 60,))
+    await asyncio.wait_for(cancelled.wait(), timeout=2)
+    stop.set()
+    await task
+    assert lease.holders(con)[0]["holder"] == "b"